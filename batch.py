@@ -0,0 +1,217 @@
+"""Transforms many files from the command line, without the UI.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+
+Files are read, decoded and saved with the same code the editor uses
+(see fileloader.read_chunks() and filesaver.write_atomic()), a chunk at
+a time, in a pool of processes:
+
+    python main.py --batch --encoding utf-8 --newline lf *.txt
+    python main.py --batch --find foo --replace bar logs/*.log
+"""
+
+import collections
+import concurrent.futures
+import os
+import re
+import sys
+import time
+
+from fileloader import read_chunks
+from filesaver import write_atomic
+from search import check_replacement, compile_pattern, find_all, replace_all
+from textcodec import detect_format, FALLBACK_ENCODING
+
+# values of --newline
+NEWLINES = {'lf': '\n', 'crlf': '\r\n', 'cr': '\r'}
+
+Job = collections.namedtuple('Job',
+                             'encoding newline pattern replacement regex')
+Job.__doc__ = """What is done to every file.
+
+Attributes:
+    encoding (str): the encoding the files are saved with, or None to
+    keep theirs.
+    newline (str): the line break the files are saved with, or None to
+    keep theirs.
+    pattern (re.Pattern): what is replaced, or None.
+    replacement (str): what it is replaced with. See search.expand().
+    regex (bool): True if pattern is a regular expression.
+"""
+
+Result = collections.namedtuple('Result',
+                                'path size replacements seconds error')
+Result.__doc__ = """What happened to a file.
+
+Attributes:
+    path (str): path of the file.
+    size (int): size of the file before the changes, in bytes.
+    replacements (int): number of replaced matches.
+    seconds (float): time spent on the file.
+    error (str): why the file was not changed, or None. Files that
+    didn't need changes are not saved and have no error.
+"""
+
+def transform(path, job):
+    """Applies a job to a file, replacing it.
+
+    Runs in the processes of the pool, so it only uses modules that
+    don't need tk.
+
+    Arguments:
+        path (str): path of the file.
+        job (Job): what is done.
+
+    Returns:
+        Result: what happened.
+    """
+    start = time.perf_counter()
+    size = 0
+    replacements = 0
+    try:
+        size = os.path.getsize(path)
+        source = detect_format(path)
+        try:
+            replacements = save(path, job, source)
+        except UnicodeDecodeError:
+            if source.bom or source.encoding == FALLBACK_ENCODING:
+                raise
+            # the start of the file was guessed wrong, like in
+            # fileloader.ChunkedLoader.poll()
+            replacements = save(path, job, source._replace(
+                encoding=FALLBACK_ENCODING
+            ))
+    except (OSError, UnicodeError) as error:
+        return Result(path, size, 0, time.perf_counter() - start, str(error))
+    return Result(path, size, replacements, time.perf_counter() - start, None)
+
+def save(path, job, source):
+    """Reads a file and saves it with the changes of a job.
+
+    Arguments:
+        path (str): path of the file.
+        job (Job): what is done.
+        source (textcodec.FileFormat): the format of the file.
+
+    Returns:
+        int: number of replaced matches.
+
+    Raises:
+        OSError: if the file can't be read or written.
+        UnicodeError: if the file can't be decoded with the format, or
+        the text can't be encoded with the new one.
+    """
+    target = source
+    if job.encoding is not None and job.encoding != source.encoding:
+        target = target._replace(encoding=job.encoding, bom=False)
+    if job.newline is not None:
+        target = target._replace(newline=job.newline)
+
+    if job.pattern is not None and target == source:
+        # a file without matches is left untouched, without writing it
+        chunks = (chunk for chunk, position in read_chunks(path, source))
+        if next(find_all(job.pattern, chunks), None) is None:
+            return 0
+    elif target == source:
+        return 0
+
+    replacements = 0
+
+    def count():
+        """Counts a replacement."""
+        nonlocal replacements
+        replacements += 1
+
+    chunks = (chunk for chunk, position in read_chunks(path, source))
+    if job.pattern is not None:
+        chunks = replace_all(job.pattern, chunks, job.replacement, job.regex,
+                             on_replace=count)
+    write_atomic(path, chunks, file_format=target)
+    return replacements
+
+def megabytes(size, seconds):
+    """Returns a size and the speed it was processed at, for the report.
+
+    Arguments:
+        size (int): the size in bytes.
+        seconds (float): the time it took.
+    """
+    size = size / 1024 / 1024
+    speed = size / max(seconds, 1e-6)
+    return f'{size:.1f} MB in {seconds:.2f} s ({speed:.0f} MB/s)'
+
+def report(result):
+    """Prints what happened to a file.
+
+    Arguments:
+        result (Result): what happened.
+    """
+    if result.error is not None:
+        print(f'{result.path}: error: {result.error}', file=sys.stderr)
+        return
+    print(f'{result.path}: {megabytes(result.size, result.seconds)}, '
+          f'{result.replacements} replacement(s)')
+
+def run(args):
+    """Runs the batch mode.
+
+    Arguments:
+        args (argparse.Namespace): the command line options. See
+        main.parse_args().
+
+    Returns:
+        int: the exit status, 1 if any file couldn't be changed and 2
+        if the options are wrong.
+    """
+    pattern = None
+    if args.find is not None:
+        try:
+            pattern = compile_pattern(args.find, args.regex, args.match_case)
+        except re.error as error:
+            print(f'invalid regular expression: {error}', file=sys.stderr)
+            return 2
+        try:
+            check_replacement(pattern, args.replace, args.regex)
+        except re.error as error:
+            print(f'invalid replacement: {error}', file=sys.stderr)
+            return 2
+    job = Job(args.encoding, NEWLINES.get(args.newline), pattern,
+              args.replace, args.regex)
+    workers = args.jobs or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    results = []
+    if workers == 1 or len(args.files) == 1:
+        # a pool only adds the time to start it
+        for path in args.files:
+            results.append(transform(path, job))
+            report(results[-1])
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(transform, path, job)
+                       for path in args.files]
+            for future in concurrent.futures.as_completed(futures):
+                results.append(future.result())
+                report(results[-1])
+    seconds = time.perf_counter() - start
+
+    failed = sum(result.error is not None for result in results)
+    size = sum(result.size for result in results if result.error is None)
+    replacements = sum(result.replacements for result in results)
+    print(f'{len(results) - failed} file(s), {megabytes(size, seconds)} '
+          f'with {workers} process(es), {replacements} replacement(s), '
+          f'{failed} error(s)')
+    return 1 if failed else 0
@@ -0,0 +1,350 @@
+"""Measures how long the editor takes to open, edit and save big files.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+
+The app runs with its main window withdrawn, so it needs a display.
+On a server, run it under Xvfb:
+
+    xvfb-run python benchmark.py --sizes 1M,16M --output report.json
+
+Every case (a file size and a kind of lines) runs in its own process,
+so the peak memory of one case doesn't hide the others.
+
+With --startup it checks the startup time instead, and exits with an
+error if it is over budget:
+
+    xvfb-run python benchmark.py --startup
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# kinds of generated files
+# short: lines of about 60 characters
+# long: a line break every 16 MB, which tk handles badly
+SHAPES = ('short', 'long')
+LONG_LINE = 16 * 1024 * 1024
+# number of characters typed in the edit benchmark
+KEYSTROKES = 2000
+# number of status bar updates in the set_ln_col benchmark
+STATUS_UPDATES = 2000
+# max time (in s) waited for a file to be opened or saved
+TIMEOUT = 1800
+# max time (in s) to import the app, measured with python -X importtime
+IMPORT_BUDGET = 0.15
+# max time (in s) from starting python to showing the window
+FIRST_PAINT_BUDGET = 1.0
+# number of slowest imports shown in the startup report
+SLOWEST_IMPORTS = 10
+
+def parse_size(text):
+    """Converts a size like '16M' to bytes.
+
+    Arguments:
+        text (str): a number with an optional K, M or G suffix.
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper()
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def generate_file(directory, size, shape):
+    """Creates a test file, unless it was already created.
+
+    Arguments:
+        directory (str): where the file is created.
+        size (int): size of the file in bytes.
+        shape (str): one of SHAPES.
+
+    Returns:
+        str: path of the file.
+    """
+    path = os.path.join(directory, f'bench-{shape}-{size}.txt')
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        return path
+
+    if shape == 'short':
+        lines = [f'{i:08d} the quick brown fox jumps over the lazy dog\n'
+                 for i in range(20000)]
+        block = ''.join(lines).encode('ascii')
+    else:
+        block = b'the quick brown fox jumps over the lazy dog ' * 1024
+        block = block[:LONG_LINE // 512]
+    with open(path, 'wb') as file_:
+        written = 0
+        while written < size:
+            data = block[:size - written]
+            end = written + len(data)
+            if shape == 'long' and end // LONG_LINE > written // LONG_LINE:
+                data = data[:-1] + b'\n'
+            file_.write(data)
+            written += len(data)
+    return path
+
+def peak_rss():
+    """Returns the peak memory used by this process, in MB."""
+    try:
+        import resource
+    except ImportError:
+        return None # windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / 1024 / 1024 # bytes
+    return peak / 1024 # kilobytes
+
+def run_until(root, condition, timeout=TIMEOUT):
+    """Runs the tk event loop until a condition is true.
+
+    Arguments:
+        root (tkinter.Tk): root widget of the app.
+        condition (function): returns True when the wait is over.
+        timeout (float): max time to wait, in seconds.
+
+    Returns:
+        float: the time it took, in seconds.
+    """
+    start = time.perf_counter()
+    while not condition():
+        root.update()
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError('the benchmark took too long')
+        time.sleep(0.001)
+    return time.perf_counter() - start
+
+def run_case(path):
+    """Opens, edits and saves a file in the app and measures it.
+
+    Arguments:
+        path (str): path of the file.
+
+    Returns:
+        dict: the results.
+    """
+    import tkinter as tk
+    from main import MainApplication
+
+    result = {'file': os.path.basename(path), 'bytes': os.path.getsize(path)}
+    start = time.perf_counter()
+    root = tk.Tk()
+    root.withdraw()
+    main = MainApplication(root)
+    root.update()
+    result['startup_s'] = time.perf_counter() - start
+
+    # open
+    start = time.perf_counter()
+    main.file_menu.openpath = path
+    main.file_menu.open_file_2()
+    run_until(root, lambda: main.loader is None or main.loader.finished)
+    root.update()
+    result['open_s'] = time.perf_counter() - start
+    result['large_file_mode'] = main.large_file is not None
+
+    # the status bar
+    textbox = main.textbox
+    start = time.perf_counter()
+    for _ in range(STATUS_UPDATES):
+        main.set_ln_col()
+    result['set_ln_col_us'] = ((time.perf_counter() - start) /
+                               STATUS_UPDATES * 1e6)
+
+    if main.large_file is None:
+        # typing in the middle of the file goes through CustomText._proxy
+        middle = textbox.index_at(len(textbox.document) // 2)
+        textbox.mark_set('insert', middle)
+        stats = textbox.event_stats()
+        start = time.perf_counter()
+        for i in range(KEYSTROKES):
+            textbox.insert('insert', 'x' if i % 10 else '\n')
+        for _ in range(KEYSTROKES // 2):
+            textbox.delete('insert-1c')
+        root.update()
+        elapsed = time.perf_counter() - start
+        result['keystroke_ms'] = elapsed / (KEYSTROKES * 1.5) * 1000
+        after = textbox.event_stats()
+        result['events'] = {key: after[key] - stats[key] for key in after}
+
+        # save
+        start = time.perf_counter()
+        main.file_menu.save_file()
+        run_until(root, lambda: main.saver.finished)
+        result['save_s'] = time.perf_counter() - start
+
+    main.file_menu.close_large_file()
+    main.file_menu.close_journal()
+    root.destroy()
+    result['peak_rss_mb'] = peak_rss()
+    return result
+
+def measure_imports():
+    """Measures how long importing the app takes.
+
+    Returns:
+        dict: the total time in seconds and the slowest modules.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=directory, capture_output=True, text=True, check=True
+    )
+    # lines like 'import time:   123 |   456 |   module'
+    modules = []
+    total = 0
+    for line in process.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not line.startswith('import time:'):
+            continue
+        try:
+            own = int(fields[0].split(':')[1])
+            cumulative = int(fields[1])
+        except ValueError:
+            continue # the header
+        name = fields[2].strip()
+        modules.append((own, name))
+        if name == 'main':
+            total = cumulative
+    modules.sort(reverse=True)
+    return {
+        'import_s': total / 1e6,
+        'slowest_imports': {name: own / 1e6
+                            for own, name in modules[:SLOWEST_IMPORTS]},
+    }
+
+def first_paint():
+    """Shows the main window and tells the parent process. See
+    measure_first_paint()."""
+    import tkinter as tk
+    from main import MainApplication
+
+    root = tk.Tk()
+    MainApplication(root)
+    root.update()
+    print('painted', flush=True)
+    root.destroy()
+
+def measure_first_paint():
+    """Measures the time from starting python to showing the window.
+
+    Returns:
+        float: the time in seconds.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--first-paint'],
+        stdout=subprocess.PIPE, text=True
+    )
+    line = process.stdout.readline()
+    elapsed = time.perf_counter() - start
+    process.wait()
+    if line.strip() != 'painted':
+        raise RuntimeError('the app did not start')
+    return elapsed
+
+def check_startup():
+    """Measures the startup time and compares it with the budget.
+
+    Returns:
+        dict: the results. 'ok' is False if they are over budget.
+    """
+    result = measure_imports()
+    result['first_paint_s'] = measure_first_paint()
+    result['budget'] = {'import_s': IMPORT_BUDGET,
+                        'first_paint_s': FIRST_PAINT_BUDGET}
+    result['ok'] = (result['import_s'] <= IMPORT_BUDGET and
+                    result['first_paint_s'] <= FIRST_PAINT_BUDGET)
+    return result
+
+def run_all(sizes, shapes, directory):
+    """Runs every case in a new process.
+
+    Arguments:
+        sizes (list): file sizes in bytes.
+        shapes (list): kinds of files. See SHAPES.
+        directory (str): where the test files are created.
+
+    Returns:
+        list: the results of every case.
+    """
+    results = []
+    for size in sizes:
+        for shape in shapes:
+            path = generate_file(directory, size, shape)
+            process = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--case', path],
+                capture_output=True, text=True
+            )
+            if process.returncode != 0:
+                results.append({'file': os.path.basename(path), 'bytes': size,
+                                'error': process.stderr.strip()})
+            else:
+                results.append(json.loads(process.stdout))
+            print(json.dumps(results[-1]), file=sys.stderr)
+    return results
+
+def main():
+    """Runs the benchmarks requested in the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='1M,16M,128M,1G',
+                        help='comma separated file sizes (default: %(default)s)')
+    parser.add_argument('--shapes', default=','.join(SHAPES),
+                        help='comma separated kinds of lines '
+                             '(default: %(default)s)')
+    parser.add_argument('--dir', default=os.path.join(tempfile.gettempdir(),
+                                                      'atxt-benchmark'),
+                        help='where the test files are created')
+    parser.add_argument('--output', help='JSON report (default: stdout)')
+    parser.add_argument('--startup', action='store_true',
+                        help='checks the startup time against the budget')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    parser.add_argument('--first-paint', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case)))
+        return
+    if args.first_paint:
+        first_paint()
+        return
+    if args.startup:
+        result = check_startup()
+        print(json.dumps(result, indent=2))
+        sys.exit(0 if result['ok'] else 1)
+
+    os.makedirs(args.dir, exist_ok=True)
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    shapes = [shape for shape in args.shapes.split(',') if shape in SHAPES]
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cases': run_all(sizes, shapes, args.dir),
+    }
+    if args.output:
+        with open(args.output, 'w') as file_:
+            json.dump(report, file_, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
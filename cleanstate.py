@@ -0,0 +1,162 @@
+"""Knows if the document is the same as the saved file.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# number of characters of every hashed block
+BLOCK_SIZE = 1024 * 1024
+
+def new_hash():
+    """Returns the hash object used for every block."""
+    # imported the first time a file is hashed, so the app starts faster
+    import hashlib
+    return hashlib.blake2b(digest_size=16)
+
+class ContentHash:
+    """Hashes of the blocks of a text.
+
+    A text can be compared with them without keeping a copy of it, and
+    a different text is usually told apart by hashing one block.
+
+    Call update() with the pieces of the text and then finish().
+
+    Attributes:
+        length (int): number of characters of the text.
+        digests (list): the hash of every block of BLOCK_SIZE characters.
+    """
+    def __init__(self):
+        """Creates the hash of an empty text."""
+        self.length = 0
+        self.digests = []
+        self.block = new_hash()
+        self.filled = 0 # characters in the current block
+
+    def update(self, text):
+        """Adds a piece of the text.
+
+        Arguments:
+            text (str): the piece.
+        """
+        pos = 0
+        while pos < len(text):
+            part = text[pos:pos + BLOCK_SIZE - self.filled]
+            self.block.update(part.encode('utf-8', 'surrogatepass'))
+            self.filled += len(part)
+            pos += len(part)
+            if self.filled == BLOCK_SIZE:
+                self.digests.append(self.block.digest())
+                self.block = new_hash()
+                self.filled = 0
+        self.length += len(text)
+
+    def finish(self):
+        """Hashes the last block, after the whole text was added.
+
+        Returns:
+            ContentHash: the same object.
+        """
+        if self.filled:
+            self.digests.append(self.block.digest())
+            self.block = new_hash()
+            self.filled = 0
+        return self
+
+    def matches(self, document, hint=0):
+        """Returns True if a document has the hashed text.
+
+        Arguments:
+            document (piecetable.PieceTable): the document.
+            hint (int): a position that probably changed. Its block is
+            compared first.
+        """
+        if len(document) != self.length:
+            return False
+        if not self.digests:
+            return True
+        first = min(hint // BLOCK_SIZE, len(self.digests) - 1)
+        order = [first] + [i for i in range(len(self.digests)) if i != first]
+        for i in order:
+            block = new_hash()
+            end = min((i + 1) * BLOCK_SIZE, self.length)
+            for chunk in document.chunks(i * BLOCK_SIZE, end):
+                block.update(chunk.encode('utf-8', 'surrogatepass'))
+            if block.digest() != self.digests[i]:
+                return False
+        return True
+
+def hash_text(text):
+    """Returns the ContentHash of a text.
+
+    Arguments:
+        text (str): the text.
+    """
+    content_hash = ContentHash()
+    content_hash.update(text)
+    return content_hash.finish()
+
+class CleanState:
+    """Clears the modified flag when the document is the saved file again.
+
+    tk only knows that the text changed since it was saved, so undoing
+    the changes left it modified. After every change, the document is
+    compared with the saved version: first by the undo history (see
+    undo.UndoHistory.state_id()), which is exact and free, and, if it
+    is of the same length, by the hashes of the saved text, which
+    notices the text typed again by hand.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+
+    Attributes:
+        saved_hash (ContentHash): the hashes of the saved text, or None.
+    """
+    def __init__(self, main):
+        """Starts comparing the document after every change.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+        """
+        self.main = main
+        self.saved_hash = None
+        self.last_offset = 0 # where the last change was
+        self.pending = None # tk after id of the next comparison
+        main.textbox.listeners.append(self.on_change)
+
+    def mark_saved(self, saved_hash):
+        """Called when the document was loaded from or saved to the file.
+
+        Arguments:
+            saved_hash (ContentHash): the hashes of the file's text.
+        """
+        self.saved_hash = saved_hash
+        self.main.undo.saved = self.main.undo.checkpoint()
+
+    def on_change(self, operation, offset, text):
+        """Compares the document once the changes in progress end."""
+        self.last_offset = offset
+        if self.pending is None:
+            self.pending = self.main.master.after_idle(self.check)
+
+    def check(self):
+        """Clears the modified flag if the document is the saved text."""
+        self.pending = None
+        textbox = self.main.textbox
+        if not textbox.edit_modified() or self.main.large_file is not None:
+            return
+        if self.main.undo.is_saved() or (
+                self.saved_hash is not None and
+                self.saved_hash.matches(textbox.document, self.last_offset)):
+            textbox.edit_modified(False)
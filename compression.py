@@ -0,0 +1,176 @@
+"""Reads and writes compressed files as streams.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+
+The modules of every format are imported when they are used, so
+opening plain text files doesn't load them. zstd needs the optional
+zstandard package.
+"""
+
+import os
+
+# supported formats: name, bytes at the start of the file, extensions
+FORMATS = (
+    ('gzip', b'\x1f\x8b', ('.gz',)),
+    ('bzip2', b'BZh', ('.bz2',)),
+    ('xz', b'\xfd7zXZ\x00', ('.xz',)),
+    ('zstd', b'\x28\xb5\x2f\xfd', ('.zst',)),
+)
+# number of bytes read to recognize a format
+MAGIC_SIZE = 6
+# for the open file dialogs
+FILETYPES = ('Compressed file', ' '.join(
+    f'*{extension}' for name, magic, extensions in FORMATS
+    for extension in extensions
+))
+
+def detect_compression(path):
+    """Returns the compression format of a file, or None if it is not
+    compressed.
+
+    Arguments:
+        path (str): path of the file.
+
+    Raises:
+        OSError: if the file can't be read.
+    """
+    with open(path, 'rb') as file_:
+        start = file_.read(MAGIC_SIZE)
+    for name, magic, extensions in FORMATS:
+        if start.startswith(magic):
+            return name
+    return None
+
+def compression_for(path):
+    """Returns the compression format of a file name, by its extension.
+
+    Arguments:
+        path (str): path of the file.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    for name, magic, extensions in FORMATS:
+        if extension in extensions:
+            return name
+    return None
+
+def strip_extension(path):
+    """Removes the extension of the compression format from a file name,
+    like 'app.log.gz' to 'app.log'.
+
+    Arguments:
+        path (str): path of the file.
+    """
+    if compression_for(path) is not None:
+        return os.path.splitext(path)[0]
+    return path
+
+def zstandard():
+    """Returns the zstandard module.
+
+    Raises:
+        OSError: if it is not installed.
+    """
+    try:
+        import zstandard
+    except ImportError:
+        raise OSError('zstd files need the zstandard package') from None
+    return zstandard
+
+def open_reader(raw, compression):
+    """Returns a binary stream that decompresses a file.
+
+    Arguments:
+        raw (file): the compressed file, opened in binary mode. Closing
+        the stream doesn't close it.
+        compression (str): one of the names of FORMATS, or None.
+    """
+    if compression is None:
+        return raw
+    if compression == 'gzip':
+        import gzip
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if compression == 'bzip2':
+        import bz2
+        return bz2.BZ2File(raw, 'rb')
+    if compression == 'xz':
+        import lzma
+        return lzma.LZMAFile(raw, 'rb')
+    return zstandard().ZstdDecompressor().stream_reader(
+        raw, read_across_frames=True, closefd=False
+    )
+
+def open_writer(raw, compression):
+    """Returns a binary stream that compresses what is written to it.
+
+    Close it to write the end of the compressed data.
+
+    Arguments:
+        raw (file): the file, opened in binary mode. Closing the stream
+        doesn't close it.
+        compression (str): one of the names of FORMATS, or None.
+    """
+    if compression is None:
+        return raw
+    if compression == 'gzip':
+        import gzip
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6)
+    if compression == 'bzip2':
+        import bz2
+        return bz2.BZ2File(raw, 'wb')
+    if compression == 'xz':
+        import lzma
+        return lzma.LZMAFile(raw, 'wb')
+    return zstandard().ZstdCompressor().stream_writer(raw, closefd=False)
+
+def read_start(path, size, compression):
+    """Returns the first bytes of the uncompressed contents of a file.
+
+    Arguments:
+        path (str): path of the file.
+        size (int): max number of bytes.
+        compression (str): one of the names of FORMATS, or None.
+
+    Raises:
+        OSError: if the file can't be read or decompressed.
+    """
+    with open(path, 'rb') as raw:
+        stream = open_reader(raw, compression)
+        parts = []
+        read = 0
+        try:
+            while read < size:
+                part = stream.read(size - read)
+                if not part:
+                    break
+                parts.append(part)
+                read += len(part)
+        except OSError:
+            raise
+        except Exception as error:
+            raise damaged(compression, error) from error
+    return b''.join(parts)
+
+def damaged(compression, error):
+    """Returns the OSError raised for a file that can't be decompressed.
+
+    lzma, zstandard and truncated streams raise their own exceptions,
+    they are all turned into OSError like the ones of gzip.
+
+    Arguments:
+        compression (str): name of the format.
+        error (Exception): the original exception.
+    """
+    return OSError(f'the {compression} data is damaged ({error})')
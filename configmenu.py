@@ -18,15 +18,15 @@ along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
 
 import tkinter as tk
 import tkinter.font
-import tkinter.colorchooser as ColorChooser
-import configparser
-import tkfontchooser
+
+from configstore import ConfigStore
 
 def save_cfg(function):
     """Decorator function.
     
     Calls a function that makes changes in the UI and saves the user
-    preferences in a .cfg file.
+    preferences in a .cfg file. The file is written a moment later in
+    the background. See configstore.ConfigStore.
 
     Arguments:
         function (function): function to be decorated
@@ -38,8 +38,7 @@ def save_cfg(function):
             self (ConfigMenu): the instance of the class we are running. 
         """
         function(self, *args)
-        with open('config.cfg', 'w') as configfile:
-            self.config.write(configfile)
+        self.main.settings.changed()
     return wrapper
 
 
@@ -55,6 +54,8 @@ def pick_color(function):
         Arguments:
             self (ConfigMenu): the instance of the class we are running.
         """
+        # imported the first time it is used, so the app starts faster
+        import tkinter.colorchooser as ColorChooser
         x = ColorChooser.askcolor()
         if x == (None, None):
             return
@@ -79,13 +80,28 @@ class ConfigMenu:
         self.create_gui()
     
     def create_gui(self):
-        """Creates the config menu GUI elements."""
-        configmenu = tk.Menu(self.main.menubar, tearoff=False)
+        """Adds the config menu to the menu bar.
+
+        Its buttons are created the first time it is opened.
+        """
+        self.configmenu = tk.Menu(self.main.menubar, tearoff=False,
+                                  postcommand=self.create_menu_buttons)
+        self.main.menubar.add_cascade(label='Config', menu=self.configmenu)
+
+    def create_menu_buttons(self):
+        """Creates the config menu GUI elements, if they weren't created."""
+        configmenu = self.configmenu
+        if configmenu.index('end') is not None:
+            return
 
         configmenu.add_checkbutton(
             label='Show status bar', variable=self.show_status_bar,
             command=self.set_statusbar
         )
+        configmenu.add_checkbutton(
+            label='Highlight logs, JSON and INI files',
+            variable=self.highlight, command=self.set_highlight
+        )
         configmenu.add_separator()
 
         radiobuttons = {'Do not wrap the text': 'none',
@@ -104,22 +120,25 @@ class ConfigMenu:
         configmenu.add_separator()
         configmenu.add_command(label='Change background color...',
                                command=self.set_background)
-
-        self.main.menubar.add_cascade(label='Config', menu=configmenu)    
+        configmenu.add_separator()
+        configmenu.add_checkbutton(
+            label='Keep undo history after closing a file',
+            variable=self.persist_undo, command=self.set_persist_undo
+        )
+        configmenu.add_checkbutton(
+            label='Keep a search index of opened files and folders',
+            variable=self.search_index, command=self.set_search_index
+        )
 
     def load_config(self):
         """Loads the cfg file and configs the UI accordingly.
         
         If there is not a cfg file, it uses deafault values.
         """
-        self.config = configparser.ConfigParser()
-        self.config.read('config.cfg')
-        
-        sections = ['Background', 'View', 'Font']
-        
-        for s in sections:
-            if self.config.has_section(s) is False:
-                self.config.add_section(s)
+        self.main.settings = ConfigStore(
+            self.main.master, sections=['Background', 'View', 'Font', 'Edit']
+        )
+        self.config = self.main.settings.config
 
         self.show_status_bar = tk.BooleanVar(
             self.main.master, value=self.config.getboolean(
@@ -127,6 +146,12 @@ class ConfigMenu:
             )
         )
         self.wrapping = tk.StringVar(value=self.config['View'].get('wrap', 'none'))
+        self.highlight = tk.BooleanVar(
+            self.main.master, value=self.config.getboolean(
+                'View', 'highlight', fallback=1
+            )
+        )
+        self.main.highlighter.set_enabled(self.highlight.get())
 
         tkfont = tk.font.Font(
             self.main.master,
@@ -145,8 +170,29 @@ class ConfigMenu:
             font=tkfont, wrap=self.wrapping.get()
         )
 
+        self.persist_undo = tk.BooleanVar(
+            self.main.master, value=self.config.getboolean(
+                'Edit', 'persist_undo', fallback=0
+            )
+        )
+        self.main.undo.persist = self.persist_undo.get()
+        self.search_index = tk.BooleanVar(
+            self.main.master, value=self.config.getboolean(
+                'Edit', 'search_index', fallback=0
+            )
+        )
+        self.main.indexer.set_enabled(self.search_index.get())
+        # max memory used by the undo history, in MB
+        self.main.undo.memory_limit = self.config.getint(
+            'Edit', 'undo_memory', fallback=32
+        ) * 1024 * 1024
+        # max memory used by the documents of all the tabs, in MB
+        self.main.tabs.memory_limit = self.config.getint(
+            'Edit', 'tabs_memory', fallback=256
+        ) * 1024 * 1024
+
         self.set_scrollbar()
-        self.set_statusbar()
+        self.show_statusbar()
 
     def set_scrollbar(self):
         """Controls the horizontal scrollbar of the text display.
@@ -166,12 +212,33 @@ class ConfigMenu:
         Else, it hides it.
         """
         self.config['View']['show_status_bar'] = str(self.show_status_bar.get())
-        
+        self.show_statusbar()
+
+    def show_statusbar(self):
+        """Shows or hides the statusbar, without saving the preference."""
         if self.show_status_bar.get():
             self.main.status_frame.pack(fill='x')
         else:
             self.main.status_frame.pack_forget()
     
+    @save_cfg
+    def set_highlight(self):
+        """Turns on or off the highlighting of logs, JSON and INI files."""
+        self.main.highlighter.set_enabled(self.highlight.get())
+        self.config['View']['highlight'] = str(self.highlight.get())
+
+    @save_cfg
+    def set_persist_undo(self):
+        """Turns on or off storing the undo history next to saved files."""
+        self.main.undo.persist = self.persist_undo.get()
+        self.config['Edit']['persist_undo'] = str(self.persist_undo.get())
+
+    @save_cfg
+    def set_search_index(self):
+        """Turns on or off the trigram index used by Find in Files."""
+        self.main.indexer.set_enabled(self.search_index.get())
+        self.config['Edit']['search_index'] = str(self.search_index.get())
+
     @save_cfg
     def set_wrapping(self):
         """Changes the text wrapping."""
@@ -181,6 +248,7 @@ class ConfigMenu:
 
     @save_cfg
     def change_font(self):
+        import tkfontchooser
         font = tkfontchooser.askfont(self.main.master)
         if font:
             tkfont = tk.font.Font(
@@ -0,0 +1,157 @@
+"""Keeps the user preferences and saves them in the background.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import configparser
+import io
+import os
+import sys
+import threading
+
+from filesaver import write_atomic
+
+# name of the app's directory in the user's config directory
+APP_NAME = 'another-txt-editor'
+# where older versions stored the preferences, relative to the
+# working directory
+LEGACY_PATH = 'config.cfg'
+# time (in ms) without changes before the preferences are written
+WRITE_DELAY = 500
+
+def config_dir():
+    """Returns the directory where the user's preferences are stored.
+
+    It follows the XDG Base Directory specification, and uses
+    %APPDATA% on Windows.
+    """
+    if sys.platform == 'win32' and os.environ.get('APPDATA'):
+        base = os.environ['APPDATA']
+    else:
+        base = (os.environ.get('XDG_CONFIG_HOME') or
+                os.path.join(os.path.expanduser('~'), '.config'))
+    return os.path.join(base, APP_NAME)
+
+def cache_dir():
+    """Returns the directory where data that can be rebuilt is stored.
+
+    It follows the XDG Base Directory specification, and uses
+    %LOCALAPPDATA% on Windows.
+    """
+    if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+        base = os.environ['LOCALAPPDATA']
+    else:
+        base = (os.environ.get('XDG_CACHE_HOME') or
+                os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, APP_NAME)
+
+class ConfigStore:
+    """The user preferences, in memory.
+
+    Changes are written to the disk WRITE_DELAY ms after the last one,
+    in a worker thread, atomically, and only if the file would change.
+
+    Arguments:
+        master (tkinter.Tk): root widget of the app.
+        sections (iterable): sections that are created if the file
+        doesn't have them.
+        path (str): path of the file. By default, config.cfg in
+        config_dir().
+
+    Attributes:
+        config (configparser.ConfigParser): the preferences. Call
+        changed() after modifying them.
+    """
+    def __init__(self, master, sections=(), path=None):
+        """Reads the preferences.
+
+        Arguments:
+            master (tkinter.Tk): root widget of the app.
+            sections (iterable): sections that always exist.
+            path (str): path of the file.
+        """
+        self.master = master
+        self.path = path or os.path.join(config_dir(), 'config.cfg')
+        self.pending = None # tk after id of the next write
+        self.thread = None
+
+        self.config = configparser.ConfigParser()
+        migrate = (not os.path.exists(self.path) and
+                   os.path.exists(LEGACY_PATH))
+        self.config.read(LEGACY_PATH if migrate else self.path)
+        for section in sections:
+            if not self.config.has_section(section):
+                self.config.add_section(section)
+
+        # what the file has, to skip writes that wouldn't change it
+        self.saved = self.dump()
+        if migrate:
+            self.saved = None
+            self.changed()
+
+    def dump(self):
+        """Returns the preferences as the text of the file."""
+        text = io.StringIO()
+        self.config.write(text)
+        return text.getvalue()
+
+    def changed(self):
+        """Schedules a write after some preferences were modified."""
+        if self.pending is not None:
+            self.master.after_cancel(self.pending)
+        self.pending = self.master.after(WRITE_DELAY, self.save)
+
+    def save(self):
+        """Writes the preferences in a worker thread, if they changed."""
+        self.pending = None
+        if self.thread is not None and self.thread.is_alive():
+            # one write at a time, the last one wins
+            self.changed()
+            return
+        text = self.dump()
+        if text == self.saved:
+            return
+        self.saved = text
+        # not a daemon, so closing the app waits for the write
+        self.thread = threading.Thread(target=self.write, args=(text,))
+        self.thread.start()
+
+    # worker thread
+    def write(self, text):
+        """Writes the file.
+
+        Arguments:
+            text (str): the preferences, as text.
+        """
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            write_atomic(self.path, [text])
+        except OSError:
+            # written again after the next change
+            self.saved = None
+
+    # UI thread
+    def flush(self):
+        """Writes the pending changes now. Called when the app closes."""
+        if self.pending is not None:
+            self.master.after_cancel(self.pending)
+            self.pending = None
+        if self.thread is not None:
+            self.thread.join()
+        text = self.dump()
+        if text != self.saved:
+            self.saved = text
+            self.write(text)
@@ -1,17 +1,60 @@
 """Code by Bryan Oakley on StackOverflow
 https://stackoverflow.com/questions/23571407/how-to-i-have-the-call-back-in-tkinter-when-i-change-the-current-insert-position
 """
+import contextlib
 import tkinter as tk
 
+from lineindex import LineIndex
+from piecetable import PieceTable
+
+# text with this tag can only be deleted as a whole, not edited
+READ_ONLY = "read_only"
+
 class CustomText(tk.Text):
     """A custom text widget.
 
     Raises an event when text or text cursor position change. Ideal for
-    making a status bar.
+    making a status bar. The changes are coalesced: at most one event
+    is raised every event_interval ms, and none while the events are
+    suspended. See suspend_events().
+
+    It raises a <<ViewChange>> event too, coalesced the same way, when
+    the visible part of the text may have changed.
+
+    It also keeps a copy of its text in a piece table, so the text can
+    be saved or searched without getting it from tk as one big string,
+    and an index of its lines, so positions are converted without
+    counting characters.
+
+    Text tagged with READ_ONLY can't be edited: insertions inside it
+    and deletions of a part of it are ignored.
+
+    Attributes:
+        document (piecetable.PieceTable): the text of the widget.
+        lines (lineindex.LineIndex): the lines of the text.
+        listeners (list): functions called after every change of the
+        text with the arguments (operation, offset, text). operation is
+        'insert', 'delete' (text is the deleted text) or 'reset' (all
+        the text was replaced by text).
+        event_interval (int): min time in ms between two <<CursorChange>>
+        events. 16 ms is about one event per frame.
+        cursor_changes (int): number of changes of the text or the text
+        cursor position, that used to raise one event each.
+        cursor_events (int): number of events that were raised.
     """
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, event_interval=16, **kwargs):
         tk.Text.__init__(self, *args, **kwargs)
 
+        self.document = PieceTable()
+        self.lines = LineIndex()
+        self.listeners = []
+
+        self.event_interval = event_interval
+        self.cursor_changes = 0
+        self.cursor_events = 0
+        self._pending_events = {} # event name: tk after id
+        self._suspended = 0
+
         # create a proxy for the underlying widget
         self._orig = self._w + "_orig"
         self.tk.call("rename", self._w, self._orig)
@@ -19,12 +62,194 @@ class CustomText(tk.Text):
 
     def _proxy(self, *args):
         cmd = (self._orig,) + args
+
+        # tk ignores insertions and deletions if the widget is disabled
+        editable = (args[0] in ("insert", "delete", "replace") and
+                    self.tk.call(self._orig, "cget", "-state") != "disabled")
+        if editable:
+            # the indices have to be converted before they change
+            if args[0] == "insert":
+                start = self.offset(args[1])
+            elif args[0] == "replace" or len(args) <= 3:
+                start = self.offset(args[1])
+                if len(args) == 2:
+                    end = start + 1
+                else:
+                    end = self.offset(args[2])
+            if self._touches_read_only(args):
+                self.bell()
+                return ""
+
         result = self.tk.call(cmd)
 
+        # keep the document in sync with the widget
+        if editable:
+            if args[0] == "insert":
+                self._insert(start, "".join(args[2::2]))
+            elif args[0] == "delete" and len(args) <= 3:
+                self._delete(start, end)
+            elif args[0] == "replace":
+                self._delete(start, end)
+                self._insert(start, "".join(args[3::2]))
+            else:
+                # deleting several ranges at once, tk sorts them out
+                self._resync()
+        elif args[0:2] in (("edit", "undo"), ("edit", "redo")):
+            # tk undoes changes without calling insert or delete
+            self._resync()
+
         # generate an event if something was added or deleted,
         # or the cursor position changed
-        if (args[0] in ("insert", "delete") or 
+        if (args[0] in ("insert", "delete") or
             args[0:3] == ("mark", "set", "insert")):
-            self.event_generate("<<CursorChange>>", when="tail")
+            self.cursor_changes += 1
+            self._schedule_event("<<CursorChange>>")
+        if (args[0] in ("insert", "delete", "see") or
+            (args[0] == "yview" and len(args) > 1)):
+            self._schedule_event("<<ViewChange>>")
+
+        return result
+
+    def _touches_read_only(self, args):
+        """Returns True if an edit would change a part of a READ_ONLY text.
+
+        Arguments:
+            args (tuple): the arguments of the insert, delete or replace
+            command.
+        """
+        if not self.tk.call(self._orig, "tag", "ranges", READ_ONLY):
+            return False
+        if args[0] == "insert":
+            return self._inside_read_only(args[1])
+        if args[0] == "delete" and len(args) > 3:
+            return False # several ranges, only used to delete everything
+        start = args[1]
+        end = args[2] if len(args) > 2 else f"{args[1]}+1c"
+        return self._inside_read_only(start) or self._inside_read_only(end)
+
+    def _inside_read_only(self, index):
+        """Returns True if an index is between two READ_ONLY characters."""
+        names = self.tk.call(self._orig, "tag", "names", index)
+        before = self.tk.call(self._orig, "tag", "names", f"{index}-1c")
+        return (READ_ONLY in self.tk.splitlist(names) and
+                READ_ONLY in self.tk.splitlist(before))
+
+    def _schedule_event(self, name):
+        """Raises an event soon, unless the same event is pending.
+
+        Arguments:
+            name (str): the name of the event, like '<<CursorChange>>'.
+        """
+        if self._suspended or name in self._pending_events:
+            return
+        self._pending_events[name] = self.after(
+            self.event_interval, lambda: self._generate_event(name)
+        )
+
+    def _generate_event(self, name):
+        """Raises a pending event.
+
+        Arguments:
+            name (str): the name of the event.
+        """
+        del self._pending_events[name]
+        if name == "<<CursorChange>>":
+            self.cursor_events += 1
+        self.event_generate(name, when="tail")
+
+    @contextlib.contextmanager
+    def suspend_events(self):
+        """Stops raising events inside a with block.
+
+        Used by bulk operations, like loading a file, that change the
+        text a lot of times. One event of each kind is raised at the end.
+        """
+        self._suspended += 1
+        try:
+            yield
+        finally:
+            self._suspended -= 1
+            if not self._suspended:
+                self._schedule_event("<<CursorChange>>")
+                self._schedule_event("<<ViewChange>>")
+
+    def event_stats(self):
+        """Returns the counters of the <<CursorChange>> events.
+
+        Returns:
+            dict: the number of changes and of events raised for them.
+        """
+        return {"changes": self.cursor_changes, "events": self.cursor_events}
+
+    def destroy(self):
+        for after_id in self._pending_events.values():
+            self.after_cancel(after_id)
+        self._pending_events.clear()
+        tk.Text.destroy(self)
+
+    def offset(self, index):
+        """Converts a tk index to a position in the document.
+
+        Arguments:
+            index (str): a tk text index, like 'insert' or '1.0'.
+
+        Returns:
+            int: the number of characters before the index.
+        """
+        line, column = str(self.tk.call(self._orig, "index", index)).split(".")
+        offset = self.lines.line_start(int(line) - 1) + int(column)
+        return min(offset, len(self.document))
+
+    def index_at(self, offset):
+        """Converts a position in the document to a tk index.
+
+        Arguments:
+            offset (int): the number of characters before the index.
+
+        Returns:
+            str: a tk text index.
+        """
+        line, column = self.lines.position(offset)
+        return f"{line + 1}.{column}"
+
+    def clear(self):
+        """Deletes all the text at once.
+
+        Unlike delete(), the deleted text is not copied for the
+        listeners: they get a 'reset' to an empty text.
+        """
+        self.tk.call(self._orig, "delete", "1.0", "end")
+        self.document.reset()
+        self.lines.reset()
+        for listener in self.listeners:
+            listener("reset", 0, "")
+        self._schedule_event("<<CursorChange>>")
+        self._schedule_event("<<ViewChange>>")
+
+    def _insert(self, offset, text):
+        """Inserts text in the document and notifies the listeners."""
+        if not text:
+            return
+        self.document.insert(offset, text)
+        self.lines.insert(offset, text)
+        for listener in self.listeners:
+            listener("insert", offset, text)
+
+    def _delete(self, start, end):
+        """Deletes text from the document and notifies the listeners."""
+        end = min(end, len(self.document))
+        if end <= start:
+            return
+        text = self.document.get(start, end)
+        self.document.delete(start, end - start)
+        self.lines.delete(start, text)
+        for listener in self.listeners:
+            listener("delete", start, text)
 
-        return result
\ No newline at end of file
+    def _resync(self):
+        """Copies all the text of the widget to the document."""
+        text = self.tk.call(self._orig, "get", "1.0", "end-1c")
+        self.document.reset(text)
+        self.lines.reset(text)
+        for listener in self.listeners:
+            listener("reset", 0, text)
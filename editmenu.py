@@ -18,6 +18,10 @@ along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
 
 import tkinter as tk
 
+from finddialog import FindDialog
+from findinfiles import FindInFiles
+from simplebinds import bind_
+
 class EditMenu:
     """'Edit' menu graphic elements and functionalities.
     
@@ -31,15 +35,40 @@ class EditMenu:
             main (main.MainApplication): an instance of the main class
         """
         self.main = main
+        self.find_dialog = FindDialog(main)
+        self.find_in_files = FindInFiles(main)
 
-        self.create_menu_buttons()
-        self.grey_out()
+        self.create_menu()
+        self.key_shortcuts()
         self.main.textbox.bind('<<Selection>>', lambda event:self.grey_out())
 
+    def create_menu(self):
+        """Adds the edit menu to the menu bar and the contextual menu.
+
+        Its buttons are created the first time it is opened.
+        """
+        self.editmenu = tk.Menu(self.main.menubar, tearoff=0,
+                                postcommand=self.create_menu_buttons)
+        self.main.menubar.add_cascade(label='Edit', menu=self.editmenu)
+
+        # contextual menu
+        self.main.textbox.bind(
+            '<Button-3>',
+            lambda event: self.editmenu.post(event.x_root, event.y_root)
+        )
+        self.main.textbox.bind(
+            '<App>', lambda event: self.editmenu.post(
+                self.main.master.winfo_rootx(), self.main.master.winfo_rooty()
+            )
+        )
+
     def create_menu_buttons(self):
-        """Creates the menu buttons for the edit menu."""
-        self.editmenu = tk.Menu(self.main.menubar, tearoff=0)
-        
+        """Creates the menu buttons for the edit menu, if they weren't
+        created, and greys out the ones that can't be used."""
+        if self.editmenu.index('end') is not None:
+            self.grey_out()
+            return
+
         self.editmenu.add_command(
             label='Undo', accelerator='Ctrl+Z',
             command=lambda: self.main.textbox.event_generate('<<Undo>>')
@@ -70,23 +99,68 @@ class EditMenu:
             label='Delete', accelerator='Del',
             command=lambda:self.main.textbox.event_generate('<<Clear>>')
         )
-        
-        self.main.menubar.add_cascade(label='Edit', menu=self.editmenu)
-
-        # contextual menu
-        self.main.textbox.bind(
-            '<Button-3>',
-            lambda event: self.editmenu.post(event.x_root, event.y_root)
+        self.editmenu.add_separator()
+        self.editmenu.add_command(
+            label='Find...', accelerator='Ctrl+F',
+            command=self.find_dialog.show
         )
-        self.main.textbox.bind(
-            '<App>', lambda event: self.editmenu.post(
-                self.main.master.winfo_rootx(), self.main.master.winfo_rooty()
-            )
+        self.editmenu.add_command(
+            label='Find next', accelerator='F3',
+            command=self.find_dialog.find_next
+        )
+        self.editmenu.add_command(
+            label='Replace...', accelerator='Ctrl+H',
+            command=lambda: self.find_dialog.show(replace=True)
+        )
+        self.editmenu.add_command(
+            label='Find in files...', accelerator='Ctrl+Shift+F',
+            command=self.find_in_files.show
+        )
+        self.editmenu.add_command(
+            label='Go to line...', accelerator='Ctrl+G',
+            command=self.go_to_line
+        )
+        self.editmenu.add_command(
+            label='Show more of a long line', accelerator='Ctrl+E',
+            command=self.main.long_lines.expand
+        )
+        self.grey_out()
+
+    def key_shortcuts(self):
+        """Adds key bindings to the find, replace, find in files, go to
+        line and show more buttons."""
+        bind_(self.main.master, 'Control', 'f',
+              lambda event: self.find_dialog.show())
+        bind_(self.main.master, 'Control', 'h',
+              lambda event: self.find_dialog.show(replace=True))
+        bind_(self.main.master, 'Control-Shift', 'f',
+              lambda event: self.find_in_files.show())
+        self.main.master.bind('<F3>', self.find_dialog.find_next)
+        bind_(self.main.master, 'Control', 'g',
+              lambda event: self.go_to_line())
+        # on the text display, as its class binding moves the cursor
+        bind_(self.main.textbox, 'Control', 'e', self.main.long_lines.expand)
+
+    def go_to_line(self):
+        """Asks for a line number and moves the text cursor to it."""
+        if self.main.large_file is not None:
+            total = self.main.large_file.index.line_count()
+        else:
+            total = self.main.textbox.lines.line_count()
+        # imported the first time it is used, so the app starts faster
+        from tkinter import simpledialog
+        line = simpledialog.askinteger(
+            'Go to line', f'Line number (1 - {total}):',
+            parent=self.main.master, minvalue=1, maxvalue=total
         )
+        if line is not None:
+            self.main.go_to_line(line)
 
     def grey_out(self):
         """Disables cut, copy, and delete buttons if there is not text selected."""
         entries = [3, 4, 8]
+        if self.editmenu.index('end') is None:
+            return # the menu was not opened yet
         
         if self.main.textbox.tag_ranges('sel'):
             state = 'normal'
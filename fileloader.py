@@ -0,0 +1,297 @@
+"""Loads text files into the text display without blocking the UI.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import io
+import os
+import queue
+import threading
+import time
+import tkinter.messagebox
+
+from cleanstate import ContentHash
+from compression import damaged, open_reader
+from textcodec import detect_format, FALLBACK_ENCODING
+
+# number of characters read from the file at a time
+CHUNK_SIZE = 1024 * 1024
+# how often (in ms) the UI checks for new chunks
+POLL_INTERVAL = 10
+# max time (in ms) spent inserting chunks before giving control back to tk
+INSERT_BUDGET = 30
+
+def file_identity(stat):
+    """Returns what changes when a file is modified or replaced.
+
+    Arguments:
+        stat (os.stat_result): the result of os.stat() for the file.
+    """
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+def read_chunks(path, file_format=None, chunk_size=CHUNK_SIZE):
+    """Reads a text file a chunk at a time.
+
+    The file is decompressed and decoded incrementally, and its line
+    breaks are converted to '\n'.
+
+    Arguments:
+        path (str): path of the file to read.
+        file_format (textcodec.FileFormat): the format of the file. If
+        it is None, it is guessed. See textcodec.detect_format().
+        chunk_size (int): max number of characters in every chunk.
+
+    Yields:
+        tuple: the text of the chunk and the number of bytes read so far,
+        from the file as it is in the disk.
+    """
+    if file_format is None:
+        file_format = detect_format(path)
+    with open(path, 'rb') as raw:
+        file_ = io.TextIOWrapper(open_reader(raw, file_format.compression),
+                                 encoding=file_format.encoding)
+        bom = file_format.bom
+        while True:
+            try:
+                chunk = file_.read(chunk_size)
+            except (OSError, UnicodeDecodeError):
+                raise
+            except Exception as error:
+                if file_format.compression is None:
+                    raise
+                raise damaged(file_format.compression, error) from error
+            if not chunk:
+                break
+            if bom:
+                chunk = chunk[1:]
+                bom = False
+            yield chunk, raw.tell()
+
+class ChunkedLoader:
+    """Reads a file in a worker thread and feeds it to the text display.
+
+    The text display is read-only while the file is being loaded, but
+    it can be scrolled and searched.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+        path (str): path of the file to load.
+        on_done (function): called without arguments when the whole file
+        was inserted in the text display.
+        file_format (textcodec.FileFormat): the format of the file. If
+        it is None, it is guessed.
+
+    Attributes:
+        file_format (textcodec.FileFormat): the format of the file.
+        stat (tuple): file_identity() of the file before it was read.
+        content_hash (cleanstate.ContentHash): hashes of the text, once
+        it was read.
+    """
+    def __init__(self, main, path, on_done=None, file_format=None):
+        """Guesses the format of the file. Call start() to begin loading.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+            path (str): path of the file to load.
+            on_done (function): called when the file was fully loaded.
+            file_format (textcodec.FileFormat): the format of the file.
+
+        Raises:
+            OSError: if the file can't be read.
+        """
+        self.main = main
+        self.path = path
+        self.on_done = on_done
+
+        if file_format is None:
+            file_format = detect_format(path)
+        self.file_format = file_format
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.stat = file_identity(stat)
+        self.bytes_read = 0
+        self.chars_read = 0
+        self.content_hash = None
+        self.finished = False
+
+        # a bounded queue stops the worker from reading the whole file
+        # into memory if the UI is slower than the disk
+        self.queue = queue.Queue(maxsize=4)
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.read, daemon=True)
+
+    def start(self):
+        """Empties the text display and starts reading the file."""
+        textbox = self.main.textbox
+        # loading the file can't be undone
+        self.main.undo.enabled = False
+        textbox.delete(1.0, 'end')
+        textbox.config(state='disabled')
+
+        self.main.set_file_format(self.file_format)
+        self.start_time = time.perf_counter()
+        self.thread.start()
+        self.main.set_status('Loading... 0%')
+        self.main.master.after(POLL_INTERVAL, self.poll)
+
+    def cancel(self):
+        """Stops loading the file.
+
+        The text loaded so far stays in the text display, but it is not
+        linked to the file anymore, so saving it can't truncate the file.
+        """
+        if self.finished:
+            return
+        self.cancelled.set()
+        self.finish()
+        self.main.path = ''
+        self.main.set_status('Loading cancelled')
+        self.main.configure_title()
+
+    # worker thread
+    def chunks(self):
+        """Yields (chunk, position) tuples of the text to load, where
+        position is the progress, out of self.size."""
+        return read_chunks(self.path, self.file_format)
+
+    def read(self):
+        """Puts the chunks of the file in the queue."""
+        content_hash = ContentHash()
+        try:
+            for chunk, position in self.chunks():
+                content_hash.update(chunk)
+                while not self.cancelled.is_set():
+                    try:
+                        self.queue.put((chunk, position), timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if self.cancelled.is_set():
+                    return
+        except (OSError, UnicodeDecodeError) as error:
+            self.queue.put(error)
+        else:
+            self.content_hash = content_hash.finish()
+            self.queue.put(None) # end of file
+
+    # UI thread
+    def poll(self):
+        """Inserts the chunks that are ready without freezing the UI."""
+        if self.finished:
+            return
+
+        textbox = self.main.textbox
+        deadline = time.perf_counter() + INSERT_BUDGET / 1000
+        while time.perf_counter() < deadline:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is None:
+                self.finish()
+                self.main.set_status(self.throughput(done=True))
+                if self.on_done is not None:
+                    self.on_done()
+                return
+            if (isinstance(item, UnicodeDecodeError) and
+                    not self.file_format.bom and
+                    self.file_format.encoding != FALLBACK_ENCODING):
+                # the start of the file was guessed wrong
+                self.restart(FALLBACK_ENCODING)
+                break
+            if isinstance(item, Exception):
+                self.finish()
+                self.main.path = ''
+                self.main.configure_title()
+                self.main.set_status('')
+                show_read_error(self.main.master, self.path, item)
+                return
+
+            chunk, self.bytes_read = item
+            self.chars_read += len(chunk)
+            with textbox.suspend_events():
+                textbox.config(state='normal')
+                textbox.insert('end-1c', chunk)
+                textbox.config(state='disabled')
+            # loading the file is not a modification made by the user
+            textbox.edit_modified(False)
+
+        if self.size:
+            percent = self.bytes_read * 100 // self.size
+            self.main.set_status(f'Loading... {percent}%  '
+                                 f'{self.throughput()}  (Esc to cancel)')
+        self.main.master.after(POLL_INTERVAL, self.poll)
+
+    def throughput(self, done=False):
+        """Returns how fast a compressed file is decompressed, for the
+        status bar, or '' if it is not compressed.
+
+        Arguments:
+            done (bool): True if the whole file was read.
+        """
+        compression = self.file_format.compression
+        if compression is None:
+            return ''
+        elapsed = max(time.perf_counter() - self.start_time, 1e-6)
+        size = self.chars_read / 1024 / 1024
+        if done:
+            return (f'Decompressed {size:.1f} MB of {compression} in '
+                    f'{elapsed:.2f} s ({size / elapsed:.0f} MB/s)')
+        return f'{compression} {size / elapsed:.0f} MB/s'
+
+    def restart(self, encoding):
+        """Loads the file again from the start with another encoding.
+
+        Arguments:
+            encoding (str): name of the python codec.
+        """
+        textbox = self.main.textbox
+        with textbox.suspend_events():
+            textbox.config(state='normal')
+            textbox.delete(1.0, 'end')
+            textbox.config(state='disabled')
+        textbox.edit_modified(False)
+
+        self.file_format = self.file_format._replace(encoding=encoding)
+        self.main.set_file_format(self.file_format)
+        self.bytes_read = 0
+        self.chars_read = 0
+        self.start_time = time.perf_counter()
+        self.queue = queue.Queue(maxsize=4)
+        self.thread = threading.Thread(target=self.read, daemon=True)
+        self.thread.start()
+
+    def finish(self):
+        """Makes the text display editable again."""
+        self.finished = True
+        textbox = self.main.textbox
+        textbox.config(state='normal')
+        self.main.undo.enabled = True
+        self.main.reset()
+
+def show_read_error(master, path, error):
+    """Tells the user that a file couldn't be read.
+
+    Arguments:
+        master (tkinter.Tk): root widget of the app.
+        path (str): path of the file.
+        error (Exception): the error raised while reading it.
+    """
+    tkinter.messagebox.showerror(
+        title='Error', message=f'Could not open\n"{path}":\n{error}',
+        parent=master
+    )
@@ -16,33 +16,16 @@ You should have received a copy of the GNU General Public License
 along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import os
 import tkinter as tk
 import tkinter.messagebox
-import tkinter.filedialog
 from simplebinds import bind_
-
-# decorator
-def save_changes(function):
-    """Asks the user to save their unsaved changes in a text document."""
-    def wrapper(self, *args):
-        if self.main.path == '':
-            path = 'New file'
-        else:
-            path = self.main.path
-            
-        if self.main.textbox.edit_modified():
-            s = tkinter.messagebox.askyesnocancel(
-                title='Unsaved changes',
-                message=f'Do you want to save the changes made in\n"{path}"?'
-            )
-            if s:
-                self.save_file()
-            # if the user press cancel stops the rest of the execution
-            elif s is None:
-                return
-        function(self)
-        self.main.textbox.edit_modified(False)
-    return wrapper
+import compression
+from fileloader import ChunkedLoader, file_identity, show_read_error
+from largefile import LargeFileView, LARGE_FILE_SIZE
+from filesaver import BackgroundSaver
+from textcodec import detect_format, is_ascii_compatible
+import journal
 
 class FileMenu:
     """'File' menu GUI elements and functionalities.
@@ -58,24 +41,66 @@ class FileMenu:
             main (main.MainApplication): an instance of the main class
         """
         self.main = main
+        self.recovered = None # changes to replay once the file is loaded
+        self.go_to = None # line shown once the file is loaded
+        self.restore_view = False # True to show where the user was
+        self.follow = tk.BooleanVar(self.main.master, value=False)
         self.create_ui()
         self.key_shortcuts()
 
+        # writes every change to the journal of the file
+        self.main.textbox.listeners.append(self.record_change)
+        self.main.master.after(journal.AUTOSAVE_INTERVAL, self.autosave)
+
     def create_ui(self):
-        """Creates the file menu buttons."""
-        filemenu = tk.Menu(self.main.menubar, tearoff=0)
+        """Adds the file menu to the menu bar.
+
+        Its buttons are created the first time it is opened.
+        """
+        self.filemenu = tk.Menu(self.main.menubar, tearoff=0,
+                                postcommand=self.create_menu_buttons)
+        self.main.menubar.add_cascade(label='File', menu=self.filemenu)
+        self.recent_menu = tk.Menu(self.filemenu, tearoff=0,
+                                   postcommand=self.fill_recent_menu)
+
+    def create_menu_buttons(self):
+        """Creates the file menu buttons, if they weren't created."""
+        filemenu = self.filemenu
+        if filemenu.index('end') is not None:
+            return
         filemenu.add_command(label='New file',
                              accelerator='Ctrl+N', command=self.new_file)
         filemenu.add_command(label='Open file...',
                              accelerator='Ctrl+O', command=self.open_file)
+        filemenu.add_cascade(label='Recent files', menu=self.recent_menu)
         filemenu.add_command(label='Save file',
                              accelerator='Ctrl+S', command=self.save_file)
         filemenu.add_command(label='Save file as...',
                              accelerator='Ctrl+Shift+S', command=self.save_file_as)
+        filemenu.add_command(label='Close file',
+                             accelerator='Ctrl+W', command=self.close_file)
+        filemenu.add_command(label='Cancel loading',
+                             accelerator='Esc', command=self.cancel_loading)
+        filemenu.add_checkbutton(label='Follow file', accelerator='Ctrl+L',
+                                 variable=self.follow,
+                                 command=self.toggle_follow)
         filemenu.add_separator()
         filemenu.add_command(label='Exit',
                              accelerator='Alt+F4', command=self.exit)
-        self.main.menubar.add_cascade(label='File', menu=filemenu)
+
+    def fill_recent_menu(self):
+        """Lists the recently opened files in the Recent files menu."""
+        menu = self.recent_menu
+        menu.delete(0, 'end')
+        paths = self.main.recent.paths()
+        for i, path in enumerate(paths, 1):
+            menu.add_command(label=f'{i} {path}',
+                             underline=0 if i < 10 else -1,
+                             command=lambda path=path: self.open_path(path))
+        if not paths:
+            menu.add_command(label='No recent files', state='disabled')
+        menu.add_separator()
+        menu.add_command(label='Clear list', command=self.main.recent.clear)
 
     def key_shortcuts(self):
         """Adds key bindings to the file menu buttons."""
@@ -83,43 +108,337 @@ class FileMenu:
         bind_(self.main.master, 'Control', 'o', self.open_file)
         bind_(self.main.master, 'Control', 's', self.save_file)
         bind_(self.main.master, 'Control-Shift', 's', self.save_file_as)
+        bind_(self.main.master, 'Control', 'w', self.close_file)
+        bind_(self.main.master, 'Control', 'l', lambda event: (
+            self.follow.set(not self.follow.get()), self.toggle_follow()
+        ))
+        # on the text display, as its class binding moves the focus
+        self.main.textbox.bind('<Control-Tab>', self.main.tabs.next_tab)
         self.main.master.bind('<Alt-F4>',self.exit)
+        self.main.master.bind('<Escape>', self.cancel_loading)
         # if we close the app with the window manager, calls to the
         # app's custom exit method
         self.main.master.protocol('WM_DELETE_WINDOW', self.exit)
 
+    def ask_to_save(self):
+        """Asks the user to save the unsaved changes of the current tab.
+
+        Returns:
+            bool: False if the user pressed cancel.
+        """
+        if self.main.path == '':
+            path = 'New file'
+        else:
+            path = self.main.path
+            
+        if self.main.textbox.edit_modified():
+            s = tkinter.messagebox.askyesnocancel(
+                title='Unsaved changes',
+                message=f'Do you want to save the changes made in\n"{path}"?'
+            )
+            if s:
+                self.save_file()
+            elif s is None:
+                return False
+        return True
+
     # menu commands
-    @save_changes
-    def new_file(self):
-        """Creates a new text file."""
-        self.main.text = ''
-        self.main.path = ''
-        self.main.textbox.delete(1.0, 'end')
+    def new_file(self, *args):
+        """Creates a new text file in a new tab."""
+        self.main.tabs.new_tab()
+
+    def close_file(self, *args):
+        """Asks to save the current tab and closes it."""
+        if not self.ask_to_save():
+            return
+        self.main.recent.remember()
+        self.cancel_loading()
+        self.stop_following()
+        self.close_large_file()
+        self.close_journal()
+        self.main.tabs.close_current()
 
     def open_file(self, *args):
         """Asks the user to a file location, to open that file."""
+        # imported the first time it is used, with tkinter.simpledialog,
+        # so the app starts faster
+        import tkinter.filedialog
         # opens the save window
         path = tk.filedialog.askopenfilename(
             title='Open file...', filetypes=(
                 ('Plain text file', '*.txt'),
+                compression.FILETYPES,
+                ('All files', '*'),
             )
         )
 
         # this runs only if the user didn't press 'cancel'
         if path != '':
             self.openpath = path
+            self.go_to = None
             self.open_file_2()
 
-    @save_changes
+    def open_path(self, path, line=None):
+        """Opens a file, or selects its tab, and shows one of its lines.
+
+        Arguments:
+            path (str): path of the file.
+            line (int): the line number, starting from 1, or None.
+        """
+        self.openpath = path
+        self.go_to = line
+        self.open_file_2()
+        if self.main.loader is None:
+            # already open, or opened without loading it
+            if self.main.path and line is not None:
+                self.main.go_to_line(line)
+            self.go_to = None
+
     def open_file_2(self):
-        """Opens the selected file."""
+        """Opens the selected file in a new tab.
+
+        If it is already open, its tab is selected. If the current tab
+        is an empty new file, the file is opened there.
+
+        The file is read in the background, so big files don't freeze
+        the app. See fileloader.ChunkedLoader.
+        Files bigger than largefile.LARGE_FILE_SIZE are opened in a
+        read-only viewer that doesn't load them, unless their encoding
+        uses more than one byte for the line breaks or they are
+        compressed. See largefile.LargeFileView.
+
+        If the file was opened before and didn't change, its format and
+        line index are taken from recentfiles.RecentFiles, and it is
+        shown where the user left it.
+        """
+        tabs = self.main.tabs
+        tab = tabs.find(self.openpath)
+        if tab is not None:
+            tabs.switch(tab)
+            return
+        recent = self.main.recent
+        try:
+            file_format = (recent.file_format(self.openpath) or
+                           detect_format(self.openpath))
+            size = os.path.getsize(self.openpath)
+        except OSError as error:
+            # checked before a tab is made for it
+            show_read_error(self.main.master, self.openpath, error)
+            return
+        new_tab = not tabs.is_blank()
+        if new_tab and not tabs.new_tab():
+            return
+
         self.main.path = self.openpath
-        file_ = open(self.main.path, 'r')
-        self.main.text = file_.read() # stores the text of the file
-        file_.close()
-        # updates the text display
-        self.main.textbox.delete(1.0, 'end')
-        self.main.textbox.insert(1.0, self.main.text)
+        try:
+            # the viewer seeks in the file, it can't in compressed data
+            if (size > LARGE_FILE_SIZE and
+                    is_ascii_compatible(file_format.encoding) and
+                    file_format.compression is None):
+                if self.open_large_file(file_format):
+                    return
+            self.main.loader = ChunkedLoader(self.main, self.main.path,
+                                             on_done=self.on_file_loaded,
+                                             file_format=file_format)
+        except OSError as error:
+            # it was removed meanwhile
+            self.main.path = ''
+            if new_tab:
+                tabs.close_current()
+            show_read_error(self.main.master, self.openpath, error)
+            return
+        self.restore_view = self.go_to is None
+
+        # the app was closed without saving this file
+        self.recovered = journal.read_journal(self.main.path)
+        if self.recovered:
+            recover = tkinter.messagebox.askyesno(
+                title='Recover changes',
+                message=f'"{self.main.path}" was not saved the last time '
+                        'it was edited.\nDo you want to recover the changes?'
+            )
+            if not recover:
+                self.recovered = None
+        self.main.loader.start()
+
+    def open_large_file(self, file_format):
+        """Opens the selected file in large file mode.
+
+        Arguments:
+            file_format (textcodec.FileFormat): the format of the file.
+
+        Returns:
+            bool: False if the file can't be mapped in memory, because
+            it was emptied or truncated meanwhile, so it has to be
+            loaded normally.
+
+        Raises:
+            OSError: if the file can't be read.
+        """
+        recent = self.main.recent
+        try:
+            large_file = LargeFileView(self.main, self.main.path,
+                                       recent.line_index(self.main.path))
+        except ValueError:
+            return False
+        self.main.set_file_format(file_format)
+        self.main.large_file = large_file
+        large_file.open()
+        if self.go_to is None:
+            line = recent.large_line(self.main.path)
+            if line:
+                large_file.show(line)
+        recent.touch(self.main.path)
+        return True
+
+    def on_file_loaded(self):
+        """Called when the opened file was fully loaded."""
+        loader = self.main.loader
+        self.main.disk_size = loader.bytes_read
+        self.main.disk_stat = loader.stat
+        self.main.loader = None
+        try:
+            self.main.journal = journal.EditJournal(self.main.path)
+        except OSError:
+            # the file can't be read anymore
+            self.main.journal = None
+
+        if self.main.undo.persist:
+            self.main.undo.load(self.main.path)
+        self.main.clean.mark_saved(loader.content_hash)
+        if self.recovered:
+            self.recover_changes(self.recovered)
+            self.recovered = None
+        self.main.long_lines.report()
+        self.main.indexer.add_file(self.main.path)
+        if self.go_to is not None:
+            self.main.go_to_line(self.go_to)
+            self.go_to = None
+        elif self.restore_view:
+            self.main.recent.restore_view(self.main.path)
+        self.restore_view = False
+        self.main.recent.touch(self.main.path)
+
+    def recover_changes(self, changes):
+        """Applies the changes of a journal to the text display.
+
+        Arguments:
+            changes (list): list of [operation, offset, text] lists.
+        """
+        textbox = self.main.textbox
+        # the recovered changes can be undone all at once
+        with textbox.suspend_events(), self.main.undo.group():
+            for operation, offset, text in changes:
+                if operation == 'insert':
+                    textbox.insert(textbox.index_at(offset), text)
+                elif operation == 'delete':
+                    textbox.delete(textbox.index_at(offset),
+                                   textbox.index_at(offset + len(text)))
+                else:
+                    textbox.delete(1.0, 'end')
+                    textbox.insert(1.0, text)
+
+    def record_change(self, operation, offset, text):
+        """Adds a change of the text display to the journal.
+
+        Arguments:
+            operation (str): 'insert', 'delete' or 'reset'.
+            offset (int): the position of the change, in characters.
+            text (str): the inserted or deleted text.
+        """
+        if self.main.journal is not None:
+            self.main.journal.record(operation, offset, text)
+
+    def autosave(self):
+        """Writes the last changes to the journal periodically."""
+        if self.main.journal is not None:
+            try:
+                self.main.journal.flush()
+            except OSError:
+                self.main.journal = None
+        self.main.master.after(journal.AUTOSAVE_INTERVAL, self.autosave)
+
+    def close_journal(self):
+        """Deletes the journal of the file that is being closed.
+
+        It is called after the user saved the changes or chose not to
+        save them, so they don't have to be recovered.
+        """
+        if self.main.journal is not None:
+            self.main.journal.discard()
+            self.main.journal = None
+
+    def cancel_loading(self, *args):
+        """Stops loading the file that is being opened, if there is one."""
+        if self.main.loader is not None:
+            self.main.loader.cancel()
+            self.main.loader = None
+
+    def toggle_follow(self, *args):
+        """Starts or stops following the file, as the menu button says.
+
+        See follow.FileFollower.
+        """
+        if not self.follow.get():
+            self.stop_following()
+            return
+        main = self.main
+        if (main.path == '' or main.large_file is not None or
+                main.loader is not None):
+            self.follow.set(False)
+            tkinter.messagebox.showinfo(
+                title='Follow file',
+                message='Only saved files that were fully loaded can be '
+                        'followed.'
+            )
+            return
+        if main.file_format.compression is not None:
+            self.follow.set(False)
+            tkinter.messagebox.showinfo(
+                title='Follow file',
+                message='Compressed files can\'t be followed.'
+            )
+            return
+
+        from follow import FileFollower
+        # 0 keeps all the lines
+        max_lines = main.settings.config.getint('Edit', 'follow_max_lines',
+                                                fallback=0)
+        try:
+            main.follower = FileFollower(main, main.path, main.disk_size,
+                                         max_lines)
+        except OSError as error:
+            self.follow.set(False)
+            show_read_error(main.master, main.path, error)
+            return
+        main.follower.start()
+
+    def stop_following(self):
+        """Leaves follow mode, if it is active."""
+        self.follow.set(False)
+        if self.main.follower is not None:
+            self.main.follower.stop()
+            self.main.follower = None
+
+    def close_large_file(self):
+        """Leaves large file mode, if it is active."""
+        if self.main.large_file is not None:
+            self.main.large_file.close()
+            self.main.large_file = None
+
+    def is_read_only(self):
+        """Tells the user if the file can't be saved right now.
+
+        Returns:
+            bool: True if the file is in large file mode.
+        """
+        if self.main.large_file is not None:
+            tkinter.messagebox.showinfo(
+                title='Read-only',
+                message='Files opened in large file mode are read-only.'
+            )
+            return True
+        return False
 
     def save_file(self, *args):
         """Saves the file if there is a specified location for it.
@@ -127,36 +446,129 @@ class FileMenu:
         If there is not, it calls the method save_file_as(), that ask
         the user for a localtion to save the file.
         """
+        # saving a half loaded file would truncate it
+        if self.main.loader is not None and not self.main.loader.finished:
+            return
+        if self.is_read_only():
+            return
+        if self.main.follower is not None and self.main.follower.trimmed:
+            tkinter.messagebox.showinfo(
+                title='Follow file',
+                message='The first lines of the file were removed in follow '
+                        'mode.\nSave it with another name.'
+            )
+            return
         if self.main.path != '':
-            # stores the test
-            self.main.text = self.main.textbox.get(1.0, 'end-1c')
-            # saves the file
-            file_ = open(self.main.path, 'w')
-            file_.write(self.main.text)
-            file_.close()
-            self.main.textbox.edit_modified(False)
+            self.save_to(self.main.path)
         else:
             self.save_file_as()
 
     def save_file_as(self, *args):
         """Saves the file in a path specified by the user."""
+        if self.is_read_only():
+            return
+        import tkinter.filedialog
         path = tk.filedialog.asksaveasfilename(
             title='Save file as...',
-            filetypes=( ('Plain text file', '*.txt'),),
+            filetypes=( ('Plain text file', '*.txt'), compression.FILETYPES),
             defaultextension='*.txt', initialfile='New text file'       
         )
         # runs only if we don't press 'cancel'
         if path != '':
+            # the extension says if the new file is compressed
+            self.main.set_file_format(self.main.file_format._replace(
+                compression=compression.compression_for(path)
+            ))
             self.main.path = path # stores the path of the file
-            # stores the text
-            self.main.text = self.main.textbox.get(1.0, 'end-1c')
-            # saves the file
-            file_ = open(self.main.path, 'w')
-            file_.write(self.main.text)
-            file_.close()
-            self.main.textbox.edit_modified(False)
-
-    @save_changes
-    def exit(self):
-        """Closes the app."""
+            self.main.configure_title()
+            self.save_to(path)
+
+    def save_to(self, path):
+        """Saves the document in the background.
+
+        See filesaver.BackgroundSaver.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        # two saves at the same time could finish in the wrong order
+        if self.main.saver is not None and self.main.saver.is_alive():
+            self.main.saver.thread.join()
+            self.main.saver.poll()
+
+        current = self.main.journal
+        if current is not None and current.path == path:
+            mark = current.mark()
+        else:
+            # saved as a new file
+            self.close_journal()
+        version = self.main.textbox.document.version
+        state = self.main.undo.checkpoint()
+
+        def on_done():
+            """Updates the journal and the undo history of the file."""
+            if self.main.path == path:
+                self.main.disk_size = self.main.saver.stat.st_size
+                self.main.disk_stat = file_identity(self.main.saver.stat)
+                self.main.clean.saved_hash = self.main.saver.content_hash
+                self.main.undo.saved = state
+                if self.main.follower is not None:
+                    # the file was replaced
+                    self.main.follower.restart(self.main.disk_size)
+            if current is not None and current.path == path:
+                current.rebase(mark)
+            else:
+                self.start_journal(path)
+            self.save_history(path, version)
+
+        self.main.saver = BackgroundSaver(self.main, path, on_done=on_done)
+        self.main.saver.start()
+
+    def save_history(self, path, version):
+        """Stores the undo history next to a saved file, if it is enabled.
+
+        Arguments:
+            path (str): path of the file.
+            version (int): version of the document that was saved.
+        """
+        # the history is only valid for the saved version of the file
+        if (self.main.undo.persist and self.main.path == path and
+                self.main.textbox.document.version == version):
+            try:
+                self.main.undo.save(path)
+            except OSError:
+                pass
+
+    def start_journal(self, path):
+        """Starts the journal of a file that was saved for the first time.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        if self.main.path == path and self.main.journal is None:
+            try:
+                self.main.journal = journal.EditJournal(path)
+            except OSError:
+                pass
+
+    def exit(self, *args):
+        """Asks to save every modified tab and closes the app."""
+        self.main.recent.remember()
+        self.cancel_loading()
+        self.stop_following()
+        self.main.indexer.cancel()
+        tabs = self.main.tabs
+        for tab in list(tabs.tabs):
+            if tab is not tabs.current and not tab.modified:
+                continue
+            tabs.switch(tab)
+            # the text of a big tab is moved in the background
+            self.cancel_loading()
+            if not self.ask_to_save():
+                return
+        self.close_large_file()
+        self.close_journal()
+        tabs.discard_journals()
+        self.main.settings.flush()
+        self.main.workers.shutdown()
         self.main.master.quit()
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""Saves text files in the background without risking their contents.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import io
+import os
+import tempfile
+import threading
+import time
+import tkinter.messagebox
+
+from cleanstate import ContentHash
+from compression import open_writer
+from textcodec import DEFAULT_FORMAT
+
+# how often (in ms) the UI checks the progress of the save
+POLL_INTERVAL = 50
+
+# permissions of new files, as the os would give them
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+def write_atomic(path, chunks, progress=None, file_format=DEFAULT_FORMAT):
+    """Writes text to a file without ever leaving it half written.
+
+    The text is written to a temporary file in the same directory,
+    flushed to the disk, and then renamed over the file, keeping its
+    permissions. If anything fails, the file is left as it was.
+
+    The chunks are encoded, and compressed if the format says so, as
+    they are written, so the file is never in memory as bytes.
+
+    Arguments:
+        path (str): path of the file.
+        chunks (iterable): the text, as strings, with '\n' line breaks.
+        progress (function): called with the number of characters
+        written so far after every chunk.
+        file_format (textcodec.FileFormat): the encoding, the line
+        breaks and the compression of the file.
+
+    Raises:
+        UnicodeEncodeError: if the text has characters that the
+        encoding can't store.
+    """
+    # through a symbolic link, the file it points to is replaced
+    path = os.path.realpath(path)
+    directory, name = os.path.split(path)
+    fd, temp = tempfile.mkstemp(dir=directory, prefix=f'.{name}.',
+                                suffix='.tmp')
+    try:
+        written = 0
+        with open(fd, 'wb') as raw:
+            stream = open_writer(raw, file_format.compression)
+            file_ = io.TextIOWrapper(stream, encoding=file_format.encoding,
+                                     newline=file_format.newline)
+            if file_format.bom:
+                file_.write('\ufeff')
+            for chunk in chunks:
+                file_.write(chunk)
+                written += len(chunk)
+                if progress is not None:
+                    progress(written)
+            file_.flush()
+            file_.detach()
+            if stream is not raw:
+                # writes the end of the compressed data
+                stream.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        try:
+            os.chmod(temp, os.stat(path).st_mode)
+        except FileNotFoundError:
+            os.chmod(temp, 0o666 & ~UMASK)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+    # makes the rename itself survive a crash
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+class BackgroundSaver:
+    """Saves the text display's document in a worker thread.
+
+    The worker writes a snapshot of the document, so the user can keep
+    editing while the file is saved.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+        path (str): path of the file.
+        on_done (function): called without arguments if the file was
+        saved.
+    """
+    def __init__(self, main, path, on_done=None):
+        """Takes a snapshot of the document. Call start() to save it.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+            path (str): path of the file.
+            on_done (function): called if the file was saved.
+        """
+        self.main = main
+        self.path = path
+        self.on_done = on_done
+
+        document = main.textbox.document
+        self.snapshot = document.snapshot()
+        self.version = document.version
+        self.file_format = main.file_format
+
+        self.written = 0
+        self.stat = None # os.stat() of the saved file
+        self.content_hash = ContentHash() # see cleanstate.CleanState
+        self.error = None
+        self.finished = False
+        # not a daemon, so closing the app waits for the file to be saved
+        self.thread = threading.Thread(target=self.write)
+
+    def start(self):
+        """Starts saving the file."""
+        self.start_time = time.perf_counter()
+        self.thread.start()
+        self.main.master.after(POLL_INTERVAL, self.poll)
+
+    def is_alive(self):
+        """Returns True if the file is still being saved."""
+        return self.thread.is_alive()
+
+    # worker thread
+    def write(self):
+        """Writes the snapshot to the file."""
+        try:
+            write_atomic(self.path, self.hashed(self.snapshot.chunks()),
+                         self.set_written, self.file_format)
+            self.content_hash.finish()
+            self.stat = os.stat(self.path)
+        except Exception as error:
+            self.error = error
+        self.time = time.perf_counter() - self.start_time
+
+    def hashed(self, chunks):
+        """Hashes the chunks of the text while they are written.
+
+        Arguments:
+            chunks (iterable): the chunks.
+        """
+        for chunk in chunks:
+            self.content_hash.update(chunk)
+            yield chunk
+
+    def set_written(self, written):
+        """Stores the progress of the save.
+
+        Arguments:
+            written (int): number of characters written so far.
+        """
+        self.written = written
+
+    # UI thread
+    def poll(self):
+        """Shows the progress of the save and finishes it."""
+        if self.finished:
+            return
+        if self.thread.is_alive():
+            percent = self.written * 100 // max(1, len(self.snapshot))
+            self.main.set_status(f'Saving... {percent}%')
+            self.main.master.after(POLL_INTERVAL, self.poll)
+            return
+
+        self.finished = True
+        if self.error is not None:
+            self.main.set_status('')
+            tkinter.messagebox.showerror(
+                title='Error',
+                message=f'Could not save\n"{self.path}":\n{self.error}'
+            )
+            return
+
+        size = len(self.snapshot) / 1024 / 1024
+        self.main.set_status(f'Saved {size:.1f} MB in {self.time:.2f} s')
+        textbox = self.main.textbox
+        # if the user kept typing, the file is still modified
+        if (self.main.path == self.path and
+                textbox.document.version == self.version):
+            textbox.edit_modified(False)
+        if self.on_done is not None:
+            self.on_done()
@@ -0,0 +1,195 @@
+"""Searches the files of a directory tree, in worker processes.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+
+The files are searched as bytes, mapped in memory, so they are not
+decoded and the OS reads them as fast as it can. The pattern is encoded
+as UTF-8, which finds text in UTF-8 and ASCII files; files in encodings
+with NUL bytes, like UTF-16, look binary and are skipped.
+
+Nothing here uses tk, so it can run in the processes of a pool.
+"""
+
+import fnmatch
+import mmap
+import os
+import re
+
+from compression import detect_compression
+
+# number of bytes at the start of a file checked for NUL bytes
+SNIFF_SIZE = 8192
+# the file is searched in windows of about this many bytes, cut at line
+# breaks, so counting the lines never copies more than this
+WINDOW_SIZE = 16 * 1024 * 1024
+# max number of matches reported for a file
+MAX_FILE_MATCHES = 1000
+# max length of the preview of a matching line, in characters
+PREVIEW_LENGTH = 200
+
+def compile_bytes(pattern):
+    """Converts a compiled pattern to one that searches bytes.
+
+    Arguments:
+        pattern (re.Pattern): a pattern from search.compile_pattern().
+
+    Raises:
+        re.error: if the pattern can't search bytes.
+    """
+    return re.compile(pattern.pattern.encode('utf-8'),
+                      pattern.flags & ~re.UNICODE)
+
+def walk(directory, include='*'):
+    """Yields the paths of the files in a directory tree.
+
+    Hidden files and directories, like .git, are skipped.
+
+    Arguments:
+        directory (str): the directory.
+        include (str): only files whose names match this glob pattern,
+        like '*.log', are yielded. Several patterns can be separated by
+        ';'.
+    """
+    patterns = [part.strip() for part in include.split(';') if part.strip()]
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            if patterns and not any(fnmatch.fnmatch(name, pattern)
+                                    for pattern in patterns):
+                continue
+            yield os.path.join(root, name)
+
+def is_binary(start):
+    """Returns True if the start of a file is not text.
+
+    Arguments:
+        start (bytes): the first bytes of the file.
+    """
+    return b'\0' in start
+
+def preview(line):
+    """Returns the text of a matching line shown in the results.
+
+    Arguments:
+        line (bytes): the line, or its start if it is very long.
+    """
+    text = line.decode('utf-8', 'replace')
+    return text.strip()[:PREVIEW_LENGTH]
+
+def search_file(path, pattern):
+    """Finds the lines of a file that match a pattern.
+
+    Arguments:
+        path (str): path of the file.
+        pattern (re.Pattern): a pattern from compile_bytes().
+
+    Returns:
+        tuple: (path, size, matches, skipped) where size is the size of
+        the file in bytes, matches is a list of (line, preview) tuples,
+        with line numbers starting from 1, and skipped is why the file
+        was not searched, or None.
+    """
+    try:
+        with open(path, 'rb') as file_:
+            size = os.fstat(file_.fileno()).st_size
+            if size == 0:
+                return path, 0, [], None
+            if (is_binary(file_.read(SNIFF_SIZE)) or
+                    detect_compression(path) is not None):
+                return path, size, [], 'binary'
+            data = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+            with data:
+                return path, size, search_mapped(data, pattern), None
+    except (OSError, ValueError) as error:
+        # ValueError: the file was truncated while it was mapped
+        return path, 0, [], str(error)
+
+def search_blocks(path, blocks, pattern):
+    """Finds the lines of some blocks of a file that match a pattern.
+
+    Used instead of search_file() for the files of the trigram index,
+    only with the blocks that may have a match.
+
+    Arguments:
+        path (str): path of the file.
+        blocks (list): (start, end, line) tuples, where line is the number
+        of the first line of the block. See trigramindex.split_blocks().
+        pattern (re.Pattern): a pattern from compile_bytes().
+
+    Returns:
+        tuple: like search_file(), with the number of bytes read as the
+        size.
+    """
+    matches = []
+    read = 0
+    try:
+        with open(path, 'rb') as file_:
+            for start, end, line in blocks:
+                file_.seek(start)
+                data = file_.read(end - start)
+                read += len(data)
+                matches.extend((line + number - 1, text) for number, text
+                               in search_mapped(data, pattern))
+                if len(matches) >= MAX_FILE_MATCHES:
+                    break
+    except OSError as error:
+        return path, read, [], str(error)
+    return path, read, matches[:MAX_FILE_MATCHES], None
+
+def search_mapped(data, pattern):
+    """Finds the lines of a file mapped in memory that match a pattern.
+
+    Matches can't span windows, which only happens with patterns that
+    match line breaks.
+
+    Arguments:
+        data (mmap.mmap): the file.
+        pattern (re.Pattern): a pattern from compile_bytes().
+
+    Returns:
+        list: (line, preview) tuples. A line with several matches is
+        reported once.
+    """
+    matches = []
+    size = len(data)
+    start = 0
+    line = 1 # number of the line at start
+    while start < size:
+        end = data.find(b'\n', min(start + WINDOW_SIZE, size))
+        end = size if end == -1 else end + 1
+        counted = start # position up to which lines were counted
+        last_line = 0
+        for match in pattern.finditer(data, start, end):
+            found = data.rfind(b'\n', start, match.start())
+            line_start = start if found == -1 else found + 1
+            line += data[counted:line_start].count(b'\n')
+            counted = line_start
+            if line == last_line:
+                continue
+            last_line = line
+            line_end = data.find(b'\n', match.start(), end)
+            if line_end == -1:
+                line_end = end
+            # very long lines are not copied whole
+            line_end = min(line_end, line_start + PREVIEW_LENGTH * 4)
+            matches.append((line, preview(data[line_start:line_end])))
+            if len(matches) == MAX_FILE_MATCHES:
+                return matches
+        line += data[counted:end].count(b'\n')
+        start = end
+    return matches
@@ -0,0 +1,385 @@
+"""Notices when other programs change the open file and reloads it.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import threading
+import tkinter as tk
+import tkinter.messagebox
+
+from cleanstate import hash_text
+from customtext import READ_ONLY
+from fileloader import ChunkedLoader, file_identity, read_chunks
+from textcodec import detect_format
+
+# how often (in ms) the file is checked when inotify is not available
+CHECK_INTERVAL = 2000
+# how often (in ms) the UI thread checks if the changes were found
+POLL_INTERVAL = 50
+# time (in ms) waited after inotify reports a change, as programs often
+# write a file in several steps
+SETTLE_DELAY = 300
+# if the changed part of the file has more lines than this, it is
+# replaced as a whole instead of being compared line by line
+DIFF_LIMIT = 200000
+
+def split_lines(text):
+    """Splits a text in lines, keeping their line breaks.
+
+    Unlike str.splitlines(), only '\n' breaks lines, like in tk.
+
+    Arguments:
+        text (str): the text.
+    """
+    lines = text.split('\n')
+    last = lines.pop()
+    lines = [line + '\n' for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+def diff_lines(old, new):
+    """Compares two lists of lines.
+
+    The lines that are the same at the start and at the end are skipped
+    before using difflib, so a small change in a big file is fast.
+
+    Arguments:
+        old (list): the lines before.
+        new (list): the lines after.
+
+    Returns:
+        list: (i1, i2, j1, j2) tuples, meaning that old[i1:i2] has to be
+        replaced with new[j1:j2]. They are sorted by position.
+    """
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[-1 - end] == new[-1 - end]:
+        end += 1
+    old_end, new_end = len(old) - end, len(new) - end
+    if start == old_end and start == new_end:
+        return []
+    if (old_end - start) + (new_end - start) > DIFF_LIMIT:
+        return [(start, old_end, start, new_end)]
+
+    # imported the first time it is used, so the app starts faster
+    import difflib
+    matcher = difflib.SequenceMatcher(None, old[start:old_end],
+                                      new[start:new_end])
+    return [(i1 + start, i2 + start, j1 + start, j2 + start)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+            if tag != 'equal']
+
+class FileWatcher:
+    """Checks if the file of the current tab was changed by another program.
+
+    The size, modification time and inode of the file are compared
+    with the ones it had when it was loaded or saved (see
+    main.MainApplication.disk_stat), when inotify reports a change, when
+    the window gets the focus, and every CHECK_INTERVAL ms if inotify is
+    not available.
+
+    A changed file is reloaded by replacing only the lines that are
+    different, so the cursor, the selection and the view stay where
+    they were, and the reload can be undone. The file is read and
+    compared in a worker thread (see ReloadTask); only the edits are
+    made on the UI thread. If the document has
+    unsaved changes, the user is asked first.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+    """
+    def __init__(self, main):
+        """Starts checking the file of the current tab.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+        """
+        self.main = main
+        self.path = '' # path of the watched file
+        self.inotify = None # follow.Inotify of the file
+        self.pending = None # tk after id of the next check
+        self.asking = False
+        self.task = None # ReloadTask running in the background
+
+        main.master.bind('<FocusIn>', lambda event: self.schedule(0), add='+')
+        main.master.after(CHECK_INTERVAL, self.tick)
+
+    def tick(self):
+        """Checks the file periodically, unless inotify does it."""
+        if self.inotify is None or self.path != self.main.path:
+            self.schedule(0)
+        self.main.master.after(CHECK_INTERVAL, self.tick)
+
+    def schedule(self, delay):
+        """Checks the file after some time, unless a check is pending.
+
+        Arguments:
+            delay (int): the time, in ms.
+        """
+        if self.pending is None:
+            self.pending = self.main.master.after(delay, self.check)
+
+    def watch(self, path):
+        """Watches another file with inotify, if it is available.
+
+        Arguments:
+            path (str): path of the file, or '' to stop watching.
+        """
+        self.unwatch()
+        self.path = path
+        if not path:
+            return
+        # ctypes is only imported once a file is open
+        from follow import Inotify
+        try:
+            self.inotify = Inotify(path)
+            self.main.master.tk.createfilehandler(
+                self.inotify.fileno(), tk.READABLE, self.on_event
+            )
+        except (OSError, AttributeError):
+            if self.inotify is not None:
+                self.inotify.close()
+                self.inotify = None
+
+    def unwatch(self):
+        """Stops watching the file with inotify."""
+        if self.inotify is not None:
+            self.main.master.tk.deletefilehandler(self.inotify.fileno())
+            self.inotify.close()
+            self.inotify = None
+
+    def on_event(self, fd, mask):
+        """Called by tk when inotify reports changes."""
+        self.inotify.read_events()
+        self.schedule(SETTLE_DELAY)
+
+    def check(self):
+        """Reloads the file if it changed since it was loaded or saved."""
+        self.pending = None
+        main = self.main
+        if self.asking or self.task is not None:
+            return
+        stat = None
+        if main.path:
+            try:
+                stat = file_identity(os.stat(main.path))
+            except OSError:
+                pass # deleted, the document is kept
+        if main.path != self.path or (stat is not None and
+                                      main.disk_stat is not None and
+                                      stat[:2] != main.disk_stat[:2]):
+            # another file, or the same path with a new inode
+            self.watch(main.path)
+
+        # the other modes read the file themselves, and a save in
+        # progress replaces it
+        saving = main.saver is not None and not main.saver.finished
+        if (stat is None or main.disk_stat is None or stat == main.disk_stat or
+                main.loader is not None or main.large_file is not None or
+                main.follower is not None or saving):
+            return
+
+        if main.textbox.edit_modified():
+            self.asking = True
+            reload = tkinter.messagebox.askyesno(
+                title='File changed',
+                message=f'"{main.path}" was changed by another program.\n'
+                        'Do you want to reload it? Your changes can be '
+                        'undone after reloading.',
+                parent=main.master
+            )
+            self.asking = False
+            if not reload:
+                # don't ask again until it changes again
+                main.disk_stat = stat
+                return
+        self.reload(stat)
+
+    def reload(self, stat):
+        """Starts finding the lines of the document that changed in the
+        file.
+
+        Arguments:
+            stat (tuple): fileloader.file_identity() of the file.
+        """
+        self.task = ReloadTask(self.main.textbox.document, self.main.path,
+                               stat)
+        self.task.thread.start()
+        self.main.set_status('Reloading...')
+        self.main.master.after(POLL_INTERVAL, self.poll)
+
+    def poll(self):
+        """Replaces the lines that changed once they were found."""
+        task = self.task
+        if task.thread.is_alive():
+            self.main.master.after(POLL_INTERVAL, self.poll)
+            return
+        self.task = None
+        main = self.main
+        if task.error is not None:
+            main.set_status('')
+            return # checked again with the next change
+        if (main.path != task.path or main.loader is not None or
+                main.large_file is not None or main.follower is not None or
+                main.textbox.document.version != task.version):
+            # edited or switched meanwhile, the edits don't fit anymore
+            main.set_status('')
+            self.schedule(0)
+            return
+
+        textbox = main.textbox
+        top = int(textbox.index('@0,0').split('.')[0]) - 1
+        lines = task.lines
+
+        def start(line):
+            """Returns the tk index of the start of an old line."""
+            return f'{line + 1}.0' if line < lines else 'end-1c'
+
+        with textbox.suspend_events(), main.undo.group():
+            # from the end, so the positions of the next hunks don't change
+            for i1, i2, text in reversed(task.edits):
+                # folded text is read-only, and a part of it can't be
+                # deleted, so the changed lines are unfolded first
+                for tag in ('folded', READ_ONLY, 'folded_head'):
+                    textbox.tag_remove(tag, start(i1), start(i2))
+                if i1 < i2:
+                    textbox.delete(start(i1), start(i2))
+                if text:
+                    textbox.insert(start(i1), text)
+        if len(textbox.document) != task.length:
+            # an edit was refused, so the document doesn't match the file
+            self.reload_all(task)
+            return
+        # keeps the same lines at the top of the view
+        top += sum(added - (i2 - i1) for (i1, i2, text), added
+                   in zip(task.edits, task.added) if i2 <= top)
+        textbox.yview(f'{top + 1}.0')
+
+        main.set_file_format(task.file_format)
+        self.mark_reloaded(task.stat, task.content_hash)
+        changed = sum(max(i2 - i1, added) for (i1, i2, text), added
+                      in zip(task.edits, task.added))
+        main.set_status(f'Reloaded, {changed} line(s) changed')
+
+    def reload_all(self, task):
+        """Loads the whole file again, when it can't be changed line by
+        line.
+
+        Arguments:
+            task (ReloadTask): the task that found the changes.
+        """
+        main = self.main
+        try:
+            main.loader = ChunkedLoader(main, main.path,
+                                        on_done=self.on_reloaded,
+                                        file_format=task.file_format)
+        except OSError:
+            main.set_status('')
+            return # checked again with the next change
+        main.loader.start()
+
+    def on_reloaded(self):
+        """Called when the file was loaded again by reload_all()."""
+        loader = self.main.loader
+        self.main.loader = None
+        self.mark_reloaded(loader.stat, loader.content_hash)
+
+    def mark_reloaded(self, stat, content_hash):
+        """Marks the document as the same as the file again.
+
+        Arguments:
+            stat (tuple): fileloader.file_identity() of the file.
+            content_hash (cleanstate.ContentHash): hashes of its text.
+        """
+        main = self.main
+        main.disk_stat = stat
+        main.disk_size = stat[2]
+        main.clean.mark_saved(content_hash)
+        main.textbox.edit_modified(False)
+        if main.journal is not None:
+            try:
+                main.journal.start()
+            except OSError:
+                pass
+
+class ReloadTask:
+    """Reads a changed file and compares it with the document in a
+    worker thread.
+
+    Arguments:
+        document (piecetable.PieceTable): the document of the text
+        display. A snapshot of it is compared.
+        path (str): path of the file.
+        stat (tuple): fileloader.file_identity() of the file.
+
+    Attributes:
+        version (int): version of the document that was compared.
+        edits (list): (i1, i2, text) tuples, meaning that the old lines
+        i1 to i2 have to be replaced with the text. Set by the thread.
+        added (list): number of lines of each text in edits.
+        lines (int): number of lines of the document.
+        length (int): length of the text of the file.
+        content_hash (cleanstate.ContentHash): hashes of the text.
+        file_format (textcodec.FileFormat): the format of the file.
+        error (Exception): the error raised while reading the file.
+    """
+    def __init__(self, document, path, stat):
+        """Takes a snapshot of the document. Start the thread to compare
+        it with the file.
+
+        Arguments:
+            document (piecetable.PieceTable): the document.
+            path (str): path of the file.
+            stat (tuple): fileloader.file_identity() of the file.
+        """
+        self.snapshot = document.snapshot()
+        self.version = document.version
+        self.path = path
+        self.stat = stat
+        self.edits = []
+        self.added = []
+        self.lines = 0
+        self.length = 0
+        self.content_hash = None
+        self.file_format = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    # worker thread
+    def run(self):
+        """Finds the lines that changed."""
+        try:
+            self.file_format = detect_format(self.path)
+            text = ''.join(chunk for chunk, position
+                           in read_chunks(self.path, self.file_format))
+        except (OSError, UnicodeDecodeError) as error:
+            self.error = error
+            return
+        self.length = len(text)
+        self.content_hash = hash_text(text)
+        new = split_lines(text)
+        del text
+        old = split_lines(self.snapshot.get())
+        self.snapshot = None
+        self.lines = len(old)
+        for i1, i2, j1, j2 in diff_lines(old, new):
+            self.edits.append((i1, i2, ''.join(new[j1:j2])))
+            self.added.append(j2 - j1)
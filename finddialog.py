@@ -0,0 +1,370 @@
+"""Find and Replace window.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import re
+import tkinter as tk
+import tkinter.ttk as ttk
+
+from search import check_replacement, compile_pattern, expand, SearchTask
+
+# how often (in ms) the window checks for new matches
+POLL_INTERVAL = 50
+# time (in ms) without changes before the text is searched again
+RESEARCH_DELAY = 300
+# max number of highlighted matches
+MAX_HIGHLIGHTS = 2000
+
+class FindDialog:
+    """'Find' and 'Replace' window.
+
+    The text is searched in a worker thread (see search.SearchTask),
+    and only the matches in the visible part of the text display are
+    highlighted, so it works with big files.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+    """
+    def __init__(self, main):
+        """Prepares the window. Call show() to open it.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+        """
+        self.main = main
+        self.window = None
+        self.task = None
+        self.version = None # version of the document that was searched
+        self.pending_search = None # tk after id
+        self.applying = False # True while replacing all the matches
+
+        self.find_text = tk.StringVar(main.master)
+        self.replace_text = tk.StringVar(main.master)
+        self.regex = tk.BooleanVar(main.master, value=False)
+        self.match_case = tk.BooleanVar(main.master, value=False)
+        self.message = tk.StringVar(main.master)
+
+        textbox = main.textbox
+        textbox.tag_config('found', background='yellow')
+        textbox.tag_raise('sel', 'found')
+        textbox.bind('<<ViewChange>>', lambda event: self.highlight(), add='+')
+        textbox.listeners.append(self.on_change)
+
+    def show(self, replace=False):
+        """Opens the window.
+
+        Arguments:
+            replace (bool): True to focus the replace field.
+        """
+        if self.window is None:
+            self.create_window()
+        self.window.deiconify()
+        self.window.lift()
+        if replace:
+            self.replace_entry.focus_set()
+        else:
+            self.find_entry.focus_set()
+            self.find_entry.select_range(0, 'end')
+
+    def create_window(self):
+        """Creates the widgets of the window."""
+        self.window = tk.Toplevel(self.main.master)
+        self.window.title('Find and Replace')
+        self.window.transient(self.main.master)
+        self.window.resizable(False, False)
+        self.window.protocol('WM_DELETE_WINDOW', self.close)
+
+        frame = ttk.Frame(self.window, padding=5)
+        frame.pack(fill='both', expand=1)
+
+        ttk.Label(frame, text='Find:').grid(row=0, column=0, sticky='w')
+        self.find_entry = ttk.Entry(frame, textvariable=self.find_text,
+                                    width=40)
+        self.find_entry.grid(row=0, column=1, sticky='ew')
+        ttk.Label(frame, text='Replace:').grid(row=1, column=0, sticky='w')
+        self.replace_entry = ttk.Entry(frame, textvariable=self.replace_text,
+                                       width=40)
+        self.replace_entry.grid(row=1, column=1, sticky='ew')
+
+        options = ttk.Frame(frame)
+        options.grid(row=2, column=1, sticky='w')
+        ttk.Checkbutton(options, text='Regular expression',
+                        variable=self.regex,
+                        command=self.search).pack(side='left')
+        ttk.Checkbutton(options, text='Match case',
+                        variable=self.match_case,
+                        command=self.search).pack(side='left')
+
+        buttons = ttk.Frame(frame)
+        buttons.grid(row=0, column=2, rowspan=3, sticky='n', padx=(5, 0))
+        for text, command in (('Find next', self.find_next),
+                              ('Replace', self.replace),
+                              ('Replace all', self.replace_all),
+                              ('Close', self.close)):
+            ttk.Button(buttons, text=text,
+                       command=command).pack(fill='x', pady=1)
+
+        ttk.Label(frame, textvariable=self.message).grid(
+            row=3, column=0, columnspan=3, sticky='w'
+        )
+
+        self.find_text.trace_add('write', lambda *args: self.schedule_search())
+        self.window.bind('<Return>', self.find_next)
+        self.window.bind('<Escape>', lambda event: self.close())
+
+    def close(self):
+        """Closes the window and removes the highlights."""
+        self.cancel()
+        self.main.textbox.tag_remove('found', 1.0, 'end')
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None
+        self.main.textbox.focus_set()
+
+    # searching
+    def cancel(self):
+        """Stops the current search."""
+        if self.pending_search is not None:
+            self.main.master.after_cancel(self.pending_search)
+            self.pending_search = None
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def compile(self):
+        """Compiles the text of the find field.
+
+        Returns:
+            re.Pattern: the pattern, or None if there is nothing to find
+            or the regular expression is not valid.
+        """
+        if self.find_text.get() == '':
+            self.message.set('')
+            return None
+        try:
+            return compile_pattern(self.find_text.get(), self.regex.get(),
+                                   self.match_case.get())
+        except re.error as error:
+            self.message.set(f'Invalid regular expression: {error}')
+            return None
+
+    def search(self, replacement=None):
+        """Starts searching the text display.
+
+        Arguments:
+            replacement (str): if it is not None, the replacement of
+            every match is computed too, to replace all of them.
+        """
+        self.cancel()
+        self.main.textbox.tag_remove('found', 1.0, 'end')
+        pattern = self.compile()
+        if pattern is None:
+            return
+        if replacement is not None and not self.check(pattern):
+            return
+
+        document = self.main.textbox.document
+        self.version = document.version
+        self.task = SearchTask(pattern, document.snapshot(), replacement,
+                               self.regex.get())
+        self.message.set('Searching...')
+        self.main.master.after(POLL_INTERVAL, self.poll, self.task)
+
+    def check(self, pattern):
+        """Checks the text of the replace field.
+
+        Arguments:
+            pattern (re.Pattern): the pattern from compile().
+
+        Returns:
+            bool: False, and the error is shown, if the replacement is
+            not valid for the pattern.
+        """
+        try:
+            check_replacement(pattern, self.replace_text.get(),
+                              self.regex.get())
+        except re.error as error:
+            self.message.set(f'Invalid replacement: {error}')
+            return False
+        return True
+
+    def schedule_search(self):
+        """Searches again after RESEARCH_DELAY ms without changes."""
+        if self.window is None:
+            return
+        if self.pending_search is not None:
+            self.main.master.after_cancel(self.pending_search)
+        self.pending_search = self.main.master.after(RESEARCH_DELAY,
+                                                     self.search)
+
+    def poll(self, task):
+        """Shows the matches found so far.
+
+        Arguments:
+            task (search.SearchTask): the search it was called for.
+        """
+        if task is not self.task:
+            return
+        self.highlight()
+        count = len(task.results)
+        if not task.done:
+            self.message.set(f'Searching... {count} matches')
+            self.main.master.after(POLL_INTERVAL, self.poll, task)
+            return
+
+        self.message.set(f'{count} matches')
+        if task.replacement is not None:
+            self.apply_replacements(task)
+
+    def on_change(self, operation, offset, text):
+        """Called when the text changes, as the matches are not valid anymore.
+
+        Arguments:
+            operation (str): 'insert', 'delete' or 'reset'.
+            offset (int): the position of the change, in characters.
+            text (str): the inserted or deleted text.
+        """
+        if self.task is not None and not self.applying:
+            self.schedule_search()
+
+    def results(self):
+        """Returns the matches of the current search.
+
+        Returns:
+            list: (start, end) tuples, or an empty list if there is not
+            a search or the text changed since it started.
+        """
+        if (self.task is None or
+                self.main.textbox.document.version != self.version):
+            return []
+        return self.task.results
+
+    def highlight(self):
+        """Highlights the matches in the visible part of the text display."""
+        textbox = self.main.textbox
+        textbox.tag_remove('found', 1.0, 'end')
+        results = self.results()
+        if not results:
+            return
+
+        top = textbox.offset('@0,0')
+        bottom = textbox.offset(f'@0,{textbox.winfo_height()} lineend')
+        # the worker only appends results, so this is a consistent prefix
+        count = len(results)
+        first = bisect.bisect_left(results, (top,), 0, count)
+        last = bisect.bisect_right(results, (bottom,), first, count)
+        for match in results[first:min(last, first + MAX_HIGHLIGHTS)]:
+            textbox.tag_add('found', textbox.index_at(match[0]),
+                            textbox.index_at(match[1]))
+
+    # commands
+    def find_next(self, *args):
+        """Selects the next match after the text cursor."""
+        results = self.results()
+        if not results:
+            if (self.task is None or
+                    self.version != self.main.textbox.document.version):
+                self.search()
+            return
+
+        textbox = self.main.textbox
+        start = textbox.offset('insert')
+        i = bisect.bisect_left(results, (start,))
+        if i == len(results):
+            if not self.task.done:
+                return # not found yet
+            i = 0 # starts again from the beginning
+        match = results[i]
+        first, last = textbox.index_at(match[0]), textbox.index_at(match[1])
+        textbox.tag_remove('sel', 1.0, 'end')
+        textbox.tag_add('sel', first, last)
+        textbox.mark_set('insert', last)
+        textbox.see(first)
+        self.message.set(f'{i + 1} of {len(results)} matches')
+
+    def replace(self):
+        """Replaces the selected match and selects the next one."""
+        textbox = self.main.textbox
+        selection = textbox.tag_ranges('sel')
+        pattern = self.compile()
+        if pattern is not None and not self.check(pattern):
+            return
+        if selection and pattern is not None:
+            start = textbox.offset(selection[0])
+            end = textbox.offset(selection[1])
+            text = textbox.document.get(start, end)
+            match = pattern.fullmatch(text)
+            if match is not None:
+                replacement = expand(match, self.replace_text.get(),
+                                     self.regex.get())
+                with self.main.undo.group():
+                    textbox.delete(selection[0], selection[1])
+                    textbox.insert(textbox.index_at(start), replacement)
+                textbox.mark_set('insert', textbox.index_at(
+                    start + len(replacement)
+                ))
+                self.search()
+                return
+        self.find_next()
+
+    def replace_all(self):
+        """Replaces all the matches.
+
+        The text is searched again computing the replacements, and then
+        they are made in one step, so they are undone all at once.
+        """
+        self.search(replacement=self.replace_text.get())
+
+    def apply_replacements(self, task):
+        """Makes the replacements found by a search.
+
+        Arguments:
+            task (search.SearchTask): a finished search with replacements.
+        """
+        textbox = self.main.textbox
+        if textbox.document.version != self.version:
+            # the user typed while searching
+            self.replace_all()
+            return
+
+        if not task.results:
+            self.task = None
+            return
+
+        # the text from the first match to the last is replaced with the
+        # one built by the search: making every replacement in tk and in
+        # the piece table is slow with many matches
+        start, end = task.span
+        cursor = textbox.offset('insert')
+        top = textbox.index('@0,0')
+        self.applying = True
+        try:
+            with textbox.suspend_events(), self.main.undo.group():
+                index = textbox.index_at(start)
+                textbox.delete(index, textbox.index_at(end))
+                textbox.insert(index, task.text)
+        finally:
+            self.applying = False
+        if cursor > end:
+            cursor += len(task.text) - (end - start)
+        textbox.mark_set('insert', textbox.index_at(
+            min(cursor, len(textbox.document))
+        ))
+        textbox.yview(top)
+        self.message.set(f'{len(task.results)} matches replaced')
+        self.task = None
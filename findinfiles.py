@@ -0,0 +1,690 @@
+"""Find in Files window.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import queue
+import re
+import threading
+import time
+import tkinter as tk
+import tkinter.ttk as ttk
+
+from search import compile_pattern
+
+# how often (in ms) the window checks for new results
+POLL_INTERVAL = 50
+# max number of results added to the list at a time
+INSERT_BATCH = 500
+# max number of results kept, the search stops after them
+MAX_RESULTS = 20000
+# max number of files searched or waiting to be searched at a time, so
+# walking a huge tree doesn't queue all its files
+MAX_PENDING = 256
+# time (in ms) after the app starts before the index is updated, so it
+# doesn't slow down the startup
+INDEX_DELAY = 5000
+# how often (in ms) the progress of the index update is shown
+INDEX_POLL_INTERVAL = 250
+
+class WorkerPool:
+    """Pool of processes shared by the searches and the index updates.
+
+    It is started the first time it is used and kept until the app
+    closes, so the processes only start once. They are spawned, as
+    forking a process that runs tk is not safe; the functions they run
+    are in filesearch and trigramindex, which don't import tk.
+    """
+    def __init__(self):
+        """Prepares the pool. Its processes start with the first task."""
+        self.executor = None
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def submit(self, function, *args):
+        """Runs a function in one of the processes.
+
+        Arguments:
+            function (function): the function.
+            args: its arguments.
+
+        Returns:
+            concurrent.futures.Future: its result.
+
+        Raises:
+            RuntimeError: if the pool was shut down.
+        """
+        from concurrent.futures.process import BrokenProcessPool
+        executor = self.get_executor()
+        try:
+            return executor.submit(function, *args)
+        except BrokenProcessPool:
+            # a process died, like when the system ran out of memory
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = None
+            return self.get_executor().submit(function, *args)
+
+    def get_executor(self):
+        """Returns the executor, starting it if it is not running."""
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('the pool was shut down')
+            if self.executor is None:
+                # only loaded when they are used
+                import concurrent.futures
+                import multiprocessing
+                context = multiprocessing.get_context('spawn')
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    mp_context=context
+                )
+            return self.executor
+
+    def shutdown(self):
+        """Stops the processes, dropping the tasks that didn't start."""
+        with self.lock:
+            self.closed = True
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+class FileSearchTask:
+    """Searches the files of a directory tree in a pool of processes.
+
+    A thread walks the tree and hands every file to the pool, and the
+    results are put in a queue as the files are searched. See
+    filesearch.search_file().
+
+    If the trigrams of the search are given, the files of the trigram
+    index that didn't change since they were indexed are not read,
+    except for the blocks that may have a match. See trigramindex.
+
+    Arguments:
+        pool (WorkerPool): the processes that search the files.
+        directory (str): the directory.
+        include (str): glob patterns of the names of the searched files.
+        pattern (re.Pattern): a pattern from filesearch.compile_bytes().
+        query (set): trigramindex.query_trigrams() of the search, or
+        None to read every file.
+
+    Attributes:
+        results (queue.Queue): the filesearch.search_file() tuples of
+        the searched files, and None when the search ends.
+        files (int): number of files found so far.
+        indexed (int): number of files found in the index.
+        stale (int): number of files of the index that changed.
+    """
+    def __init__(self, pool, directory, include, pattern, query=None):
+        """Starts the search.
+
+        Arguments:
+            pool (WorkerPool): the processes that search the files.
+            directory (str): the directory.
+            include (str): glob patterns of the names of the files.
+            pattern (re.Pattern): the pattern.
+            query (set): the trigrams of the search, or None.
+        """
+        self.pool = pool
+        self.directory = os.path.abspath(directory)
+        self.include = include
+        self.pattern = pattern
+        self.query = query
+        self.results = queue.Queue()
+        self.files = self.indexed = self.stale = 0
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # worker thread
+    def run(self):
+        """Walks the tree and searches its files."""
+        # the modules of the workers are only loaded when they are used
+        import filesearch
+
+        slots = threading.Semaphore(MAX_PENDING)
+        futures = {} # future: path of the files searched or waiting
+        # the callbacks run in the threads of the pool
+        lock = threading.Lock()
+
+        def done(future):
+            """Passes the result of a file to the UI thread."""
+            with lock:
+                path = futures.pop(future)
+            slots.release()
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                # the worker crashed, the file is reported as skipped
+                self.results.put((path, 0, [], str(error) or repr(error)))
+            else:
+                self.results.put(future.result())
+
+        indexed, candidates = self.read_index()
+        try:
+            for path in filesearch.walk(self.directory, self.include):
+                if self.cancelled.is_set():
+                    return
+                self.files += 1
+                entry = indexed.get(path)
+                if entry is not None and self.is_fresh(path, entry):
+                    self.indexed += 1
+                    if entry[3]:
+                        self.results.put((path, 0, [], 'binary'))
+                        continue
+                    if path not in candidates:
+                        # it doesn't have all the trigrams of the search
+                        self.results.put((path, 0, [], None))
+                        continue
+                    function = filesearch.search_blocks
+                    args = (path, candidates[path], self.pattern)
+                else:
+                    function = filesearch.search_file
+                    args = (path, self.pattern)
+                if not self.acquire(slots):
+                    return
+                future = self.pool.submit(function, *args)
+                with lock:
+                    futures[future] = path
+                future.add_done_callback(done)
+            # all the slots are free once the last file was searched
+            for i in range(MAX_PENDING):
+                if not self.acquire(slots):
+                    return
+        except RuntimeError:
+            pass # the pool was shut down, the app is closing
+        finally:
+            # the pool is shared, only the files of this search are dropped
+            with lock:
+                pending = list(futures)
+            for future in pending:
+                future.cancel()
+            self.results.put(None)
+
+    def read_index(self):
+        """Returns the indexed files of the directory and the blocks
+        that may have a match.
+
+        Returns:
+            tuple: the dicts of trigramindex.TrigramIndex.files_under()
+            and candidates(), empty if the index is not used.
+        """
+        if self.query is None:
+            return {}, {}
+        import sqlite3
+        import trigramindex
+        try:
+            index = trigramindex.TrigramIndex()
+        except (sqlite3.Error, OSError):
+            return {}, {}
+        try:
+            indexed = index.files_under(self.directory)
+            return indexed, index.candidates(self.query, indexed)
+        except sqlite3.Error:
+            return {}, {}
+        finally:
+            index.close()
+
+    def is_fresh(self, path, entry):
+        """Returns True if a file didn't change since it was indexed.
+
+        Arguments:
+            path (str): path of the file.
+            entry (tuple): its trigramindex.TrigramIndex.files_under()
+            entry.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if entry[1:3] == (stat.st_size, stat.st_mtime_ns):
+            return True
+        self.stale += 1
+        return False
+
+    def acquire(self, slots):
+        """Waits for a free slot in the pool.
+
+        Arguments:
+            slots (threading.Semaphore): the free slots.
+
+        Returns:
+            bool: False if the search was cancelled while waiting.
+        """
+        while not slots.acquire(timeout=0.1):
+            if self.cancelled.is_set():
+                return False
+        return not self.cancelled.is_set()
+
+    def cancel(self):
+        """Stops the search."""
+        self.cancelled.set()
+
+class FindInFiles:
+    """'Find in Files' window.
+
+    The matching lines are listed as the files are searched, with their
+    file, line number and text. Opening a result (double click or
+    Return) opens its file in the editor at that line.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+    """
+    def __init__(self, main):
+        """Prepares the window. Call show() to open it.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+        """
+        self.main = main
+        self.window = None
+        self.task = None
+        self.locations = {} # result list item -> (path, line)
+        self.count = 0 # number of results
+        self.skipped = 0 # number of binary files
+        self.failed = 0 # number of files that couldn't be searched
+        self.searched = 0 # number of files
+        self.size = 0 # number of bytes searched
+
+        self.find_text = tk.StringVar(main.master)
+        self.directory = tk.StringVar(main.master, value=os.getcwd())
+        self.include = tk.StringVar(main.master, value='*')
+        self.regex = tk.BooleanVar(main.master, value=False)
+        self.match_case = tk.BooleanVar(main.master, value=False)
+        self.message = tk.StringVar(main.master)
+
+    def show(self):
+        """Opens the window."""
+        if self.window is None:
+            self.create_window()
+            if self.main.path:
+                self.directory.set(os.path.dirname(self.main.path))
+        self.window.deiconify()
+        self.window.lift()
+        self.find_entry.focus_set()
+        self.find_entry.select_range(0, 'end')
+
+    def create_window(self):
+        """Creates the widgets of the window."""
+        self.window = tk.Toplevel(self.main.master)
+        self.window.title('Find in Files')
+        self.window.transient(self.main.master)
+        self.window.protocol('WM_DELETE_WINDOW', self.close)
+
+        frame = ttk.Frame(self.window, padding=5)
+        frame.pack(fill='both', expand=1)
+        frame.columnconfigure(1, weight=1)
+        frame.rowconfigure(4, weight=1)
+
+        ttk.Label(frame, text='Find:').grid(row=0, column=0, sticky='w')
+        self.find_entry = ttk.Entry(frame, textvariable=self.find_text,
+                                    width=50)
+        self.find_entry.grid(row=0, column=1, sticky='ew')
+        ttk.Label(frame, text='Folder:').grid(row=1, column=0, sticky='w')
+        ttk.Entry(frame, textvariable=self.directory).grid(row=1, column=1,
+                                                           sticky='ew')
+        ttk.Label(frame, text='Files:').grid(row=2, column=0, sticky='w')
+        ttk.Entry(frame, textvariable=self.include).grid(row=2, column=1,
+                                                         sticky='ew')
+
+        options = ttk.Frame(frame)
+        options.grid(row=3, column=1, sticky='w')
+        ttk.Checkbutton(options, text='Regular expression',
+                        variable=self.regex).pack(side='left')
+        ttk.Checkbutton(options, text='Match case',
+                        variable=self.match_case).pack(side='left')
+
+        buttons = ttk.Frame(frame)
+        buttons.grid(row=0, column=2, rowspan=4, sticky='n', padx=(5, 0))
+        for text, command in (('Search', self.search),
+                              ('Browse...', self.browse),
+                              ('Index folder', self.index_folder),
+                              ('Stop', self.cancel),
+                              ('Close', self.close)):
+            ttk.Button(buttons, text=text,
+                       command=command).pack(fill='x', pady=1)
+
+        results = ttk.Frame(frame)
+        results.grid(row=4, column=0, columnspan=3, sticky='nsew',
+                     pady=(5, 0))
+        self.tree = ttk.Treeview(results, columns=('line', 'text'),
+                                 height=15)
+        self.tree.heading('#0', text='File')
+        self.tree.heading('line', text='Line')
+        self.tree.heading('text', text='Text')
+        self.tree.column('#0', width=250)
+        self.tree.column('line', width=60, anchor='e', stretch=False)
+        self.tree.column('text', width=400)
+        scrollbar = ttk.Scrollbar(results, command=self.tree.yview)
+        self.tree.config(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.tree.pack(side='left', fill='both', expand=1)
+
+        ttk.Label(frame, textvariable=self.message).grid(
+            row=5, column=0, columnspan=3, sticky='w'
+        )
+        ttk.Label(frame, textvariable=self.main.indexer.message).grid(
+            row=6, column=0, columnspan=3, sticky='w'
+        )
+
+        self.find_entry.bind('<Return>', lambda event: self.search())
+        self.tree.bind('<Double-1>', self.open_result)
+        self.tree.bind('<Return>', self.open_result)
+        self.window.bind('<Escape>', lambda event: self.close())
+
+    def close(self):
+        """Stops the search and closes the window."""
+        self.cancel()
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None
+        self.main.textbox.focus_set()
+
+    def browse(self):
+        """Asks the user for the searched folder."""
+        import tkinter.filedialog
+        directory = tk.filedialog.askdirectory(
+            parent=self.window, initialdir=self.directory.get()
+        )
+        if directory:
+            self.directory.set(directory)
+
+    def index_folder(self):
+        """Adds the searched folder to the trigram index."""
+        if not os.path.isdir(self.directory.get()):
+            self.message.set('The folder doesn\'t exist')
+            return
+        self.main.indexer.add_folder(self.directory.get())
+
+    # searching
+    def cancel(self):
+        """Stops the current search."""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+            self.message.set(f'Stopped. {self.summary()}')
+
+    def search(self):
+        """Starts searching the files of the folder."""
+        self.cancel()
+        self.tree.delete(*self.tree.get_children())
+        self.locations = {}
+        self.count = self.skipped = self.failed = 0
+        self.searched = self.size = 0
+
+        if self.find_text.get() == '':
+            self.message.set('')
+            return
+        if not os.path.isdir(self.directory.get()):
+            self.message.set('The folder doesn\'t exist')
+            return
+        # filesearch, and the pool, are only loaded for the first search
+        from filesearch import compile_bytes
+        try:
+            pattern = compile_bytes(compile_pattern(
+                self.find_text.get(), self.regex.get(), self.match_case.get()
+            ))
+        except re.error as error:
+            self.message.set(f'Invalid regular expression: {error}')
+            return
+
+        query = None
+        if self.main.indexer.enabled:
+            from trigramindex import query_trigrams
+            query = query_trigrams(self.find_text.get(), self.regex.get())
+        self.task = FileSearchTask(self.main.workers, self.directory.get(),
+                                   self.include.get(), pattern, query)
+        self.message.set('Searching...')
+        self.main.master.after(POLL_INTERVAL, self.poll, self.task)
+
+    def summary(self):
+        """Returns a description of the results for the message label."""
+        message = (f'{self.count} matches in {self.searched} files '
+                   f'({self.size / 1024 / 1024:.1f} MB)')
+        if self.skipped:
+            message += f', {self.skipped} binary files skipped'
+        if self.failed:
+            message += f', {self.failed} files could not be searched'
+        if self.task is not None and self.task.indexed:
+            message += f', {self.task.indexed} files in the index'
+        return message
+
+    def poll(self, task):
+        """Adds the results found so far to the list.
+
+        Arguments:
+            task (FileSearchTask): the search it was called for.
+        """
+        if task is not self.task:
+            return
+        added = 0
+        while added < INSERT_BATCH:
+            try:
+                result = task.results.get_nowait()
+            except queue.Empty:
+                break
+            if result is None:
+                self.message.set(f'Done. {self.summary()}')
+                self.task = None
+                if task.stale:
+                    # files of the index changed since they were indexed
+                    self.main.indexer.update()
+                return
+            added += self.add_result(*result)
+            if self.count >= MAX_RESULTS:
+                self.cancel()
+                self.message.set(f'Stopped after {MAX_RESULTS} matches. '
+                                 f'{self.summary()}')
+                return
+
+        self.message.set(f'Searching... {self.searched} of {task.files} '
+                         f'files. {self.summary()}')
+        self.main.master.after(POLL_INTERVAL, self.poll, task)
+
+    def add_result(self, path, size, matches, skipped):
+        """Adds the matches of a file to the list.
+
+        Arguments:
+            path (str): path of the file.
+            size (int): size of the file in bytes.
+            matches (list): (line, preview) tuples.
+            skipped (str): why the file was not searched, or None.
+            See filesearch.search_file().
+
+        Returns:
+            int: number of added matches.
+        """
+        self.searched += 1
+        self.size += size
+        if skipped == 'binary':
+            self.skipped += 1
+        elif skipped is not None:
+            self.failed += 1
+        if not matches:
+            return 0
+        name = os.path.relpath(path, self.directory.get())
+        parent = self.tree.insert('', 'end', text=name, open=True,
+                                  values=('', f'{len(matches)} matches'))
+        self.locations[parent] = (path, matches[0][0])
+        for line, text in matches:
+            item = self.tree.insert(parent, 'end', text='',
+                                    values=(line, text))
+            self.locations[item] = (path, line)
+        self.count += len(matches)
+        return len(matches)
+
+    def open_result(self, event=None):
+        """Opens the file of the selected result at its line."""
+        selection = self.tree.selection()
+        if not selection or selection[0] not in self.locations:
+            return
+        path, line = self.locations[selection[0]]
+        self.main.file_menu.open_path(path, line)
+        self.main.master.lift()
+        self.main.textbox.focus_set()
+
+class SearchIndexer:
+    """Keeps the trigram index up to date in the background.
+
+    The index has the files opened in the editor and the folders added
+    from the Find in Files window. It is updated in a thread, with a
+    pool of processes (see trigramindex.update()), when the app starts,
+    when files or folders are added, and when a search finds files that
+    changed.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+
+    Attributes:
+        enabled (bool): False if the index is not used nor updated.
+        message (tkinter.StringVar): the progress of the update or the
+        size of the index, shown in the Find in Files window.
+    """
+    def __init__(self, main):
+        """Prepares the indexer. It does nothing until it is enabled.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+        """
+        self.main = main
+        self.enabled = False
+        self.message = tk.StringVar(main.master)
+        self.thread = None
+        self.cancelled = threading.Event()
+        self.files = [] # files to add in the next update
+        self.roots = [] # folders to add in the next update
+        self.again = False # update again when the current one ends
+        self.progress = (0, 0, 0) # see trigramindex.update()
+        self.result = None # what the last update returned, or its error
+
+    def set_enabled(self, enabled):
+        """Turns on or off the index.
+
+        Arguments:
+            enabled (bool): True to use and update the index.
+        """
+        self.enabled = enabled
+        if enabled:
+            self.message.set('Search index: waiting to update')
+            self.main.master.after(INDEX_DELAY, self.update)
+        else:
+            self.cancel()
+            self.message.set('Search index: off')
+
+    def add_file(self, path):
+        """Adds a file to the index.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        if self.enabled and path:
+            self.files.append(path)
+            self.update()
+
+    def add_folder(self, path):
+        """Adds a folder and its files to the index.
+
+        Arguments:
+            path (str): path of the folder.
+        """
+        if not self.enabled:
+            self.message.set('Search index: off, it can be turned on in '
+                             'the Config menu')
+            return
+        self.roots.append(path)
+        self.update()
+
+    def update(self):
+        """Starts updating the index, unless an update is running."""
+        if not self.enabled:
+            return
+        if self.thread is not None and self.thread.is_alive():
+            self.again = True
+            return
+        self.again = False
+        self.cancelled.clear()
+        self.progress = (0, 0, 0)
+        files, self.files = self.files, []
+        roots, self.roots = self.roots, []
+        self.start_time = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, args=(files, roots),
+                                       daemon=True)
+        self.thread.start()
+        self.main.master.after(INDEX_POLL_INTERVAL, self.poll)
+
+    def cancel(self):
+        """Stops the update in progress."""
+        self.cancelled.set()
+
+    # worker thread
+    def run(self, files, roots):
+        """Updates the index.
+
+        Arguments:
+            files (list): paths of the files to add.
+            roots (list): paths of the folders to add.
+        """
+        import sqlite3
+        import trigramindex
+
+        def progress(*args):
+            """Keeps the progress for the UI thread."""
+            self.progress = args
+
+        try:
+            index = trigramindex.TrigramIndex()
+        except (sqlite3.Error, OSError) as error:
+            self.result = error
+            return
+        try:
+            for root in roots:
+                index.add_root(root)
+            done, size = trigramindex.update(index, self.main.workers, files,
+                                             progress, self.cancelled)
+            self.result = (done, size, index.stats())
+        except (sqlite3.Error, OSError, RuntimeError) as error:
+            # RuntimeError: the pool was shut down, the app is closing
+            self.result = error
+        finally:
+            index.close()
+
+    # UI thread
+    def poll(self):
+        """Shows the progress of the update."""
+        elapsed = max(time.perf_counter() - self.start_time, 1e-6)
+        if self.thread.is_alive():
+            done, total, size = self.progress
+            self.message.set(f'Search index: updating, {done} of {total} '
+                             f'files ({size / 1024 / 1024 / elapsed:.1f} '
+                             'MB/s)')
+            self.main.master.after(INDEX_POLL_INTERVAL, self.poll)
+            return
+
+        if isinstance(self.result, Exception):
+            self.message.set(f'Search index: error, {self.result}')
+        elif self.result is not None:
+            done, size, (files, total, database) = self.result
+            megabytes = 1024 * 1024
+            self.message.set(
+                f'Search index: {files} files, {total / megabytes:.1f} MB '
+                f'(index {database / megabytes:.1f} MB). Updated {done} '
+                f'files, {size / megabytes:.1f} MB in {elapsed:.1f} s'
+            )
+            if done:
+                self.main.set_status('Search index updated')
+        if self.again:
+            self.update()
@@ -0,0 +1,354 @@
+"""Follows a file that other programs keep writing, like a log.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import codecs
+import ctypes
+import os
+import struct
+import sys
+import tkinter as tk
+
+from fileloader import file_identity
+
+# how often (in ms) the file is checked when inotify is not available
+POLL_INTERVAL = 500
+# time (in ms) waited after a change, so the writes that come right
+# after it are inserted together
+BATCH_DELAY = 100
+# max number of bytes read and inserted at a time
+BATCH_SIZE = 256 * 1024
+
+# inotify constants, from <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_IGNORED = 0x8000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+# the file is gone: it has to be watched again once it is recreated
+GONE = IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+# size of struct inotify_event, without its name
+EVENT_SIZE = struct.calcsize('iIII')
+
+class Inotify:
+    """Watches a file with the inotify API of Linux, through ctypes.
+
+    fileno() becomes readable when the file changes, so it can be
+    watched by tk's event loop without a thread.
+
+    Arguments:
+        path (str): path of the file.
+
+    Raises:
+        OSError: if inotify is not available or the file can't be watched.
+    """
+    def __init__(self, path):
+        """Starts watching the file.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError) as error:
+            raise OSError('inotify is not available') from error
+
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        mask = IN_MODIFY | IN_ATTRIB | GONE
+        if add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, os.strerror(errno), path)
+
+    def fileno(self):
+        """Returns the file descriptor that is readable after a change."""
+        return self.fd
+
+    def read_events(self):
+        """Returns the masks of the events that happened since the last call."""
+        masks = []
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            pos = 0
+            while pos + EVENT_SIZE <= len(data):
+                _, mask, _, length = struct.unpack_from('iIII', data, pos)
+                masks.append(mask)
+                pos += EVENT_SIZE + length
+        return masks
+
+    def close(self):
+        """Stops watching the file."""
+        os.close(self.fd)
+
+class FileFollower:
+    """Inserts the text that is appended to the file at the end of the
+    text display.
+
+    The file is kept open and only the new bytes are read. The changes
+    are noticed with inotify, or by checking the file every
+    POLL_INTERVAL ms where it is not available. If the file is rotated
+    or truncated, the new file is followed from its start.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+        path (str): path of the file.
+        offset (int): number of bytes of the file that are already in
+        the text display. If it is None, it is the size of the file.
+        max_lines (int): if it is not 0, the first lines are removed
+        when the text display has more lines than this.
+
+    Attributes:
+        trimmed (bool): True if lines were removed, so the text display
+        doesn't have the whole file anymore.
+
+    Raises:
+        OSError: if the file can't be opened.
+    """
+    def __init__(self, main, path, offset=None, max_lines=0):
+        """Opens the file. Call start() to follow it.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+            path (str): path of the file.
+            offset (int): number of bytes already read.
+            max_lines (int): max number of lines kept, or 0.
+        """
+        self.main = main
+        self.path = path
+        self.max_lines = max_lines
+        self.trimmed = False
+        self.inotify = None
+        self.pending = None # tk after id of the next check
+        self.file = None
+        self.open(offset)
+
+    def open(self, offset=None):
+        """Opens the file and moves to a position.
+
+        Arguments:
+            offset (int): position in bytes, or None for the end.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.file = open(self.path, 'rb')
+        stat = os.fstat(self.file.fileno())
+        self.identity = (stat.st_dev, stat.st_ino)
+        self.file.seek(stat.st_size if offset is None else offset)
+
+        file_format = self.main.file_format
+        self.decoder = codecs.getincrementaldecoder(file_format.encoding)(
+            errors='replace'
+        )
+        self.carriage_return = False # the last chunk ended with '\r'
+        self.skip_bom = file_format.bom and self.file.tell() == 0
+
+    def start(self):
+        """Starts following the file.
+
+        The journal of the file stops recording the changes meanwhile:
+        the saved version of the file keeps growing, so it could never
+        be replayed.
+        """
+        main = self.main
+        listeners = main.textbox.listeners
+        if main.file_menu.record_change in listeners:
+            if main.journal is not None:
+                try:
+                    main.journal.flush()
+                except OSError:
+                    main.journal = None
+            listeners.remove(main.file_menu.record_change)
+        self.watch()
+        self.schedule(0)
+
+    def stop(self):
+        """Stops following the file and closes it."""
+        if self.pending is not None:
+            self.main.master.after_cancel(self.pending)
+            self.pending = None
+        self.unwatch()
+        if self.file is not None:
+            self.file.close()
+        self.main.set_status('')
+        self.resume_journal()
+
+    def resume_journal(self):
+        """Records the changes in the journal again, from the file as it
+        is now.
+        """
+        main = self.main
+        if main.file_menu.record_change not in main.textbox.listeners:
+            main.textbox.listeners.append(main.file_menu.record_change)
+        if main.journal is None:
+            return
+        try:
+            if self.trimmed:
+                # the text doesn't start where the file does anymore
+                main.journal.discard()
+                main.journal = None
+            else:
+                main.journal.start()
+        except OSError:
+            main.journal = None
+
+    def restart(self, offset=None):
+        """Follows the file again, after it was replaced by a save.
+
+        Arguments:
+            offset (int): number of bytes already read, or None for the end.
+        """
+        self.unwatch()
+        try:
+            self.open(offset)
+        except OSError:
+            pass # it is opened again when it is recreated
+        self.start()
+
+    def watch(self):
+        """Watches the file with inotify, if it is available."""
+        try:
+            self.inotify = Inotify(self.path)
+            self.main.master.tk.createfilehandler(
+                self.inotify.fileno(), tk.READABLE, self.on_event
+            )
+        except (OSError, AttributeError):
+            # not linux, or tk can't watch files (windows)
+            if self.inotify is not None:
+                self.inotify.close()
+                self.inotify = None
+        method = 'inotify' if self.inotify is not None else 'polling'
+        self.main.set_status(f'Following the file ({method})')
+
+    def unwatch(self):
+        """Stops watching the file with inotify."""
+        if self.inotify is not None:
+            self.main.master.tk.deletefilehandler(self.inotify.fileno())
+            self.inotify.close()
+            self.inotify = None
+
+    def on_event(self, fd, mask):
+        """Called by tk when inotify reports changes."""
+        if any(event & GONE for event in self.inotify.read_events()):
+            # deleted or renamed: poll until there is a new file
+            self.unwatch()
+            self.main.set_status('Following the file (polling)')
+        self.schedule(BATCH_DELAY)
+
+    def schedule(self, delay):
+        """Checks the file after some time, unless a check is pending.
+
+        Arguments:
+            delay (int): the time, in ms.
+        """
+        if self.pending is None:
+            self.pending = self.main.master.after(delay, self.check)
+
+    def check(self):
+        """Reads and inserts the new bytes of the file."""
+        self.pending = None
+        if self.file is None:
+            # deleted or replaced, and not created again yet
+            try:
+                self.open(0)
+            except OSError:
+                self.schedule(POLL_INTERVAL)
+                return
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            stat = None # deleted, it may be created again
+        if stat is not None and (
+                (stat.st_dev, stat.st_ino) != self.identity or
+                stat.st_size < self.file.tell()):
+            # rotated or truncated: the rest of the old file comes first
+            self.append(self.file.read())
+            self.unwatch()
+            try:
+                self.open(0)
+            except OSError:
+                self.schedule(POLL_INTERVAL)
+                return
+            self.watch()
+
+        data = self.file.read(BATCH_SIZE)
+        self.append(data)
+        if len(data) == BATCH_SIZE:
+            # there is more, but tk gets to run first
+            self.schedule(1)
+        elif self.inotify is None:
+            self.schedule(POLL_INTERVAL)
+
+    def append(self, data):
+        """Inserts bytes of the file at the end of the text display.
+
+        Arguments:
+            data (bytes): the bytes.
+        """
+        text = self.decoder.decode(data)
+        # line breaks are converted like fileloader.read_chunks() does
+        if self.carriage_return:
+            text = '\r' + text
+        self.carriage_return = text.endswith('\r')
+        if self.carriage_return:
+            text = text[:-1]
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        if self.skip_bom and text:
+            text = text[1:] if text.startswith('\ufeff') else text
+            self.skip_bom = False
+        if not text:
+            return
+
+        main = self.main
+        textbox = main.textbox
+        at_bottom = textbox.yview()[1] >= 1.0
+        # the new text is in the file, so it is not an unsaved change
+        modified = textbox.edit_modified()
+        main.undo.enabled = False
+        with textbox.suspend_events():
+            textbox.insert('end-1c', text)
+            self.trim()
+        main.undo.enabled = True
+        textbox.edit_modified(modified)
+        main.disk_size = self.file.tell()
+        main.disk_stat = file_identity(os.fstat(self.file.fileno()))
+        if at_bottom:
+            textbox.see('end')
+
+    def trim(self):
+        """Removes the first lines if there are more than max_lines."""
+        textbox = self.main.textbox
+        excess = textbox.lines.line_count() - self.max_lines
+        if not self.max_lines or excess <= 0:
+            return
+        textbox.delete('1.0', f'{excess + 1}.0')
+        self.trimmed = True
+        # the positions of the steps changed
+        self.main.undo.clear()
@@ -20,7 +20,6 @@ import tkinter as tk
 import tkinter.ttk as ttk
 import tkinter.messagebox as msgbox
 import os.path
-import webbrowser
 
 class HelpMenu:
     """'Help' menu elements'.
@@ -29,13 +28,24 @@ class HelpMenu:
         main (main.MainApplication): an instance of the main class
     """
     def __init__(self, main):
-        """Creates the menu buttons.
+        """Adds the help menu to the menu bar.
+
+        Its buttons are created the first time it is opened.
         
         Arguments:
             main (main.MainApplication): an instance of the main class
         """
         self.main = main
-        
+        self.helpmenu = tk.Menu(self.main.master, tearoff=0,
+                                postcommand=self.create_menu_buttons)
+        self.main.menubar.add_cascade(label='Help', menu=self.helpmenu)
+
+    def create_menu_buttons(self):
+        """Creates the menu buttons, if they weren't created."""
+        helpmenu = self.helpmenu
+        if helpmenu.index('end') is not None:
+            return
+
         # paths and urls
         issues_url = 'https://github.com/ghnoob/Another-txt-Editor/issues/new'
         readme_path = 'file://' + os.path.abspath('README.html')
@@ -44,32 +54,40 @@ class HelpMenu:
         dev_url = 'https://github.com/ghnoob'
         
         # menu buttons
-        helpmenu = tk.Menu(self.main.master, tearoff=0)
         helpmenu.add_command(label='About...', command=self.show_about_box)
         helpmenu.add_separator()
         helpmenu.add_command(
             label = 'Report a bug',
-            command = lambda: webbrowser.open_new_tab(issues_url)
+            command = lambda: self.open_url(issues_url)
         )
         helpmenu.add_separator()
         helpmenu.add_command(
             label = 'Open readme file',
-            command = lambda: webbrowser.open_new_tab(readme_path)
+            command = lambda: self.open_url(readme_path)
         )
         helpmenu.add_command(
             label = 'View license',
-            command = lambda: webbrowser.open_new_tab(license_url)
+            command = lambda: self.open_url(license_url)
         )
         helpmenu.add_separator()
         helpmenu.add_command(
             label = 'View source code',
-            command = lambda: webbrowser.open_new_tab(source_url)
+            command = lambda: self.open_url(source_url)
         )
         helpmenu.add_command(
             label = "Visit author's GitHub profile",
-            command = lambda: webbrowser.open_new_tab(dev_url)
+            command = lambda: self.open_url(dev_url)
         )
-        self.main.menubar.add_cascade(label='Help', menu=helpmenu)
+
+    def open_url(self, url):
+        """Opens a web page or file in the browser.
+
+        Arguments:
+            url (str): the address.
+        """
+        # webbrowser is slow to import and only needed here
+        import webbrowser
+        webbrowser.open_new_tab(url)
 
     def show_about_box(self):
         """Shows an about box with copyright info."""
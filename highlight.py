@@ -0,0 +1,370 @@
+"""Highlights logs, JSON and INI files in the visible part of the text.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import re
+import time
+
+from compression import strip_extension
+
+# max time (in ms) spent lexing before giving control back to tk
+SLICE_BUDGET = 10
+# number of lines around the visible ones that are highlighted too
+MARGIN = 50
+# number of lines read from the text display at a time
+BATCH_LINES = 256
+# lines longer than this are not highlighted
+MAX_LINE_LENGTH = 10000
+
+# colors of the tags
+STYLES = {
+    'timestamp': {'foreground': '#2a7ab0'},
+    'error': {'foreground': '#c0392b'},
+    'trace': {'foreground': '#a05050'},
+    'warning': {'foreground': '#b9770e'},
+    'info': {'foreground': '#1e8449'},
+    'debug': {'foreground': '#808080'},
+    'key': {'foreground': '#7d3c98'},
+    'string': {'foreground': '#1e8449'},
+    'number': {'foreground': '#2a7ab0'},
+    'keyword': {'foreground': '#b9770e'},
+    'section': {'foreground': '#7d3c98'},
+    'comment': {'foreground': '#808080'},
+}
+
+class Grammar:
+    """Splits lines into tokens.
+
+    Lexing a line depends on the state at its start, like being inside
+    a multi-line value, and returns the state at its end, so an edit
+    only affects the lines until the states are the same as before.
+
+    Attributes:
+        name (str): name shown to the user.
+        extensions (tuple): file extensions that use the grammar.
+        rules (list): (tag, regular expression) tuples, tried in order.
+    """
+    name = ''
+    extensions = ()
+    rules = []
+
+    def __init__(self):
+        """Compiles the rules in one regular expression."""
+        self.pattern = re.compile('|'.join(
+            f'(?P<{tag}_{i}>{regex})' for i, (tag, regex) in enumerate(self.rules)
+        ))
+
+    def tokens(self, line, pos=0):
+        """Returns the tokens that match the rules.
+
+        Arguments:
+            line (str): the line.
+            pos (int): where the search starts.
+
+        Returns:
+            list: (start, end, tag) tuples.
+        """
+        return [(match.start(), match.end(), match.lastgroup.rsplit('_', 1)[0])
+                for match in self.pattern.finditer(line, pos)]
+
+    def lex(self, line, state):
+        """Lexes a line.
+
+        Arguments:
+            line (str): the line, without the line break.
+            state: the state at the start of the line. None is the
+            state at the start of the text.
+
+        Returns:
+            tuple: the list of (start, end, tag) tokens and the state at
+            the end of the line.
+        """
+        return self.tokens(line), None
+
+class LogGrammar(Grammar):
+    """Timestamps and log levels. The lines after an error that start
+    with spaces (like a stack trace) are part of it."""
+    name = 'Log'
+    extensions = ('.log', '.out')
+    rules = [
+        ('timestamp', r'\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d(?:[.,]\d+)?'
+                      r'(?:Z|[+-]\d\d:?\d\d)?'),
+        ('timestamp', r'\b\d\d:\d\d:\d\d(?:[.,]\d+)?\b'),
+        ('error', r'\b(?:FATAL|CRITICAL|SEVERE|ERROR|ERR)\b'),
+        ('warning', r'\b(?:WARNING|WARN)\b'),
+        ('info', r'\b(?:INFO|NOTICE)\b'),
+        ('debug', r'\b(?:DEBUG|TRACE|FINE)\b'),
+    ]
+    continuation = re.compile(r'\s|Traceback|Caused by|\.\.\. \d+ more')
+
+    def lex(self, line, state):
+        if state == 'error' and self.continuation.match(line):
+            return [(0, len(line), 'trace')], 'error'
+        tokens = self.tokens(line)
+        if any(tag == 'error' for start, end, tag in tokens):
+            return tokens, 'error'
+        return tokens, None
+
+class JsonGrammar(Grammar):
+    """Keys, strings, numbers and keywords. A string that isn't closed
+    in its line continues in the next one."""
+    name = 'JSON'
+    extensions = ('.json', '.geojson')
+    rules = [
+        ('key', r'"(?:[^"\\]|\\.)*"(?=\s*:)'),
+        ('string', r'"(?:[^"\\]|\\.)*"'),
+        ('unclosed', r'"(?:[^"\\]|\\.)*$'),
+        ('number', r'-?\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b'),
+        ('keyword', r'\b(?:true|false|null)\b'),
+    ]
+    string_end = re.compile(r'(?:[^"\\]|\\.)*"')
+
+    def lex(self, line, state):
+        tokens = []
+        pos = 0
+        if state == 'string':
+            match = self.string_end.match(line)
+            if match is None:
+                return [(0, len(line), 'string')], 'string'
+            tokens.append((0, match.end(), 'string'))
+            pos = match.end()
+        tokens.extend(self.tokens(line, pos))
+        if tokens and tokens[-1][2] == 'unclosed':
+            start, end, tag = tokens[-1]
+            tokens[-1] = (start, end, 'string')
+            return tokens, 'string'
+        return tokens, None
+
+class IniGrammar(Grammar):
+    """Sections, keys and comments, like config.cfg. Indented lines
+    after a key continue its value."""
+    name = 'INI'
+    extensions = ('.ini', '.cfg', '.conf')
+    rules = [
+        ('comment', r'^\s*[#;].*'),
+        ('section', r'^\s*\[[^\]]*\]'),
+        ('key', r'^[^\s=:][^=:]*?(?=\s*[=:])'),
+    ]
+
+    def lex(self, line, state):
+        if state == 'value' and line[:1].isspace() and line.strip():
+            return [(0, len(line), 'string')], 'value'
+        tokens = self.tokens(line)
+        if tokens and tokens[0][2] == 'key':
+            return tokens, 'value'
+        return tokens, None
+
+# grammars used by the highlighter. More can be added with
+# register_grammar()
+GRAMMARS = []
+
+def register_grammar(grammar):
+    """Adds a grammar for the file extensions it lists.
+
+    Arguments:
+        grammar (Grammar): the grammar.
+    """
+    GRAMMARS.append(grammar)
+
+for grammar_class in (LogGrammar, JsonGrammar, IniGrammar):
+    register_grammar(grammar_class())
+
+def grammar_for(path):
+    """Returns the grammar for a file, or None if there isn't one.
+
+    Arguments:
+        path (str): path of the file.
+    """
+    # 'app.log.gz' is highlighted like 'app.log'
+    extension = os.path.splitext(strip_extension(path))[1].lower()
+    for grammar in GRAMMARS:
+        if extension in grammar.extensions:
+            return grammar
+    return None
+
+class Highlighter:
+    """Highlights the text display with the grammar of the file.
+
+    The state at the start of every line is kept. When the text
+    changes, the lines are lexed again from the changed one until the
+    state is the same as before the change. Lines are only lexed up to
+    the visible part of the text display, in time slices that don't
+    freeze the app, and only the visible lines (plus a margin) are
+    tagged.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+
+    Attributes:
+        enabled (bool): False to remove the highlighting.
+    """
+    def __init__(self, main):
+        """Starts following the changes of the text display.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+        """
+        self.main = main
+        self.enabled = True
+        self.path = None
+        self.grammar = None
+        self.states = [None] # state at the start of every lexed line
+        self.valid = 1 # number of states known to be right
+        self.edited = -1 # last line changed since the last lexing
+        self.pending = None # tk after id
+
+        textbox = main.textbox
+        for tag, style in STYLES.items():
+            textbox.tag_config(f'hl_{tag}', **style)
+        textbox.tag_raise('sel')
+        textbox.listeners.append(self.on_change)
+        textbox.bind('<<ViewChange>>', lambda event: self.schedule(), add='+')
+
+    def set_enabled(self, enabled):
+        """Turns the highlighting on or off.
+
+        Arguments:
+            enabled (bool): True to highlight.
+        """
+        self.enabled = enabled
+        self.path = None
+        self.schedule()
+
+    def on_change(self, operation, offset, text):
+        """Moves the states of the lines after a change of the text.
+
+        Arguments:
+            operation (str): 'insert', 'delete' or 'reset'.
+            offset (int): the position of the change, in characters.
+            text (str): the inserted or deleted text.
+        """
+        if self.grammar is None:
+            return
+        if operation == 'reset':
+            self.states = [None]
+            self.valid = 1
+            self.edited = -1
+            self.schedule()
+            return
+
+        line = self.main.textbox.lines.position(offset)[0]
+        breaks = text.count('\n')
+        if line + 1 < len(self.states):
+            if operation == 'insert':
+                self.states[line + 1:line + 1] = [None] * breaks
+                if self.edited > line:
+                    self.edited += breaks
+                self.edited = max(self.edited, line + breaks)
+            else:
+                del self.states[line + 1:line + 1 + breaks]
+                if self.edited > line:
+                    self.edited = max(line, self.edited - breaks)
+                self.edited = max(self.edited, line)
+        self.valid = min(self.valid, line + 1, len(self.states))
+        self.schedule()
+
+    def schedule(self):
+        """Highlights the visible lines soon."""
+        if self.pending is None:
+            self.pending = self.main.master.after_idle(self.run)
+
+    def visible_lines(self):
+        """Returns the first and last lines to highlight, from 0."""
+        textbox = self.main.textbox
+        top = int(textbox.index('@0,0').split('.')[0]) - 1
+        bottom = int(textbox.index(
+            f'@0,{textbox.winfo_height()}'
+        ).split('.')[0]) - 1
+        return max(0, top - MARGIN), bottom + MARGIN
+
+    def run(self):
+        """Lexes for a while, and tags the visible lines once they are lexed."""
+        self.pending = None
+        if self.path != self.main.path:
+            self.path = self.main.path
+            self.grammar = grammar_for(self.path) if self.enabled else None
+            self.states = [None]
+            self.valid = 1
+            self.edited = -1
+            self.clear_tags()
+        if self.grammar is None:
+            return
+
+        first, last = self.visible_lines()
+        last = min(last, self.main.textbox.lines.line_count() - 1)
+        deadline = time.perf_counter() + SLICE_BUDGET / 1000
+        while self.valid <= last:
+            self.lex_batch(last)
+            if time.perf_counter() > deadline:
+                self.pending = self.main.master.after(1, self.run)
+                return
+        self.apply_tags(first, last)
+
+    def lex_batch(self, last):
+        """Lexes lines from the first one without a valid state.
+
+        Arguments:
+            last (int): the last line that has to be lexed.
+        """
+        textbox = self.main.textbox
+        start = self.valid - 1
+        end = min(start + BATCH_LINES, last + 1)
+        lines = textbox.get(f'{start + 1}.0', f'{end}.end').split('\n')
+        state = self.states[start]
+        line = start
+        for text in lines:
+            if len(text) > MAX_LINE_LENGTH:
+                text = text[:MAX_LINE_LENGTH]
+            state = self.grammar.lex(text, state)[1]
+            line += 1
+            if line < len(self.states):
+                if line > self.edited and self.states[line] == state:
+                    # the rest of the states didn't change
+                    self.valid = len(self.states)
+                    self.edited = -1
+                    return
+                self.states[line] = state
+            else:
+                self.states.append(state)
+            self.valid = line + 1
+
+    def clear_tags(self):
+        """Removes the highlighting."""
+        for tag in STYLES:
+            self.main.textbox.tag_remove(f'hl_{tag}', '1.0', 'end')
+
+    def apply_tags(self, first, last):
+        """Tags the tokens of some lines.
+
+        Arguments:
+            first (int): the first line, from 0.
+            last (int): the last line.
+        """
+        textbox = self.main.textbox
+        ranges = {tag: [] for tag in STYLES}
+        lines = textbox.get(f'{first + 1}.0', f'{last + 1}.end').split('\n')
+        for i, text in enumerate(lines, first):
+            if len(text) > MAX_LINE_LENGTH or i >= len(self.states):
+                continue
+            for start, end, tag in self.grammar.lex(text, self.states[i])[0]:
+                ranges[tag].extend((f'{i + 1}.{start}', f'{i + 1}.{end}'))
+
+        self.clear_tags()
+        for tag, indices in ranges.items():
+            if indices:
+                textbox.tag_add(f'hl_{tag}', *indices)
@@ -0,0 +1,298 @@
+"""Journal of unsaved changes, used to recover them after a crash.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+
+A journal is a binary file next to the file it belongs to. It starts
+with a header that identifies the saved version of the file:
+
+    magic (8 bytes), size (8 bytes), modification time in ns (8 bytes)
+
+and then has one record per change:
+
+    operation (1 byte), offset (8 bytes), length (4 bytes), text (utf-8)
+
+Offsets are in characters. Deletions store the deleted text, so the
+journal says everything about the change.
+"""
+
+import os
+import struct
+
+MAGIC = b'ATXTJRN1'
+HEADER = struct.Struct('<8sQQ')
+RECORD = struct.Struct('<BQI')
+
+OPERATIONS = {'insert': 1, 'delete': 2, 'reset': 3}
+NAMES = {value: key for key, value in OPERATIONS.items()}
+
+# how often (in ms) the pending changes are written to the disk
+AUTOSAVE_INTERVAL = 2000
+# journals bigger than this (in bytes) are compacted
+COMPACT_SIZE = 4 * 1024 * 1024
+
+def journal_path(path):
+    """Returns the path of the journal of a file.
+
+    Arguments:
+        path (str): path of the file.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f'.{name}.journal')
+
+def base_stat(path):
+    """Returns the size and modification time that identify a file.
+
+    Arguments:
+        path (str): path of the file.
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def merge(changes, operation, offset, text):
+    """Adds a change to a list of changes, merging it with the last one.
+
+    Typing adds a lot of one character insertions or deletions next to
+    each other, which are stored as one.
+
+    Arguments:
+        changes (list): list of [operation, offset, text] lists.
+        operation (str): 'insert', 'delete' or 'reset'.
+        offset (int): the position of the change, in characters.
+        text (str): the inserted or deleted text.
+    """
+    if changes:
+        last = changes[-1]
+        if operation == last[0] == 'insert':
+            if offset == last[1] + len(last[2]):
+                last[2] += text
+                return
+        elif operation == last[0] == 'delete':
+            if offset == last[1]: # the delete key
+                last[2] += text
+                return
+            if offset + len(text) == last[1]: # backspace
+                last[1] = offset
+                last[2] = text + last[2]
+                return
+    if operation == 'reset':
+        changes.clear()
+    changes.append([operation, offset, text])
+
+def read_journal(path):
+    """Reads the journal of a file.
+
+    Arguments:
+        path (str): path of the file (not of the journal).
+
+    Returns:
+        list: the changes as [operation, offset, text] lists, or None if
+        there is not a valid journal for the saved version of the file.
+    """
+    try:
+        with open(journal_path(path), 'rb') as file_:
+            data = file_.read()
+        base = base_stat(path)
+    except OSError:
+        return None
+
+    if len(data) < HEADER.size:
+        return None
+    magic, size, mtime = HEADER.unpack_from(data)
+    if magic != MAGIC or (size, mtime) != base:
+        return None
+
+    return decode(data, HEADER.size)
+
+def discard_journal(path):
+    """Deletes the journal of a file, if there is one.
+
+    Arguments:
+        path (str): path of the file (not of the journal).
+    """
+    try:
+        os.remove(journal_path(path))
+    except OSError:
+        pass
+
+def decode(data, pos=0):
+    """Converts journal records to changes.
+
+    Arguments:
+        data (bytes): the records.
+        pos (int): position of the first record in data.
+
+    Returns:
+        list: the changes as [operation, offset, text] lists.
+    """
+    changes = []
+    while pos + RECORD.size <= len(data):
+        operation, offset, length = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        if operation not in NAMES or pos + length > len(data):
+            break # the app crashed while writing this record
+        text = data[pos:pos + length].decode('utf-8', errors='replace')
+        pos += length
+        merge(changes, NAMES[operation], offset, text)
+    return changes
+
+def encode(changes):
+    """Converts changes to journal records.
+
+    Arguments:
+        changes (list): list of [operation, offset, text] lists.
+    """
+    records = []
+    for operation, offset, text in changes:
+        data = text.encode('utf-8', errors='surrogatepass')
+        records.append(RECORD.pack(OPERATIONS[operation], offset, len(data)))
+        records.append(data)
+    return b''.join(records)
+
+class EditJournal:
+    """Appends the changes made to a file to its journal.
+
+    Changes are kept in memory and written every AUTOSAVE_INTERVAL ms,
+    so the cost of the autosave depends on the size of the changes,
+    not on the size of the file. The journal file is only created when
+    there are changes to write, so files that are just viewed don't get
+    one.
+
+    Arguments:
+        path (str): path of the file.
+    """
+    def __init__(self, path):
+        """Creates an empty journal for the saved version of a file.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        self.path = path
+        self.pending = []
+        self.file = None
+        self.base = None # base_stat() of the saved version of the file
+        self.saving = False # see mark()
+        self.start()
+
+    def start(self, changes=()):
+        """Starts the journal again from the saved version of the file.
+
+        Arguments:
+            changes (list): changes made after the version that was
+            saved, that have to stay in the journal.
+        """
+        self.close()
+        self.pending = []
+        self.base = base_stat(self.path)
+        if changes:
+            self.create(changes)
+        else:
+            # nothing to recover from the saved version
+            discard_journal(self.path)
+
+    def create(self, changes):
+        """Writes the journal file with some changes and opens it.
+
+        Arguments:
+            changes (list): the changes after the saved version.
+        """
+        size, mtime = self.base
+        # the old journal is replaced only once the new one is complete
+        path = journal_path(self.path)
+        with open(path + '.tmp', 'wb') as file_:
+            file_.write(HEADER.pack(MAGIC, size, mtime))
+            file_.write(encode(changes))
+            file_.flush()
+            os.fsync(file_.fileno())
+        os.replace(path + '.tmp', path)
+        self.file = open(path, 'ab')
+
+    def record(self, operation, offset, text):
+        """Adds a change to the journal.
+
+        Arguments:
+            operation (str): 'insert', 'delete' or 'reset'.
+            offset (int): the position of the change, in characters.
+            text (str): the inserted or deleted text.
+        """
+        merge(self.pending, operation, offset, text)
+
+    def flush(self):
+        """Writes the pending changes to the disk."""
+        if not self.pending:
+            return
+        if self.file is None:
+            self.create(self.pending)
+        else:
+            self.file.write(encode(self.pending))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.pending = []
+
+        # compacting while saving would move the mark
+        if self.file.tell() > COMPACT_SIZE and not self.saving:
+            self.compact()
+
+    def compact(self):
+        """Rewrites the journal merging the changes next to each other."""
+        self.flush()
+        changes = read_journal(self.path)
+        if changes is not None:
+            self.start(changes)
+
+    def mark(self):
+        """Returns the position of the journal, to be used by rebase().
+
+        It is called when a save starts: the changes written after the
+        mark are the ones the save doesn't include.
+        """
+        self.flush()
+        self.saving = True
+        # without a journal file, the changes will start after its header
+        return self.file.tell() if self.file is not None else HEADER.size
+
+    def rebase(self, mark):
+        """Starts the journal from a new saved version of the file.
+
+        Arguments:
+            mark (int): the position returned by mark() when the save
+            started.
+        """
+        self.flush()
+        self.saving = False
+        if self.file is None:
+            # there were no changes during the save
+            self.start()
+            return
+        self.file.close()
+        with open(journal_path(self.path), 'rb') as file_:
+            file_.seek(mark)
+            records = file_.read()
+        self.file = None
+        changes = decode(records)
+        self.start(changes)
+
+    def close(self):
+        """Closes the journal file, keeping it in the disk."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def discard(self):
+        """Closes the journal and deletes it."""
+        self.pending = []
+        self.saving = False
+        self.close()
+        discard_journal(self.path)
@@ -0,0 +1,314 @@
+"""Read-only viewer for files too big to be loaded in the text display.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import mmap
+import threading
+
+# files bigger than this (in bytes) are opened in large file mode
+LARGE_FILE_SIZE = 256 * 1024 * 1024
+# the index stores the first line of every block of this size (in bytes)
+BLOCK_SIZE = 1024 * 1024
+# number of lines that are in the text display at the same time
+WINDOW_LINES = 600
+# max number of bytes in the text display, in case the lines are very long
+WINDOW_BYTES = 4 * 1024 * 1024
+# the window is moved when the view gets closer than this to its edges
+EDGE = 0.15
+
+class LineIndex:
+    """Sparse index of the lines of a memory mapped file.
+
+    Instead of the position of every line, it stores the position of
+    the first line of every block of BLOCK_SIZE bytes, so it takes a
+    few kilobytes even for a file of several gigabytes. The rest of the
+    lines are found by scanning the block.
+
+    Arguments:
+        data (mmap.mmap): the contents of the file.
+        state (dict): an index of the same file from state(). If it is
+        given, build() doesn't have to be called.
+    """
+    def __init__(self, data, state=None):
+        """Creates an empty index. Call build() to fill it.
+
+        Arguments:
+            data (mmap.mmap): the contents of the file.
+            state (dict): a saved index, or None.
+        """
+        self.data = data
+        self.offsets = [0] # offset of the first line of every block
+        self.lines = [0] # line number of the first line of every block
+        self.indexed = 0 # number of bytes already indexed
+        self.newlines = 0 # number of line breaks in the indexed bytes
+        self.complete = len(data) == 0
+        self.cancelled = False
+        if state is not None and state['offsets'][-1] <= len(data):
+            self.offsets = state['offsets']
+            self.lines = state['lines']
+            self.newlines = state['newlines']
+            self.indexed = len(data)
+            self.complete = True
+
+    def state(self):
+        """Returns the index of a complete build(), to store it.
+
+        Returns:
+            dict: the offsets and the line numbers of the blocks, and the
+            number of line breaks of the file.
+        """
+        return {'offsets': self.offsets, 'lines': self.lines,
+                'newlines': self.newlines}
+
+    def build(self):
+        """Indexes the whole file. Can be called in a worker thread."""
+        data = self.data
+        size = len(data)
+        pos = 0
+        line = 0
+        while not self.cancelled:
+            chunk = data[pos:pos + BLOCK_SIZE]
+            if len(chunk) < BLOCK_SIZE:
+                self.newlines = line + chunk.count(b'\n')
+                self.indexed = size
+                break
+
+            last = chunk.rfind(b'\n')
+            if last == -1:
+                # a line longer than a block
+                last = data.find(b'\n', pos + BLOCK_SIZE) - pos
+                if last < 0:
+                    self.newlines = line
+                    self.indexed = size
+                    break
+                line += 1
+            else:
+                line += chunk.count(b'\n')
+            pos += last + 1
+
+            # the lists are only appended to, so readers in other
+            # threads always see a consistent prefix
+            self.lines.append(line)
+            self.offsets.append(pos)
+            self.newlines = line
+            self.indexed = pos
+        self.complete = not self.cancelled
+
+    def line_count(self):
+        """Returns the number of lines of the file.
+
+        While the file is being indexed, the number is estimated from
+        the average line length of the indexed part.
+        """
+        if self.complete or self.indexed == 0:
+            return self.newlines + 1
+        return max(self.newlines + 1,
+                   self.newlines * len(self.data) // self.indexed)
+
+    def offset(self, line):
+        """Returns the position in the file where a line starts.
+
+        While the file is being indexed, the position of the lines after
+        the indexed part is estimated. See estimate().
+
+        Arguments:
+            line (int): a line number starting from 0.
+        """
+        if not self.complete and line > self.lines[-1]:
+            return self.estimate(line)
+        i = bisect.bisect_right(self.lines, line) - 1
+        pos = self.offsets[i]
+        for _ in range(line - self.lines[i]):
+            found = self.data.find(b'\n', pos)
+            if found == -1:
+                break
+            pos = found + 1
+        return pos
+
+    def estimate(self, line):
+        """Returns about where a line that is not indexed yet starts.
+
+        Scanning the file up to the line would freeze the UI, so the
+        position is estimated from the average line length of the
+        indexed part, and moved to the start of the line it falls in.
+
+        Arguments:
+            line (int): a line number after the indexed ones.
+        """
+        last = self.offsets[-1]
+        if self.newlines == 0:
+            return last
+        pos = last + (line - self.lines[-1]) * self.indexed // self.newlines
+        pos = min(pos, len(self.data) - 1)
+        found = self.data.rfind(b'\n', max(last, pos - BLOCK_SIZE), pos)
+        return pos if found == -1 else found + 1
+
+class LargeFileView:
+    """Shows a memory mapped file in the text display.
+
+    Only the lines around the visible ones are in the text display.
+    When the user scrolls close to the edges of that window of lines,
+    the window is replaced with the lines around the new position.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+        path (str): the path of the file.
+        index_state (dict): the LineIndex.state() of the file from a
+        previous time it was opened, or None to index it.
+    """
+    def __init__(self, main, path, index_state=None):
+        """Maps the file and prepares indexing it in the background.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+            path (str): the path of the file.
+            index_state (dict): a saved index of the file, or None.
+        """
+        self.main = main
+        self.path = path
+        self.first_line = 0 # number of the first line in the text display
+        self.window_size = 0 # number of lines in the text display
+        self.moving = False
+
+        with open(path, 'rb') as file_:
+            self.data = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = LineIndex(self.data, index_state)
+        self.thread = threading.Thread(target=self.index.build, daemon=True)
+
+    def open(self):
+        """Shows the beginning of the file and takes over the scrollbar."""
+        textbox = self.main.textbox
+        self.main.undo.enabled = False
+        textbox.config(yscrollcommand=self.on_yscroll)
+        self.main.yscrollbar.config(command=self.on_scrollbar)
+        if not self.index.complete:
+            self.thread.start()
+        self.show(0)
+        self.update_status()
+
+    def close(self):
+        """Gives the scrollbar back to the text display and unmaps the file."""
+        self.index.cancelled = True
+        textbox = self.main.textbox
+        textbox.config(state='normal',
+                       yscrollcommand=self.main.yscrollbar.set)
+        self.main.yscrollbar.config(command=textbox.yview)
+        textbox.delete(1.0, 'end')
+        self.main.undo.enabled = True
+        self.main.reset()
+        self.main.set_status('')
+        if self.thread.is_alive():
+            self.thread.join()
+        self.data.close()
+
+    def read_lines(self, first, count):
+        """Returns some lines of the file as text.
+
+        Arguments:
+            first (int): number of the first line, starting from 0.
+            count (int): number of lines.
+        """
+        start = self.index.offset(first)
+        end = start
+        limit = min(len(self.data), start + WINDOW_BYTES)
+        for _ in range(count):
+            found = self.data.find(b'\n', end, limit)
+            if found == -1:
+                end = limit
+                break
+            end = found + 1
+        text = self.data[start:end].replace(b'\r\n', b'\n')
+        text = text.decode(self.main.file_format.encoding, errors='replace')
+        if start == 0 and self.main.file_format.bom:
+            text = text[1:]
+        return text
+
+    def show(self, line):
+        """Puts the lines around a line in the text display.
+
+        Arguments:
+            line (int): the line that has to be visible, starting from 0.
+        """
+        textbox = self.main.textbox
+        first = max(0, line - WINDOW_LINES // 2)
+        text = self.read_lines(first, WINDOW_LINES)
+        if text.endswith('\n'):
+            text = text[:-1]
+
+        self.moving = True
+        with textbox.suspend_events():
+            textbox.config(state='normal')
+            textbox.delete(1.0, 'end')
+            textbox.insert(1.0, text)
+            textbox.config(state='disabled')
+            textbox.edit_modified(False)
+            self.first_line = first
+            self.window_size = int(textbox.index('end-1c').split('.')[0])
+            textbox.yview(f'{line - first + 1}.0')
+            textbox.mark_set('insert', f'{line - first + 1}.0')
+        self.moving = False
+        self.on_yscroll(*textbox.yview())
+
+    def on_yscroll(self, first, last):
+        """Called by the text display when its view changes.
+
+        Updates the scrollbar with the position in the whole file and
+        moves the window of lines if the view is close to its edges.
+
+        Arguments:
+            first (str): fraction of the window above the view.
+            last (str): fraction of the window above the end of the view.
+        """
+        first, last = float(first), float(last)
+        total = self.index.line_count()
+        top = self.first_line + first * self.window_size
+        bottom = self.first_line + last * self.window_size
+        self.main.yscrollbar.set(top / total, bottom / total)
+
+        if self.moving:
+            return
+        at_start = self.first_line == 0
+        at_end = self.first_line + self.window_size >= total
+        if ((first < EDGE and not at_start) or
+                (last > 1 - EDGE and not at_end)):
+            self.main.master.after_idle(self.show, int(top))
+
+    def on_scrollbar(self, *args):
+        """Called when the user drags or clicks the scrollbar.
+
+        Arguments:
+            args: the arguments tkinter passes to yview().
+        """
+        if args[0] == 'moveto':
+            line = int(float(args[1]) * self.index.line_count())
+            self.show(line)
+        else:
+            self.main.textbox.yview(*args)
+
+    def update_status(self):
+        """Shows the indexing progress in the status bar."""
+        if self.index.cancelled:
+            return
+        if self.index.complete:
+            self.main.set_status(
+                f'Large file mode (read-only)  {self.index.line_count()} lines'
+            )
+            return
+        percent = self.index.indexed * 100 // max(1, len(self.data))
+        self.main.set_status(f'Large file mode (read-only)  indexing {percent}%')
+        self.main.master.after(200, self.update_status)
@@ -0,0 +1,237 @@
+"""Index of the lines of the text display, updated with every change.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import itertools
+
+# max number of lines in a block
+BLOCK_SIZE = 1024
+
+class LineIndex:
+    """Converts between lines and positions in O(log n).
+
+    The lengths of the lines (with their line break) are stored in
+    blocks of up to BLOCK_SIZE lines. Two Fenwick trees keep the number
+    of characters and of lines of every block, so finding the block of
+    a line or of a position takes O(log n), and then at most BLOCK_SIZE
+    lengths are added up.
+
+    Lines and columns start from 0.
+
+    Arguments:
+        text (str): the initial text.
+    """
+    def __init__(self, text=''):
+        """Indexes a text.
+
+        Arguments:
+            text (str): the initial text.
+        """
+        self.reset(text)
+
+    def reset(self, text=''):
+        """Indexes a new text.
+
+        Arguments:
+            text (str): the text.
+        """
+        lengths = [len(line) for line in text.split('\n')]
+        for i in range(len(lengths) - 1):
+            lengths[i] += 1 # the line break
+        self.blocks = [lengths[i:i + BLOCK_SIZE]
+                       for i in range(0, len(lengths), BLOCK_SIZE)]
+        self.rebuild()
+
+    def rebuild(self):
+        """Builds the Fenwick trees after the blocks were added or removed."""
+        n = len(self.blocks)
+        self.block_chars = [sum(block) for block in self.blocks]
+        self.char_tree = [0] + self.block_chars
+        self.line_tree = [0] + [len(block) for block in self.blocks]
+        for tree in (self.char_tree, self.line_tree):
+            for i in range(1, n + 1):
+                parent = i + (i & -i)
+                if parent <= n:
+                    tree[parent] += tree[i]
+        self.chars = sum(self.block_chars)
+        self.lines = sum(len(block) for block in self.blocks)
+
+    @staticmethod
+    def add(tree, i, delta):
+        """Adds a value to a block in a Fenwick tree.
+
+        Arguments:
+            tree (list): the tree.
+            i (int): index of the block.
+            delta (int): the value.
+        """
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    @staticmethod
+    def prefix(tree, i):
+        """Returns the sum of the first i blocks in a Fenwick tree."""
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    @staticmethod
+    def search(tree, value):
+        """Finds the block where the sum of a Fenwick tree exceeds a value.
+
+        Returns:
+            tuple: the index of the block and the sum of the blocks
+            before it.
+        """
+        i = 0
+        total = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            if i + step < len(tree) and total + tree[i + step] <= value:
+                i += step
+                total += tree[i]
+            step >>= 1
+        return i, total
+
+    def line_count(self):
+        """Returns the number of lines."""
+        return self.lines
+
+    def char_count(self):
+        """Returns the number of characters."""
+        return self.chars
+
+    def line_start(self, line):
+        """Returns the position where a line starts.
+
+        Arguments:
+            line (int): the line, starting from 0. Lines after the last
+            one start at the end of the text.
+        """
+        if line >= self.lines:
+            return self.chars
+        block, lines_before = self.search(self.line_tree, line)
+        return (self.prefix(self.char_tree, block) +
+                sum(self.blocks[block][:line - lines_before]))
+
+    def line_length(self, line):
+        """Returns the number of characters of a line, without its break.
+
+        Arguments:
+            line (int): the line, starting from 0.
+        """
+        length = self.line_start(line + 1) - self.line_start(line)
+        return length - 1 if line < self.lines - 1 else length
+
+    def position(self, offset):
+        """Returns the line and column of a position.
+
+        Arguments:
+            offset (int): the position, in characters.
+
+        Returns:
+            tuple: the line and the column, starting from 0.
+        """
+        offset = min(max(offset, 0), self.chars)
+        block, chars_before = self.search(self.char_tree, offset)
+        if block == len(self.blocks):
+            # the end of the text
+            block -= 1
+            chars_before -= self.block_chars[block]
+        starts = list(itertools.accumulate(self.blocks[block], initial=0))
+        i = bisect.bisect_right(starts, offset - chars_before) - 1
+        i = min(i, len(self.blocks[block]) - 1)
+        line = self.prefix(self.line_tree, block) + i
+        return line, offset - chars_before - starts[i]
+
+    def replace_lines(self, line, count, lengths):
+        """Replaces the lengths of some lines.
+
+        Arguments:
+            line (int): the first line.
+            count (int): the number of lines that are replaced.
+            lengths (list): the lengths of the new lines.
+        """
+        block, lines_before = self.search(self.line_tree, line)
+        i = line - lines_before
+        if count == 1 and len(lengths) <= 1 or len(lengths) == count:
+            # the usual case: lengths change inside one block
+            if i + count <= len(self.blocks[block]):
+                old = self.blocks[block][i:i + count]
+                self.blocks[block][i:i + count] = lengths
+                delta = sum(lengths) - sum(old)
+                self.block_chars[block] += delta
+                self.add(self.char_tree, block, delta)
+                self.chars += delta
+                return
+
+        # removes the old lines, that may be in several blocks
+        remaining = count
+        b = block
+        while remaining:
+            taken = min(remaining, len(self.blocks[b]) - i)
+            del self.blocks[b][i:i + taken]
+            remaining -= taken
+            b += 1
+            i = 0
+        i = line - lines_before
+        self.blocks[block][i:i] = lengths
+
+        # splits big blocks and drops empty ones
+        blocks = []
+        for lengths in self.blocks:
+            for start in range(0, len(lengths), BLOCK_SIZE):
+                blocks.append(lengths[start:start + BLOCK_SIZE])
+        self.blocks = blocks or [[0]]
+        self.rebuild()
+
+    def insert(self, offset, text):
+        """Updates the index after text was inserted.
+
+        Arguments:
+            offset (int): the position of the insertion.
+            text (str): the inserted text.
+        """
+        line, column = self.position(offset)
+        block, lines_before = self.search(self.line_tree, line)
+        old = self.blocks[block][line - lines_before]
+
+        parts = text.split('\n')
+        if len(parts) == 1:
+            self.replace_lines(line, 1, [old + len(text)])
+            return
+        lengths = [column + len(parts[0]) + 1]
+        lengths.extend(len(part) + 1 for part in parts[1:-1])
+        lengths.append(old - column + len(parts[-1]))
+        self.replace_lines(line, 1, lengths)
+
+    def delete(self, offset, text):
+        """Updates the index after text was deleted.
+
+        Arguments:
+            offset (int): the position of the deleted text.
+            text (str): the deleted text.
+        """
+        line, column = self.position(offset)
+        count = text.count('\n') + 1
+        total = self.line_start(line + count) - self.line_start(line)
+        self.replace_lines(line, count, [total - len(text)])
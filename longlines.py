@@ -0,0 +1,138 @@
+"""Folds lines that are too long for the text display.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from customtext import READ_ONLY
+
+# lines longer than this (in characters) are folded
+LONG_LINE_LENGTH = 10000
+# number of characters of a folded line that are shown
+HEAD_LENGTH = 1000
+# number of characters shown every time a folded line is expanded
+EXPAND_STEP = 50000
+
+class LongLineGuard:
+    """Folds the lines that would freeze the text display.
+
+    tk lays out a whole line to wrap it, so a line of megabytes, like
+    minified JSON or base64, takes seconds every time it changes or is
+    scrolled. Only the first HEAD_LENGTH characters of those lines are
+    shown: the rest is elided and read-only, so it is never edited
+    without being seen. expand() shows more of the line at the cursor.
+
+    The lines are checked when text is inserted, so files are folded
+    while they are loaded, before tk lays them out.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+    """
+    def __init__(self, main):
+        """Starts checking the text that is inserted.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+        """
+        self.main = main
+        textbox = main.textbox
+        textbox.tag_config('folded', elide=True)
+        textbox.tag_config('folded_head', background='#fff3c4')
+        textbox.tag_raise('sel')
+        textbox.listeners.append(self.on_change)
+
+    def on_change(self, operation, offset, text):
+        """Folds the lines made too long by a change of the text.
+
+        Arguments:
+            operation (str): 'insert', 'delete' or 'reset'.
+            offset (int): the position of the change, in characters.
+            text (str): the inserted or deleted text.
+        """
+        if operation == 'delete':
+            # joining two lines
+            text = ''
+        lines = self.main.textbox.lines
+        first = lines.position(offset)[0]
+        candidates = {first, first + text.count('\n')}
+        if len(text) > LONG_LINE_LENGTH:
+            # the lines in the middle of the text
+            line = first
+            start = 0
+            end = text.find('\n')
+            while end != -1:
+                if end - start > LONG_LINE_LENGTH:
+                    candidates.add(line)
+                line += 1
+                start = end + 1
+                end = text.find('\n', start)
+
+        folded = False
+        for line in candidates:
+            if lines.line_length(line) > LONG_LINE_LENGTH:
+                folded = self.fold(line) or folded
+        if folded and self.main.loader is None:
+            self.report()
+
+    def fold(self, line):
+        """Hides the end of a long line, unless the user expanded it.
+
+        Arguments:
+            line (int): the line, starting from 0.
+
+        Returns:
+            bool: True if the line was not folded before.
+        """
+        textbox = self.main.textbox
+        start, end = f'{line + 1}.0', f'{line + 1}.end'
+        # the tag is on the line break, so editing the line keeps it
+        if 'expanded' in textbox.tag_names(end):
+            return False
+        folded = textbox.tag_nextrange('folded', start, end)
+        fold_start = folded[0] if folded else f'{line + 1}.{HEAD_LENGTH}'
+        textbox.tag_add('folded', fold_start, end)
+        textbox.tag_add(READ_ONLY, fold_start, end)
+        textbox.tag_add('folded_head', start, fold_start)
+        return not folded
+
+    def expand(self, *args):
+        """Shows EXPAND_STEP more characters of the line at the cursor."""
+        textbox = self.main.textbox
+        line = textbox.index('insert').split('.')[0]
+        folded = textbox.tag_nextrange('folded', f'{line}.0', f'{line}.end')
+        if not folded:
+            return 'break'
+
+        fold_start = textbox.index(f'{folded[0]}+{EXPAND_STEP}c')
+        if textbox.compare(fold_start, '>=', folded[1]):
+            # the whole line
+            textbox.tag_remove('folded', f'{line}.0', folded[1])
+            textbox.tag_remove(READ_ONLY, f'{line}.0', folded[1])
+            textbox.tag_remove('folded_head', f'{line}.0', folded[1])
+            textbox.tag_add('expanded', f'{line}.end')
+        else:
+            textbox.tag_remove('folded', folded[0], fold_start)
+            textbox.tag_remove(READ_ONLY, folded[0], fold_start)
+            textbox.tag_add('folded_head', folded[0], fold_start)
+        textbox.see('insert')
+        return 'break'
+
+    def report(self):
+        """Tells the user if there are folded lines."""
+        count = len(self.main.textbox.tag_ranges('folded')) // 2
+        if count:
+            self.main.set_status(
+                f'{count} long line(s) folded  (Ctrl+E shows more)'
+            )
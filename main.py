@@ -15,10 +15,23 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>."""
 
+import argparse
+import codecs
+import os
+import sys
 import tkinter as tk
 import tkinter.ttk as ttk
 
+from cleanstate import CleanState
 from customtext import CustomText
+from filewatch import FileWatcher
+from findinfiles import SearchIndexer, WorkerPool
+from highlight import Highlighter
+from longlines import LongLineGuard
+from recentfiles import RecentFiles
+from tabs import TabManager
+from textcodec import DEFAULT_FORMAT, describe
+from undo import UndoHistory
 from filemenu import FileMenu
 from editmenu import EditMenu
 from configmenu import ConfigMenu
@@ -33,9 +46,9 @@ class MainApplication:
 
     Attributes:
         path (str): stores the path of the file we are editing.
-        text (str): stores the text of the file we open before editing
-        it to compare it to the text after editing.
         ismodified (bool): True if the text file was modified
+        file_format (textcodec.FileFormat): encoding and line breaks
+        used to save the file.
     """
 
     def __init__(self, master):
@@ -46,15 +59,24 @@ class MainApplication:
 
         Attributes:
             path (str): stores the path of the file we are editing.
-            text (str): stores the text of the file we open before editing
-            it to compare it to the text after editing.
         """
         # arguments
         self.master = master
 
         # attributes
         self.path = ''
-        self.text = ''
+        self.loader = None # fileloader.ChunkedLoader of the file being opened
+        self.large_file = None # largefile.LargeFileView if it is active
+        self.saver = None # filesaver.BackgroundSaver of the last save
+        self.journal = None # journal.EditJournal of the file
+        self.follower = None # follow.FileFollower if follow mode is on
+        # size in bytes of the file when it was loaded or saved
+        self.disk_size = None
+        # fileloader.file_identity() of the file when it was loaded or
+        # saved, to notice changes made by other programs
+        self.disk_stat = None
+        self.file_format = DEFAULT_FORMAT
+        self.settings = None # configstore.ConfigStore, see ConfigMenu
 
         # call methods
         self.create_widgets()
@@ -78,50 +100,65 @@ class MainApplication:
             mod = ''
         
         self.master.title(f"{path}{mod} - Another txt Editor")
+        self.tabs.update_label()
     
     def create_widgets(self):
         """Calls the methods that create the widgets of the app."""
         self.create_textbox()
+        self.tabs = TabManager(self)
+        self.clean = CleanState(self)
+        self.long_lines = LongLineGuard(self)
+        self.highlighter = Highlighter(self)
+        self.watcher = FileWatcher(self)
+        self.workers = WorkerPool()
+        self.indexer = SearchIndexer(self)
+        self.recent = RecentFiles(self)
         self.create_statusbar()
         self.create_menu()
 
     def create_menu(self):
         """Creates the upper menu."""
         self.menubar = tk.Menu(self.master)
-        FileMenu(self)
-        EditMenu(self)
-        ConfigMenu(self)
-        HelpMenu(self)
+        self.file_menu = FileMenu(self)
+        self.edit_menu = EditMenu(self)
+        self.config_menu = ConfigMenu(self)
+        self.help_menu = HelpMenu(self)
 
         # add the menu to the root widget
         self.master.config(menu=self.menubar)
 
     def create_textbox(self):
         """Creates the text display and scroll bars."""
-        textframe = tk.Frame()
+        textframe = self.textframe = tk.Frame()
 
-        self.textbox = CustomText(textframe, pady=5, padx=5, undo=True)
+        self.textbox = CustomText(textframe, pady=5, padx=5)
+        # the app keeps its own undo history instead of tk's
+        # see undo.UndoHistory
+        self.undo = UndoHistory(self.textbox)
 
-        yscrollbar = tk.Scrollbar(textframe, command=self.textbox.yview)
+        # large file mode takes control of this scrollbar
+        # see largefile.LargeFileView
+        self.yscrollbar = tk.Scrollbar(textframe, command=self.textbox.yview)
         # this bar will be added to the grid only if wrapping is inactive
         # see editmenu.EditMenu.set_scrollbar()
         self.xscrollbar = tk.Scrollbar(textframe, orient='horizontal',
                                        command=self.textbox.xview)
 
-        self.textbox.config(yscrollcommand=yscrollbar.set,
+        self.textbox.config(yscrollcommand=self.yscrollbar.set,
                             xscrollcommand=self.xscrollbar.set)
         
         # changes the title when the text is modified
         self.textbox.bind('<<Modified>>', self.on_modification)
-        # adds a separator to the undo stack if the user presses space
-        self.textbox.bind('<space>', lambda event:self.textbox.edit_separator())
+        # replaces tk's undo and redo
+        self.textbox.bind('<<Undo>>', self.on_undo)
+        self.textbox.bind('<<Redo>>', self.on_redo)
 
         # updates the status bar
         self.textbox.bind('<<CursorChange>>', lambda event: self.set_ln_col())
         
         # managing geometry
         self.textbox.grid(row=0, column=0, sticky='nsew')
-        yscrollbar.grid(row=0, column=1, sticky='ns')
+        self.yscrollbar.grid(row=0, column=1, sticky='ns')
         textframe.grid_rowconfigure(0, weight=1)
         textframe.grid_columnconfigure(0, weight=1)
 
@@ -143,36 +180,156 @@ class MainApplication:
         self.collabel = ttk.Label(self.status_frame, textvariable=self.column)
         self.collabel.pack(side='left')
 
+        # size of the text, from the line index of the text display
+        self.totals = tk.StringVar(self.master)
+        ttk.Label(self.status_frame, textvariable=self.totals).pack(
+            side='left', padx=(20, 0)
+        )
+
+        # encoding and line breaks of the file
+        self.format_label = tk.StringVar(self.master)
+        ttk.Label(self.status_frame, textvariable=self.format_label).pack(
+            side='right', padx=(20, 0)
+        )
+        # messages about background tasks, like loading a file
+        self.status = tk.StringVar(self.master)
+        ttk.Label(self.status_frame, textvariable=self.status).pack(side='right')
+
         self.set_ln_col() # updates de bar once is created
+        self.set_file_format(self.file_format)
 
     def set_ln_col(self):
         """Updates the status bar values."""
         ln, col = self.textbox.index('insert').split('.')
+        if self.large_file is not None:
+            # the text display only has some lines of the file
+            ln = int(ln) + self.large_file.first_line
+            self.totals.set(f'{self.large_file.index.line_count()} lines')
+        else:
+            lines = self.textbox.lines
+            self.totals.set(f'{lines.line_count()} lines    '
+                            f'{lines.char_count()} characters')
         self.line.set(ln)
         self.column.set(col)
 
+    def go_to_line(self, line):
+        """Moves the text cursor to the start of a line and shows it.
+
+        Arguments:
+            line (int): the line number, starting from 1.
+        """
+        if self.large_file is not None:
+            self.large_file.show(line - 1)
+            return
+        self.textbox.tag_remove('sel', 1.0, 'end')
+        self.textbox.mark_set('insert', f'{line}.0')
+        self.textbox.see('insert')
+
+    def set_file_format(self, file_format):
+        """Sets the format used to save the file and shows it.
+
+        Arguments:
+            file_format (textcodec.FileFormat): the format.
+        """
+        self.file_format = file_format
+        self.format_label.set(describe(file_format))
+
+    def set_status(self, message):
+        """Shows a message in the right side of the status bar.
+
+        Arguments:
+            message (str): the message. An empty string clears it.
+        """
+        self.status.set(message)
+
     def on_modification(self, event):
         """Called when the text display modified flag changes.
         
-        If the flag is False, clears the undo stack so the user can't
-        undo an action made in a file after opening another.
-        Also updates the window title, to show an asterisk if the flag
+        Updates the window title, to show an asterisk if the flag
         is True or not if it is False
         """
-        if self.textbox.edit_modified() == 0:
-            self.textbox.edit_reset()
         self.configure_title()
     
+    def on_undo(self, event):
+        """Undoes the last change instead of tk's undo."""
+        self.undo.undo()
+        return 'break'
+
+    def on_redo(self, event):
+        """Redoes the last undone change instead of tk's redo."""
+        self.undo.redo()
+        return 'break'
+
     def reset(self):
         """Called when a new file is opened.
         
         Sets the flag that that signals that the text was modified to
-        False.
+        False, and clears the undo history so the user can't undo an
+        action made in a file after opening another.
         """
         self.textbox.edit_modified(False)
+        self.undo.clear()
+
+def parse_args():
+    """Reads the command line options."""
+    parser = argparse.ArgumentParser(description='A plain text editor.')
+    parser.add_argument(
+        '--trace', metavar='FILE', default=os.environ.get('ATXT_TRACE'),
+        help='times the UI and writes a Chrome trace to FILE when the app '
+             'is closed (or set the ATXT_TRACE environment variable)'
+    )
+
+    batch = parser.add_argument_group(
+        'batch mode', 'transforms the FILES without opening the window'
+    )
+    batch.add_argument('--batch', action='store_true',
+                       help='runs in batch mode')
+    batch.add_argument('files', nargs='*', metavar='FILES',
+                       help='the files changed in batch mode')
+    batch.add_argument('--encoding', metavar='CODEC',
+                       help='saves the files with this encoding')
+    batch.add_argument('--newline', choices=('lf', 'crlf', 'cr'),
+                       help='saves the files with these line breaks')
+    batch.add_argument('--find', metavar='TEXT',
+                       help='replaces this text with the one of --replace')
+    batch.add_argument('--replace', metavar='TEXT', default='',
+                       help='the replacement (default: deletes the matches)')
+    batch.add_argument('--regex', action='store_true',
+                       help='--find is a regular expression')
+    batch.add_argument('--match-case', action='store_true',
+                       help='--find is case sensitive')
+    batch.add_argument('--jobs', metavar='N', type=int, default=0,
+                       help='number of processes (default: one per CPU)')
+    args = parser.parse_args()
+    if args.files and not args.batch:
+        parser.error('FILES can only be used with --batch')
+    if args.batch and not args.files:
+        parser.error('--batch needs at least one file')
+    if args.encoding is not None:
+        try:
+            args.encoding = codecs.lookup(args.encoding).name
+        except LookupError:
+            parser.error(f'unknown encoding: {args.encoding}')
+    return args
 
 # runs the app
 if __name__ == '__main__':
+    args = parse_args()
+    if args.batch:
+        # no tk root is created, so it runs without a display
+        import batch
+        sys.exit(batch.run(args))
+
+    tracer = None
+    if args.trace:
+        import tracing
+        tracer = tracing.Tracer()
+        tracer.install()
+
     root = tk.Tk()
     main_app = MainApplication(root)
-    root.mainloop()
\ No newline at end of file
+    if tracer is not None:
+        tracer.watch(root)
+    root.mainloop()
+    if tracer is not None:
+        tracer.save(args.trace)
\ No newline at end of file
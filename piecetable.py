@@ -0,0 +1,186 @@
+"""Piece table that keeps a copy of the text of the text display.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# small insertions are appended to blocks of this size (in characters)
+BLOCK_SIZE = 4096
+
+class PieceTable:
+    """A text document stored as a list of pieces.
+
+    Every piece is a tuple (buffer, start, length) that points to a
+    slice of a buffer. Buffers are never modified, so editing the
+    document only changes the list of pieces, and a copy of that list
+    is a snapshot of the document that stays valid while it is edited.
+
+    The original buffers are the strings the document was loaded from.
+    Small insertions are appended to a block of the append buffer,
+    which is replaced by a new string every time it grows; the pieces
+    that point to the old string are still valid because it is
+    immutable.
+
+    Arguments:
+        original (str): the initial text of the document.
+
+    Attributes:
+        pieces (list): the pieces of the document in order.
+        version (int): incremented every time the document changes.
+    """
+    def __init__(self, original=''):
+        """Creates the document.
+
+        Arguments:
+            original (str): the initial text of the document.
+        """
+        self.version = 0
+        self.reset(original)
+
+    def __len__(self):
+        """Returns the number of characters of the document."""
+        return self.length
+
+    def reset(self, original=''):
+        """Replaces all the text of the document.
+
+        Arguments:
+            original (str): the new text of the document.
+        """
+        self.pieces = [(original, 0, len(original))] if original else []
+        self.length = len(original)
+        self.block = '' # the block of the append buffer that is growing
+        self.version += 1
+
+    def snapshot(self):
+        """Returns a copy of the document that doesn't change with it.
+
+        Only the list of pieces is copied, so it is cheap even for big
+        documents. The copy can be read from another thread.
+        """
+        copy = PieceTable()
+        copy.pieces = list(self.pieces)
+        copy.length = self.length
+        copy.version = self.version
+        return copy
+
+    def split(self, offset):
+        """Makes a piece start at a position of the document.
+
+        Arguments:
+            offset (int): the position, in characters.
+
+        Returns:
+            int: the index of the piece that starts at offset.
+        """
+        pos = 0
+        for i, (buffer, start, length) in enumerate(self.pieces):
+            if pos == offset:
+                return i
+            if offset < pos + length:
+                head = offset - pos
+                self.pieces[i:i + 1] = [(buffer, start, head),
+                                        (buffer, start + head, length - head)]
+                return i + 1
+            pos += length
+        return len(self.pieces)
+
+    def insert(self, offset, text):
+        """Inserts text in the document.
+
+        Arguments:
+            offset (int): the position of the insertion, in characters.
+            text (str): the text to insert.
+        """
+        if not text:
+            return
+        offset = min(max(offset, 0), self.length)
+        i = self.split(offset)
+
+        if len(text) >= BLOCK_SIZE:
+            # big insertions (like loading a file) are used as they are
+            self.pieces.insert(i, (text, 0, len(text)))
+        else:
+            old = self.block
+            if len(old) + len(text) > BLOCK_SIZE:
+                old = ''
+            self.block = old + text
+
+            previous = self.pieces[i - 1] if i > 0 else None
+            if (old and previous is not None and previous[0] is old
+                    and previous[1] + previous[2] == len(old)):
+                # typing: the previous piece ends where the text starts
+                # in the block, so it is extended instead of adding one
+                self.pieces[i - 1] = (self.block, previous[1],
+                                      previous[2] + len(text))
+            else:
+                self.pieces.insert(i, (self.block, len(old), len(text)))
+
+        self.length += len(text)
+        self.version += 1
+
+    def delete(self, offset, length):
+        """Deletes text from the document.
+
+        Arguments:
+            offset (int): the position of the first character to delete.
+            length (int): the number of characters to delete.
+        """
+        offset = min(max(offset, 0), self.length)
+        length = min(length, self.length - offset)
+        if length <= 0:
+            return
+        i = self.split(offset)
+        j = self.split(offset + length)
+        del self.pieces[i:j]
+        self.length -= length
+        self.version += 1
+
+    def chunks(self, start=0, end=None):
+        """Yields the text of the document a piece at a time.
+
+        Nothing is copied but the slices of the pieces, so the document
+        can be saved or searched without building one big string.
+
+        Arguments:
+            start (int): position of the first character.
+            end (int): position after the last character. None means
+            the end of the document.
+        """
+        if end is None:
+            end = self.length
+        pos = 0
+        # iterates over a copy, so the document can change meanwhile
+        for buffer, first, length in list(self.pieces):
+            if pos >= end:
+                break
+            if pos + length > start:
+                a = max(start - pos, 0)
+                b = min(end - pos, length)
+                if a == 0 and b == length == len(buffer):
+                    yield buffer
+                else:
+                    yield buffer[first + a:first + b]
+            pos += length
+
+    def get(self, start=0, end=None):
+        """Returns part of the text of the document.
+
+        Arguments:
+            start (int): position of the first character.
+            end (int): position after the last character. None means
+            the end of the document.
+        """
+        return ''.join(self.chunks(start, end))
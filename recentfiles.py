@@ -0,0 +1,289 @@
+"""Remembers the recently opened files and where the user was in them.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import threading
+
+from configstore import cache_dir
+from filesaver import write_atomic
+from textcodec import FileFormat
+
+# number of files in the Recent files menu
+MAX_RECENT = 10
+# number of files whose position is remembered
+MAX_ENTRIES = 100
+# name of the list of files in the cache directory
+CACHE_NAME = 'recent.json'
+# directory, in the cache directory, with the line indexes of large files
+INDEX_DIR = 'lineindex'
+
+def file_key(path):
+    """Returns what identifies the contents of a file: its size and
+    modification time, or None if it doesn't exist.
+
+    Arguments:
+        path (str): path of the file.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+class RecentFiles:
+    """The recently opened files, most recent first.
+
+    For every file it keeps the position of the text cursor and the
+    view, its format and, for large files, the line index of
+    largefile.LargeFileView, so reopening it doesn't have to detect its
+    format nor scan it for line breaks. The format and the line index
+    are only used if the size and the modification time of the file
+    didn't change.
+
+    The list is a JSON file in the cache directory, read the first
+    time it is used, and every line index is a JSON file in its
+    INDEX_DIR directory.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+        directory (str): where the files are stored. By default,
+        configstore.cache_dir().
+    """
+    def __init__(self, main, directory=None):
+        """Prepares reading the list.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+            directory (str): where the files are stored.
+        """
+        self.main = main
+        self.directory = directory or cache_dir()
+        self.path = os.path.join(self.directory, CACHE_NAME)
+        self.thread = None
+        self._entries = None
+
+    @property
+    def entries(self):
+        """The entries of the files, read the first time they are used."""
+        if self._entries is None:
+            # imported here, so the app starts faster
+            import json
+            try:
+                with open(self.path, encoding='utf-8') as file_:
+                    self._entries = json.load(file_)
+            except (OSError, ValueError):
+                self._entries = []
+        return self._entries
+
+    def paths(self):
+        """Returns the paths of the files of the Recent files menu."""
+        return [entry['path'] for entry in self.entries[:MAX_RECENT]]
+
+    def find(self, path):
+        """Returns the entry of a file, or None.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        path = os.path.abspath(path)
+        for entry in self.entries:
+            if entry['path'] == path:
+                return entry
+        return None
+
+    def is_fresh(self, entry):
+        """Returns True if the file of an entry didn't change since then.
+
+        Arguments:
+            entry (dict): the entry.
+        """
+        key = entry['key']
+        return key is not None and file_key(entry['path']) == key
+
+    def file_format(self, path):
+        """Returns the format of a file, if it didn't change since it was
+        opened.
+
+        Arguments:
+            path (str): path of the file.
+
+        Returns:
+            textcodec.FileFormat: the format, or None.
+        """
+        entry = self.find(path)
+        if entry is None or not self.is_fresh(entry):
+            return None
+        return FileFormat(*entry['format'])
+
+    def line_index(self, path):
+        """Returns the line index of a large file, if it didn't change
+        since it was indexed.
+
+        Arguments:
+            path (str): path of the file.
+
+        Returns:
+            dict: see largefile.LineIndex.state(), or None.
+        """
+        import json
+        entry = self.find(path)
+        if entry is None or entry.get('index') != entry['key']:
+            return None
+        if not self.is_fresh(entry):
+            return None
+        try:
+            with open(self.index_path(entry['path']),
+                      encoding='utf-8') as file_:
+                return json.load(file_)
+        except (OSError, ValueError):
+            return None
+
+    def index_path(self, path):
+        """Returns the path of the line index of a file.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        import hashlib
+        name = hashlib.blake2b(path.encode('utf-8', 'surrogateescape'),
+                               digest_size=16).hexdigest()
+        return os.path.join(self.directory, INDEX_DIR, f'{name}.json')
+
+    def remember(self):
+        """Stores the position in the file of the current tab.
+
+        Called when the file is closed or left for another tab.
+        """
+        main = self.main
+        if not main.path or main.loader is not None:
+            return
+        path = os.path.abspath(main.path)
+        old = self.find(path)
+        entry = {'path': path, 'key': file_key(path),
+                 'format': list(main.file_format)}
+        textbox = main.textbox
+        index_state = None
+        if main.large_file is not None:
+            top = int(textbox.index('@0,0').split('.')[0])
+            entry['large_line'] = main.large_file.first_line + top - 1
+            if old is not None and old.get('index') == entry['key']:
+                entry['index'] = entry['key']
+            elif main.large_file.index.complete:
+                index_state = main.large_file.index.state()
+                entry['index'] = entry['key']
+        else:
+            entry['cursor'] = textbox.index('insert')
+            entry['top'] = textbox.index('@0,0')
+
+        if old is not None:
+            self.entries.remove(old)
+        self.entries.insert(0, entry)
+        dropped = self.entries[MAX_ENTRIES:]
+        del self.entries[MAX_ENTRIES:]
+        if old is not None and 'index' in old and 'index' not in entry:
+            dropped.append(old) # its line index is not valid anymore
+        self.save(index_state, entry['path'], dropped)
+
+    def touch(self, path):
+        """Moves a file that was just opened to the top of the list,
+        keeping what is known about it.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        entry = self.find(path)
+        if entry is None:
+            entry = {'path': os.path.abspath(path), 'key': None,
+                     'format': list(self.main.file_format)}
+        else:
+            self.entries.remove(entry)
+        self.entries.insert(0, entry)
+        dropped = self.entries[MAX_ENTRIES:]
+        del self.entries[MAX_ENTRIES:]
+        self.save(None, None, dropped)
+
+    def restore_view(self, path):
+        """Moves the text cursor and the view to where they were the last
+        time a file was open. The file has to be fully loaded.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        entry = self.find(path)
+        if entry is None or 'cursor' not in entry:
+            return
+        textbox = self.main.textbox
+        textbox.mark_set('insert', entry['cursor'])
+        textbox.yview(entry['top'])
+        self.main.set_ln_col()
+
+    def large_line(self, path):
+        """Returns the line at the top of the view the last time a large
+        file was open, starting from 0, or 0 if the file changed.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        entry = self.find(path)
+        if entry is None or not self.is_fresh(entry):
+            return 0
+        return entry.get('large_line', 0)
+
+    def clear(self):
+        """Forgets all the files."""
+        dropped, self._entries = self.entries, []
+        self.save(None, None, dropped)
+
+    def save(self, index_state, index_for, dropped):
+        """Writes the list, and a line index, in a worker thread.
+
+        Arguments:
+            index_state (dict): a line index to write, or None.
+            index_for (str): path of the file of the line index.
+            dropped (list): entries whose line indexes are deleted.
+        """
+        if self.thread is not None:
+            # one write at a time, in order
+            self.thread.join()
+        import json
+        text = json.dumps(self.entries)
+        # not a daemon, so closing the app waits for the write
+        self.thread = threading.Thread(
+            target=self.write, args=(text, index_state, index_for, dropped)
+        )
+        self.thread.start()
+
+    # worker thread
+    def write(self, text, index_state, index_for, dropped):
+        """Writes the files. See save()."""
+        import json
+        try:
+            os.makedirs(os.path.join(self.directory, INDEX_DIR),
+                        exist_ok=True)
+            if index_state is not None:
+                write_atomic(self.index_path(index_for),
+                             [json.dumps(index_state)])
+            for entry in dropped:
+                if 'index' in entry:
+                    try:
+                        os.unlink(self.index_path(entry['path']))
+                    except FileNotFoundError:
+                        pass
+            write_atomic(self.path, [text])
+        except OSError:
+            pass # the positions are just not remembered
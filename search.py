@@ -0,0 +1,291 @@
+"""Searches text that comes in chunks, like the pieces of a document.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+import threading
+
+# max length of a match, in characters. Matches are searched in windows
+# that overlap by this much, so they can span chunks
+OVERLAP = 4096
+# chunks are joined until they have at least this many characters
+MIN_WINDOW = 64 * 1024
+# characters kept before the position where the search continues
+CONTEXT = 256
+
+def compile_pattern(pattern, regex=False, match_case=False):
+    """Compiles what the user is looking for.
+
+    Arguments:
+        pattern (str): the text or regular expression to find.
+        regex (bool): True if pattern is a regular expression.
+        match_case (bool): False to ignore the case of the letters.
+
+    Returns:
+        re.Pattern: the compiled pattern.
+
+    Raises:
+        re.error: if pattern is not a valid regular expression.
+    """
+    if not regex:
+        pattern = re.escape(pattern)
+    flags = re.MULTILINE
+    if not match_case:
+        flags |= re.IGNORECASE
+    return re.compile(pattern, flags)
+
+def expand(match, replacement, regex):
+    """Returns the text that replaces a match.
+
+    Arguments:
+        match (re.Match): the match.
+        replacement (str): the replacement, with group references like
+        \\1 if regex is True.
+        regex (bool): True if the search uses regular expressions.
+    """
+    return match.expand(replacement) if regex else replacement
+
+def check_replacement(pattern, replacement, regex):
+    """Checks that a replacement can be used with a pattern, before
+    anything is replaced.
+
+    Arguments:
+        pattern (re.Pattern): the compiled pattern.
+        replacement (str): the replacement. See expand().
+        regex (bool): True if the search uses regular expressions.
+
+    Raises:
+        re.error: if the replacement refers to groups the pattern
+        doesn't have, or has a bad escape.
+    """
+    if regex:
+        # the replacement is parsed even if there are no matches
+        pattern.sub(replacement, '')
+
+def find_all(pattern, chunks, overlap=OVERLAP):
+    """Finds all the matches of a pattern in text that comes in chunks.
+
+    Only a window of the text is kept in memory at a time. Empty
+    matches are skipped, and matches longer than overlap characters may
+    be missed.
+
+    Arguments:
+        pattern (re.Pattern): the compiled pattern.
+        chunks (iterable): the text, as strings.
+        overlap (int): max length of a match.
+
+    Yields:
+        tuple: (start, end, match) where start and end are positions in
+        the whole text and match is the re.Match in the current window.
+    """
+    chunks = iter(chunks)
+    window = ''
+    base = 0 # position of window[0] in the whole text
+    pos = 0 # where the search continues in the window
+    done = False
+    while not done:
+        # adds at least one chunk, joining small pieces so the pattern
+        # isn't run on tiny windows
+        parts = [window]
+        size = len(window)
+        while size < len(window) + MIN_WINDOW or size < MIN_WINDOW + overlap:
+            chunk = next(chunks, None)
+            if chunk is None:
+                done = True
+                break
+            parts.append(chunk)
+            size += len(chunk)
+        window = ''.join(parts)
+
+        # matches that end close to the end of the window may continue
+        # in the next chunk, so they wait until it is added
+        limit = len(window) if done else len(window) - overlap
+        resume = limit
+        for match in pattern.finditer(window, pos):
+            if match.end() > limit and not done:
+                resume = match.start()
+                break
+            if match.start() == match.end():
+                continue
+            yield base + match.start(), base + match.end(), match
+            resume = max(limit, match.end())
+
+        # keeps some text before the resume position, so patterns like
+        # ^ or \b see the characters before it
+        cut = max(0, resume - CONTEXT)
+        window = window[cut:]
+        base += cut
+        pos = resume - cut
+
+def replace_all(pattern, chunks, replacement, regex=False, overlap=OVERLAP,
+                on_replace=None):
+    """Replaces all the matches of a pattern in text that comes in chunks.
+
+    Arguments:
+        pattern (re.Pattern): the compiled pattern.
+        chunks (iterable): the text, as strings.
+        replacement (str): the replacement. See expand().
+        regex (bool): True if the search uses regular expressions.
+        overlap (int): max length of a match.
+        on_replace (function): called without arguments after every
+        replacement.
+
+    Yields:
+        str: the text with the replacements, in chunks.
+    """
+    chunks = Recorder(chunks)
+    written = 0
+    for start, end, match in find_all(pattern, chunks, overlap):
+        yield chunks.slice(written, start)
+        yield expand(match, replacement, regex)
+        written = end
+        if on_replace is not None:
+            on_replace()
+    yield chunks.slice(written, None)
+
+class Recorder:
+    """Iterates over chunks of text keeping the ones not yet used.
+
+    Used by replace_all() to write the text between the matches
+    without keeping the whole text in memory.
+
+    Arguments:
+        chunks (iterable): the text, as strings.
+    """
+    def __init__(self, chunks):
+        """Starts iterating over the chunks.
+
+        Arguments:
+            chunks (iterable): the text, as strings.
+        """
+        self.chunks = iter(chunks)
+        self.kept = [] # chunks after self.base
+        self.base = 0 # position of the first kept chunk
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = next(self.chunks)
+        self.kept.append(chunk)
+        return chunk
+
+    def slice(self, start, end):
+        """Returns the text between two positions and forgets what is
+        before the end.
+
+        Arguments:
+            start (int): position of the first character.
+            end (int): position after the last character. None means
+            the end of the whole text.
+        """
+        if end is None:
+            self.kept.extend(self.chunks)
+            end = self.base + sum(len(chunk) for chunk in self.kept)
+
+        parts = []
+        pos = self.base
+        for chunk in self.kept:
+            if pos >= end:
+                break
+            if pos + len(chunk) > start:
+                parts.append(chunk[max(start - pos, 0):end - pos])
+            pos += len(chunk)
+
+        # forgets the chunks that end before the end position
+        while self.kept and self.base + len(self.kept[0]) <= end:
+            self.base += len(self.kept.pop(0))
+        return ''.join(parts)
+
+class SearchTask:
+    """Searches a snapshot of a document in a worker thread.
+
+    The matches are appended to a list as they are found, so the UI can
+    show them while the search goes on.
+
+    Arguments:
+        pattern (re.Pattern): the compiled pattern.
+        document (piecetable.PieceTable): a snapshot of the document.
+        replacement (str): if it is not None, the results include the
+        text that replaces every match. See expand().
+        regex (bool): True if the search uses regular expressions.
+
+    Attributes:
+        results (list): (start, end) tuples, or (start, end, text) if
+        there is a replacement.
+        span (tuple): if there is a replacement, the positions of the
+        start of the first match and of the end of the last one, once
+        the search finished.
+        text (str): the text that replaces that span, with all the
+        matches replaced.
+        done (bool): True when the search finished.
+    """
+    def __init__(self, pattern, document, replacement=None, regex=False):
+        """Starts the search.
+
+        Arguments:
+            pattern (re.Pattern): the compiled pattern.
+            document (piecetable.PieceTable): a snapshot of the document.
+            replacement (str): the text that replaces every match.
+            regex (bool): True if the search uses regular expressions.
+        """
+        self.pattern = pattern
+        self.document = document
+        self.replacement = replacement
+        self.regex = regex
+        self.results = []
+        self.span = None
+        self.text = None
+        self.done = False
+        self.cancelled = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """Finds the matches."""
+        if self.replacement is None:
+            for start, end, match in find_all(self.pattern,
+                                              self.document.chunks()):
+                if self.cancelled:
+                    return
+                self.results.append((start, end))
+            self.done = True
+            return
+
+        # the replaced text is built here, so the UI thread replaces the
+        # span of the matches at once instead of making every replacement
+        chunks = Recorder(self.document.chunks())
+        parts = []
+        written = None
+        for start, end, match in find_all(self.pattern, chunks):
+            if self.cancelled:
+                return
+            text = expand(match, self.replacement, self.regex)
+            self.results.append((start, end, text))
+            if written is None:
+                written = start
+            parts.append(chunks.slice(written, start))
+            parts.append(text)
+            written = end
+        if self.results:
+            self.span = (self.results[0][0], written)
+            self.text = ''.join(parts)
+        self.done = True
+
+    def cancel(self):
+        """Stops the search."""
+        self.cancelled = True
@@ -0,0 +1,554 @@
+"""Several documents open at the same time, in tabs.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import codecs
+import os
+import queue
+import threading
+import time
+import tkinter.ttk as ttk
+import zlib
+
+from fileloader import ChunkedLoader, show_read_error
+from journal import base_stat
+from largefile import LargeFileView
+from textcodec import DEFAULT_FORMAT
+
+# max memory (in bytes) used by the text of all the documents. The
+# least recently used tabs are evicted when it is exceeded
+MEMORY_LIMIT = 256 * 1024 * 1024
+# size (in bytes) of the pieces of a compressed document that are
+# decompressed at a time
+CHUNK_SIZE = 1024 * 1024
+# documents with more characters than this are moved to the text
+# display in the background (see TabLoader), not all at once
+BACKGROUND_SIZE = 1024 * 1024
+
+def same_file(path, other):
+    """Returns True if two paths are the same existing file."""
+    try:
+        return os.path.samefile(path, other)
+    except OSError:
+        return False
+
+def file_stat(path):
+    """Returns the size and mtime of a file, or None if it can't be read."""
+    try:
+        return base_stat(path)
+    except OSError:
+        return None
+
+class Tab:
+    """A document that is not in the text display.
+
+    Its text is kept in one of three ways: a snapshot of the document,
+    the document compressed with zlib, or nothing, if the file has no
+    unsaved changes and can be read again (the tab is evicted).
+
+    Attributes:
+        path (str): path of the file, or '' if it is a new file.
+        file_format (textcodec.FileFormat): format used to save it.
+        disk_size (int): size of the file when it was loaded or saved.
+        disk_stat (tuple): fileloader.file_identity() of the file then.
+        saved_hash (cleanstate.ContentHash): hashes of the saved text.
+        journal (journal.EditJournal): journal of the file.
+        modified (bool): True if it has unsaved changes.
+        undo (tuple): the undo history. See undo.UndoHistory.state().
+        cursor (str): tk index of the text cursor.
+        top (str): tk index of the first visible character.
+        large_line (int): first visible line, if the file was in large
+        file mode.
+        document (piecetable.PieceTable): the text, or None.
+        compressed (bytes): the text compressed, or None.
+        length (int): number of characters of the text.
+        evicted (bool): True if the text has to be read from the file.
+    """
+    def __init__(self, path=''):
+        """Creates an empty document.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        self.path = path
+        self.file_format = DEFAULT_FORMAT
+        self.disk_size = None
+        self.disk_stat = None
+        self.saved_hash = None
+        self.journal = None
+        self.modified = False
+        self.undo = None
+        self.cursor = '1.0'
+        self.top = '1.0'
+        self.large_line = None
+        self.document = None
+        self.compressed = None
+        self.length = 0
+        self.evicted = False
+        self.stat = None # size and mtime of the file when it was evicted
+        self.last_used = time.monotonic()
+
+    def memory(self):
+        """Returns the approximate memory used by the tab, in bytes."""
+        size = 0
+        if self.document is not None:
+            size += len(self.document)
+        if self.compressed is not None:
+            size += len(self.compressed)
+        if self.undo is not None:
+            size += self.undo[2]
+        return size
+
+    def label(self):
+        """Returns the text of the tab."""
+        name = os.path.basename(self.path) or 'New file'
+        return f'{name} *' if self.modified else name
+
+    def compress(self):
+        """Replaces the snapshot of the document with its compressed text."""
+        compressor = zlib.compressobj(1)
+        parts = [compressor.compress(chunk.encode('utf-8', 'surrogatepass'))
+                 for chunk in self.document.chunks()]
+        parts.append(compressor.flush())
+        self.compressed = b''.join(parts)
+        self.document = None
+
+    def chunks(self):
+        """Yields the text of the document, if it is in memory."""
+        if self.document is not None:
+            yield from self.document.chunks()
+        elif self.compressed is not None:
+            decompressor = zlib.decompressobj()
+            decoder = codecs.getincrementaldecoder('utf-8')('surrogatepass')
+            data = self.compressed
+            for i in range(0, len(data), CHUNK_SIZE):
+                yield decoder.decode(
+                    decompressor.decompress(data[i:i + CHUNK_SIZE])
+                )
+            yield decoder.decode(decompressor.flush(), final=True)
+
+class TabLoader(ChunkedLoader):
+    """Moves the text of a tab to the text display without freezing
+    the UI, like a file that is opened.
+
+    The compressed text is decompressed in the worker thread. The text
+    display is read-only until the whole text is in it.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+        tab (Tab): the tab, with a snapshot or the compressed text.
+        on_done (function): called without arguments when the whole
+        text was inserted in the text display.
+    """
+    def __init__(self, main, tab, on_done=None):
+        """Call start() to begin moving the text.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+            tab (Tab): the tab.
+            on_done (function): called when the whole text was inserted.
+        """
+        self.main = main
+        self.tab = tab
+        self.path = tab.path
+        self.on_done = on_done
+        self.file_format = tab.file_format
+        self.size = tab.length
+        self.stat = tab.disk_stat
+        self.bytes_read = 0
+        self.chars_read = 0
+        self.content_hash = None
+        self.finished = False
+
+        self.queue = queue.Queue(maxsize=4)
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.read, daemon=True)
+
+    def chunks(self):
+        """Yields the chunks of the text of the tab, with the number of
+        characters yielded so far."""
+        position = 0
+        for chunk in self.tab.chunks():
+            position += len(chunk)
+            yield chunk, position
+
+    def cancel(self):
+        """Inserts the rest of the text at once.
+
+        Unlike a file, the text of a tab can't be read again, so it is
+        not left half loaded.
+        """
+        if self.finished:
+            return
+        self.cancelled.set()
+        self.thread.join()
+        textbox = self.main.textbox
+        skip = self.chars_read # the chunks in the queue are dropped
+        with textbox.suspend_events():
+            textbox.config(state='normal')
+            for chunk in self.tab.chunks():
+                if skip >= len(chunk):
+                    skip -= len(chunk)
+                    continue
+                textbox.insert('end-1c', chunk[skip:])
+                skip = 0
+        self.finish()
+        self.main.set_status('')
+        if self.on_done is not None:
+            self.on_done()
+
+    def throughput(self, done=False):
+        """Returns '', as the text is not read from a file."""
+        return ''
+
+class TabManager:
+    """Tab bar above the text display.
+
+    There is only one text display: when another tab is selected, the
+    state of the current document is stored in its Tab and the text
+    display is filled with the other one. The least recently used tabs
+    are compressed or evicted when the documents use more than
+    memory_limit bytes.
+
+    Arguments:
+        main (main.MainApplication): an instance of the main class.
+
+    Attributes:
+        tabs (list): the Tab of every document, in order.
+        current (Tab): the tab of the document in the text display.
+        Its attributes are only updated when another tab is selected.
+        memory_limit (int): max memory used by the documents, in bytes.
+    """
+    def __init__(self, main):
+        """Creates the tab bar with an empty document.
+
+        Arguments:
+            main (main.MainApplication): an instance of the main class.
+        """
+        self.main = main
+        self.memory_limit = MEMORY_LIMIT
+        self.tabs = []
+        self.frames = {} # tab: the empty frame of the notebook
+
+        self.notebook = ttk.Notebook(main.master)
+        self.notebook.pack(fill='x', before=main.textframe)
+        self.current = self.add(Tab())
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+
+    def add(self, tab):
+        """Adds a tab to the tab bar.
+
+        Arguments:
+            tab (Tab): the tab.
+
+        Returns:
+            Tab: the same tab.
+        """
+        # the notebook is only used as a tab bar
+        frame = ttk.Frame(self.notebook, height=0)
+        self.notebook.add(frame, text=tab.label())
+        self.frames[tab] = frame
+        self.tabs.append(tab)
+        return tab
+
+    def find(self, path):
+        """Returns the tab of a file, or None if it is not open.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        if self.main.path and same_file(self.main.path, path):
+            return self.current
+        for tab in self.tabs:
+            if (tab is not self.current and tab.path and
+                    same_file(tab.path, path)):
+                return tab
+        return None
+
+    def is_blank(self):
+        """Returns True if the current tab is an empty, unmodified new file."""
+        main = self.main
+        return (main.path == '' and not main.textbox.edit_modified() and
+                len(main.textbox.document) == 0 and main.loader is None)
+
+    def is_busy(self):
+        """Returns True, and tells the user, if the tab can't be changed.
+
+        A save of the current document that is in progress is waited for.
+        """
+        loader = self.main.loader
+        if loader is not None and not loader.finished:
+            self.main.set_status('Loading... (Esc to cancel)')
+            return True
+        saver = self.main.saver
+        if saver is not None and not saver.finished:
+            # the end of a save updates the state of the current
+            # document, so it has to happen before it is stored away
+            saver.thread.join()
+            saver.poll()
+        return False
+
+    def update_label(self):
+        """Updates the text of the current tab."""
+        tab = self.current
+        tab.path = self.main.path
+        tab.modified = self.main.textbox.edit_modified()
+        self.notebook.tab(self.frames[tab], text=tab.label())
+
+    # changing tabs
+    def new_tab(self):
+        """Opens a new empty document in a new tab.
+
+        Returns:
+            bool: False if the current tab can't be left now.
+        """
+        if self.is_busy():
+            return False
+        self.store_current()
+        self.activate(self.add(Tab()))
+        return True
+
+    def switch(self, tab):
+        """Shows the document of another tab.
+
+        Arguments:
+            tab (Tab): the tab.
+        """
+        if tab is self.current:
+            return
+        if self.is_busy():
+            self.notebook.select(self.frames[self.current])
+            return
+        self.store_current()
+        self.activate(tab)
+
+    def next_tab(self, *args):
+        """Shows the next tab, or the first one after the last."""
+        i = self.tabs.index(self.current)
+        self.switch(self.tabs[(i + 1) % len(self.tabs)])
+        return 'break'
+
+    def on_tab_changed(self, event):
+        """Called when the user selects a tab."""
+        selected = self.notebook.select()
+        for tab, frame in self.frames.items():
+            if str(frame) == selected:
+                if self.current is None:
+                    self.activate(tab)
+                else:
+                    self.switch(tab)
+                return
+
+    def close_current(self):
+        """Closes the current tab, without asking to save it.
+
+        The last tab is not closed, but emptied.
+        """
+        main = self.main
+        tab = self.current
+        self.clear_textbox()
+        main.path = ''
+        main.disk_size = main.disk_stat = None
+        main.clean.saved_hash = None
+        main.set_file_format(DEFAULT_FORMAT)
+        main.reset()
+        if len(self.tabs) == 1:
+            self.update_label()
+            return
+
+        i = self.tabs.index(tab)
+        self.tabs.remove(tab)
+        self.current = None
+        self.notebook.forget(self.frames.pop(tab))
+        if self.current is None:
+            self.activate(self.tabs[min(i, len(self.tabs) - 1)])
+
+    def clear_textbox(self):
+        """Empties the text display without recording it as a change."""
+        self.main.undo.enabled = False
+        self.main.textbox.clear()
+        self.main.undo.enabled = True
+
+    def store_current(self):
+        """Moves the current document from the text display to its tab."""
+        main = self.main
+        textbox = main.textbox
+        tab = self.current
+        main.file_menu.stop_following()
+        main.recent.remember()
+        self.update_label()
+        tab.file_format = main.file_format
+        tab.disk_size = main.disk_size
+        tab.disk_stat = main.disk_stat
+        tab.saved_hash = main.clean.saved_hash
+        tab.journal, main.journal = main.journal, None
+        tab.cursor = textbox.index('insert')
+        tab.top = textbox.index('@0,0')
+        tab.undo = main.undo.state()
+        tab.last_used = time.monotonic()
+
+        if main.large_file is not None:
+            top_line = int(tab.top.split('.')[0])
+            tab.large_line = main.large_file.first_line + top_line - 1
+            main.large_file.close()
+            main.large_file = None
+        else:
+            tab.document = textbox.document.snapshot()
+            tab.length = len(tab.document)
+            self.clear_textbox()
+        main.undo.clear()
+
+    def activate(self, tab):
+        """Moves the document of a tab to the text display.
+
+        Arguments:
+            tab (Tab): the tab.
+        """
+        main = self.main
+        self.current = tab
+        tab.last_used = time.monotonic()
+        self.notebook.select(self.frames[tab])
+        main.path = tab.path
+        main.disk_size = tab.disk_size
+        main.disk_stat = tab.disk_stat
+        main.clean.saved_hash = tab.saved_hash
+        main.set_file_format(tab.file_format)
+
+        if tab.large_line is not None:
+            line, tab.large_line = tab.large_line, None
+            try:
+                main.large_file = LargeFileView(
+                    main, tab.path, main.recent.line_index(tab.path)
+                )
+            except (OSError, ValueError) as error:
+                # ValueError: the file was emptied and can't be mapped
+                show_read_error(main.master, tab.path, error)
+                self.restore(tab)
+                return
+            main.large_file.open()
+            main.large_file.show(line)
+            self.restore(tab)
+        elif tab.evicted:
+            if tab.stat is None or file_stat(tab.path) != tab.stat:
+                # changed by another program, the steps are not valid
+                tab.undo = None
+            tab.evicted = False
+            try:
+                main.loader = ChunkedLoader(
+                    main, tab.path, on_done=lambda: self.on_reloaded(tab),
+                    file_format=tab.file_format
+                )
+            except OSError as error:
+                show_read_error(main.master, tab.path, error)
+                self.restore(tab)
+                return
+            main.loader.start()
+        elif tab.length > BACKGROUND_SIZE:
+            main.loader = TabLoader(main, tab,
+                                    on_done=lambda: self.on_restored(tab))
+            main.loader.start()
+        else:
+            textbox = main.textbox
+            main.undo.enabled = False
+            with textbox.suspend_events():
+                for chunk in tab.chunks():
+                    textbox.insert('end-1c', chunk)
+            main.undo.enabled = True
+            self.on_restored(tab)
+
+    def on_reloaded(self, tab):
+        """Called when the file of an evicted tab was read again.
+
+        Arguments:
+            tab (Tab): the tab.
+        """
+        tab.disk_size = self.main.loader.bytes_read
+        tab.disk_stat = self.main.loader.stat
+        tab.saved_hash = self.main.loader.content_hash
+        self.main.loader = None
+        if tab is self.current:
+            self.main.disk_size = tab.disk_size
+            self.main.disk_stat = tab.disk_stat
+            self.main.clean.saved_hash = tab.saved_hash
+            had_history = tab.undo is not None
+            self.restore(tab)
+            if not had_history:
+                # the history was dropped, the text is the file's
+                self.main.undo.saved = self.main.undo.checkpoint()
+
+    def on_restored(self, tab):
+        """Called when the text of a tab was moved to the text display.
+
+        Arguments:
+            tab (Tab): the tab.
+        """
+        self.main.loader = None
+        tab.document = tab.compressed = None
+        self.restore(tab)
+
+    def restore(self, tab):
+        """Gives the text display the rest of the state of a tab.
+
+        Arguments:
+            tab (Tab): the tab.
+        """
+        main = self.main
+        textbox = main.textbox
+        main.journal, tab.journal = tab.journal, None
+        main.undo.restore(tab.undo)
+        tab.undo = None
+        textbox.edit_modified(tab.modified)
+        if main.large_file is None:
+            textbox.mark_set('insert', tab.cursor)
+            textbox.yview(tab.top)
+        main.configure_title()
+        main.set_ln_col()
+        self.enforce_budget()
+
+    def enforce_budget(self):
+        """Compresses or evicts the least recently used tabs until the
+        documents use less than memory_limit bytes."""
+        main = self.main
+        total = len(main.textbox.document) + main.undo.size
+        inactive = [tab for tab in self.tabs if tab is not self.current]
+        total += sum(tab.memory() for tab in inactive)
+
+        for tab in sorted(inactive, key=lambda tab: tab.last_used):
+            if total <= self.memory_limit:
+                break
+            if tab.document is None:
+                continue
+            before = tab.memory()
+            tab.stat = file_stat(tab.path) if tab.path else None
+            if tab.stat is not None and not tab.modified:
+                # the file has the same text
+                tab.document = None
+                tab.evicted = True
+            else:
+                tab.compress()
+            total -= before - tab.memory()
+
+    def discard_journals(self):
+        """Deletes the journals of the tabs that are not shown.
+
+        Called when the app closes, after the user chose whether to
+        save every document.
+        """
+        for tab in self.tabs:
+            if tab.journal is not None:
+                tab.journal.discard()
+                tab.journal = None
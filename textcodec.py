@@ -0,0 +1,148 @@
+"""Detects the encoding and the line breaks of text files.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import codecs
+import collections
+import os
+
+from compression import detect_compression, read_start
+
+# number of bytes at the start of a file used to guess its format
+SAMPLE_SIZE = 64 * 1024
+# used when a file is not valid UTF-8. Every byte is a character, so
+# any file is read and saved back without changes
+FALLBACK_ENCODING = 'latin-1'
+
+# utf-32-le goes first, as its BOM starts with the one of utf-16-le
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+
+NEWLINE_NAMES = {'\n': 'LF', '\r\n': 'CRLF', '\r': 'CR'}
+
+FileFormat = collections.namedtuple('FileFormat',
+                                    'encoding bom newline compression',
+                                    defaults=(None,))
+FileFormat.__doc__ = """How the text of a file is stored.
+
+Attributes:
+    encoding (str): name of the python codec, like 'utf-8'.
+    bom (bool): True if the file starts with a byte order mark.
+    newline (str): the line break, '\\n', '\\r\\n' or '\\r'.
+    compression (str): the compression format, like 'gzip', or None.
+    See compression.FORMATS.
+"""
+
+# format of new files
+DEFAULT_FORMAT = FileFormat('utf-8', False, os.linesep)
+
+def describe(file_format):
+    """Returns a short description of a format for the status bar.
+
+    Arguments:
+        file_format (FileFormat): the format.
+    """
+    encoding = file_format.encoding.upper().replace('-LE', ' LE')
+    encoding = encoding.replace('-BE', ' BE').replace('LATIN-1', 'Latin-1')
+    if file_format.bom:
+        encoding += ' BOM'
+    description = f'{encoding}    {NEWLINE_NAMES[file_format.newline]}'
+    if file_format.compression is not None:
+        description += f'    {file_format.compression}'
+    return description
+
+def guess_encoding(sample, complete):
+    """Guesses the encoding of the start of a file.
+
+    Arguments:
+        sample (bytes): the first bytes of the file.
+        complete (bool): True if sample is the whole file.
+
+    Returns:
+        tuple: the name of the codec and True if there is a BOM.
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding, True
+
+    # text in UTF-16 without a BOM has a zero byte in most characters
+    # if it is mostly ASCII
+    if len(sample) >= 4:
+        half = len(sample) // 2
+        even = sample[0::2].count(0)
+        odd = sample[1::2].count(0)
+        if odd > half * 0.4 and even < half * 0.05:
+            return 'utf-16-le', False
+        if even > half * 0.4 and odd < half * 0.05:
+            return 'utf-16-be', False
+
+    try:
+        # the sample may end in the middle of a character
+        codecs.getincrementaldecoder('utf-8')().decode(sample, complete)
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING, False
+    return 'utf-8', False
+
+def guess_newline(text):
+    """Returns the most used line break of a text.
+
+    Arguments:
+        text (str): the text.
+    """
+    crlf = text.count('\r\n')
+    counts = {'\r\n': crlf,
+              '\n': text.count('\n') - crlf,
+              '\r': text.count('\r') - crlf}
+    newline = max(counts, key=counts.get)
+    if counts[newline] == 0:
+        return DEFAULT_FORMAT.newline
+    return newline
+
+def detect_format(path):
+    """Guesses the format of a file from its first bytes.
+
+    Compressed files are recognized, and the format of the text is
+    guessed from the start of their uncompressed contents.
+
+    Arguments:
+        path (str): path of the file.
+
+    Returns:
+        FileFormat: the format.
+
+    Raises:
+        OSError: if the file can't be read.
+    """
+    compression = detect_compression(path)
+    sample = read_start(path, SAMPLE_SIZE, compression)
+    encoding, bom = guess_encoding(sample, len(sample) < SAMPLE_SIZE)
+    text = sample.decode(encoding, errors='replace')
+    return FileFormat(encoding, bom, guess_newline(text), compression)
+
+def is_ascii_compatible(encoding):
+    """Returns True if the ASCII characters are one byte each, so the
+    lines of the file can be found by looking for b'\\n'.
+
+    Arguments:
+        encoding (str): name of a python codec.
+    """
+    return codecs.lookup(encoding).name in ('utf-8', 'iso8859-1')
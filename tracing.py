@@ -0,0 +1,194 @@
+"""Opt-in timing of the UI, saved as a Chrome trace.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+
+Run the app with --trace FILE (or the ATXT_TRACE environment variable)
+and open the file in chrome://tracing or https://ui.perfetto.dev.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tkinter as tk
+
+# max number of spans kept, so a long session doesn't use all the memory
+MAX_EVENTS = 1000000
+# how often (in ms) the main loop is checked for stalls
+HEARTBEAT = 20
+# delays of the heartbeat longer than this (in ms) are recorded as stalls
+STALL_THRESHOLD = 50
+
+def callback_name(func):
+    """Returns a readable name for a tk callback.
+
+    Arguments:
+        func (function): the callback.
+    """
+    name = getattr(func, '__qualname__', None) or repr(func)
+    if name.endswith('<locals>.callit'):
+        # after() wraps the function, but keeps its name
+        name = f'after {func.__name__}'
+    return name
+
+class Tracer:
+    """Records how long the parts of the app take.
+
+    Call install() before the main window is created, so the menu
+    commands and the text display are timed, and watch() to record
+    the times the main loop didn't respond.
+
+    Attributes:
+        events (list): the spans, as Chrome trace events.
+        dropped (int): number of spans not kept after MAX_EVENTS.
+    """
+    def __init__(self):
+        """Creates an empty trace."""
+        self.events = []
+        self.dropped = 0
+        self.start = time.perf_counter()
+        self.pid = os.getpid()
+
+    def now(self):
+        """Returns the time since the trace started, in microseconds."""
+        return (time.perf_counter() - self.start) * 1e6
+
+    def add(self, name, category, start, duration):
+        """Adds a span to the trace.
+
+        Arguments:
+            name (str): what was timed.
+            category (str): kind of span, like 'menu' or 'tk'.
+            start (float): when it started, in microseconds.
+            duration (float): how long it took, in microseconds.
+        """
+        if len(self.events) >= MAX_EVENTS:
+            self.dropped += 1
+            return
+        self.events.append({
+            'name': name, 'cat': category, 'ph': 'X',
+            'ts': round(start, 1), 'dur': round(duration, 1),
+            'pid': self.pid, 'tid': threading.get_ident(),
+        })
+
+    @contextlib.contextmanager
+    def span(self, name, category):
+        """Times the code inside a with block.
+
+        Arguments:
+            name (str): what is timed.
+            category (str): kind of span.
+        """
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.add(name, category, start, self.now() - start)
+
+    def wrap(self, function, name, category):
+        """Returns a function that times another one.
+
+        Arguments:
+            function (function): the timed function.
+            name (str): name of its spans.
+            category (str): kind of span.
+        """
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.span(name, category):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def instrument_class(self, cls, category):
+        """Times every method of a class.
+
+        It has to be done before the class is instantiated, as the
+        menus keep the bound methods they call.
+
+        Arguments:
+            cls (type): the class.
+            category (str): kind of span.
+        """
+        for name, attribute in list(vars(cls).items()):
+            if callable(attribute) and not name.startswith('__'):
+                setattr(cls, name, self.wrap(
+                    attribute, f'{cls.__name__}.{name}', category
+                ))
+
+    def install(self):
+        """Times the menu commands, the text display and every tk callback."""
+        from customtext import CustomText
+        from filemenu import FileMenu
+        from editmenu import EditMenu
+        from configmenu import ConfigMenu
+
+        for cls in (FileMenu, EditMenu, ConfigMenu):
+            self.instrument_class(cls, 'menu')
+
+        # one span for every command of the text display, named after it
+        proxy = CustomText._proxy
+        def timed_proxy(textbox, *args):
+            with self.span(f'CustomText {args[0] if args else ""}', 'text'):
+                return proxy(textbox, *args)
+        CustomText._proxy = timed_proxy
+
+        # event handlers, after() callbacks and widget commands
+        call = tk.CallWrapper.__call__
+        def timed_call(wrapper, *args):
+            with self.span(callback_name(wrapper.func), 'tk'):
+                return call(wrapper, *args)
+        tk.CallWrapper.__call__ = timed_call
+
+    def watch(self, root):
+        """Records the times the main loop didn't run for a while.
+
+        A callback is scheduled every HEARTBEAT ms; if it runs late, the
+        main loop was busy, and the delay is added as a 'stall' span.
+
+        Arguments:
+            root (tkinter.Tk): root widget of the app.
+        """
+        expected = self.now() + HEARTBEAT * 1000
+
+        def beat():
+            nonlocal expected
+            now = self.now()
+            delay = now - expected
+            if delay > STALL_THRESHOLD * 1000:
+                self.add('stall', 'stall', expected, delay)
+            expected = now + HEARTBEAT * 1000
+            root.tk.call('after', HEARTBEAT, 'atxt_heartbeat')
+
+        # a tcl command without tk.CallWrapper, so the heartbeat itself
+        # is not traced
+        root.tk.createcommand('atxt_heartbeat', beat)
+        root.tk.call('after', HEARTBEAT, 'atxt_heartbeat')
+
+    def save(self, path):
+        """Writes the trace in Chrome's JSON format.
+
+        Arguments:
+            path (str): path of the trace file.
+        """
+        trace = {
+            'traceEvents': self.events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'dropped': self.dropped},
+        }
+        with open(path, 'w') as file_:
+            json.dump(trace, file_)
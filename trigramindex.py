@@ -0,0 +1,500 @@
+"""Index of the trigrams of files, to find text without reading them all.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+
+Every file is split in blocks of about BLOCK_SIZE bytes, cut at line
+breaks, and the index stores which blocks of a file have each trigram
+(3 consecutive bytes, with ASCII letters in lowercase). A text can only
+be in the blocks that have all its trigrams, so a search only reads
+those blocks. See filesearch for how the files are searched.
+
+The index is an SQLite database in the user's cache directory. Files
+are indexed again when their size or modification time change.
+"""
+
+import os
+import sqlite3
+
+from compression import detect_compression
+from filesearch import is_binary, SNIFF_SIZE, walk
+
+# the files are indexed in blocks of about this many bytes
+BLOCK_SIZE = 1024 * 1024
+# name of the database in the cache directory
+INDEX_NAME = 'trigrams.sqlite'
+# max number of files indexed or waiting to be indexed at a time
+MAX_PENDING = 64
+# number of hex digits of the escapes of regular expressions that have them
+HEX_ESCAPES = {'x': 2, 'u': 4, 'U': 8}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    path TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    binary INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    file INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    PRIMARY KEY (file, number)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS postings (
+    trigram INTEGER NOT NULL,
+    file INTEGER NOT NULL,
+    blocks BLOB NOT NULL,
+    PRIMARY KEY (trigram, file)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_file ON postings (file);
+"""
+
+def index_path():
+    """Returns the path of the database."""
+    # configstore imports tk, and this module is imported by the
+    # processes of the pool
+    from configstore import cache_dir
+    return os.path.join(cache_dir(), INDEX_NAME)
+
+def trigrams(data):
+    """Returns the trigrams of some bytes, as integers.
+
+    Arguments:
+        data (bytes): the bytes. ASCII letters are made lowercase.
+    """
+    data = data.lower()
+    return {(a << 16) | (b << 8) | c
+            for a, b, c in set(zip(data, data[1:], data[2:]))}
+
+def split_blocks(data):
+    """Splits a file in blocks of about BLOCK_SIZE bytes, at line breaks.
+
+    Arguments:
+        data (mmap.mmap): the file.
+
+    Yields:
+        tuple: (start, end, line) where line is the number of the first
+        line of the block, starting from 1.
+    """
+    size = len(data)
+    start = 0
+    line = 1
+    while start < size:
+        end = data.find(b'\n', min(start + BLOCK_SIZE, size))
+        end = size if end == -1 else end + 1
+        yield start, end, line
+        line += data[start:end].count(b'\n')
+        start = end
+
+def index_file(path):
+    """Finds the trigrams of every block of a file.
+
+    Runs in the processes of a pool.
+
+    Arguments:
+        path (str): path of the file.
+
+    Returns:
+        tuple: (path, size, mtime, binary, blocks, postings) where mtime
+        is in ns, blocks is a list of split_blocks() tuples and postings
+        maps every trigram to an int with a bit set for every block that
+        has it. Binary files have no blocks. None if the file can't be
+        read.
+    """
+    import mmap
+
+    try:
+        with open(path, 'rb') as file_:
+            stat = os.fstat(file_.fileno())
+            blocks = []
+            postings = {}
+            binary = (is_binary(file_.read(SNIFF_SIZE)) or
+                      detect_compression(path) is not None)
+            if stat.st_size and not binary:
+                data = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+                with data:
+                    for number, block in enumerate(split_blocks(data)):
+                        blocks.append(block)
+                        bit = 1 << number
+                        for trigram in trigrams(data[block[0]:block[1]]):
+                            postings[trigram] = postings.get(trigram, 0) | bit
+    except (OSError, ValueError):
+        return None
+    return path, stat.st_size, stat.st_mtime_ns, binary, blocks, postings
+
+def escape_end(text, i):
+    """Returns the position after an escape of a regular expression.
+
+    Arguments:
+        text (str): the regular expression.
+        i (int): the position of the backslash.
+    """
+    kind = text[i + 1]
+    if kind in HEX_ESCAPES:
+        return min(i + 2 + HEX_ESCAPES[kind], len(text))
+    if kind == 'N' and text[i + 2:i + 3] == '{':
+        end = text.find('}', i)
+        return len(text) if end == -1 else end + 1
+    if kind.isdigit():
+        # an octal escape or a reference to a group
+        end = i + 2
+        while end < min(i + 4, len(text)) and text[end].isdigit():
+            end += 1
+        return end
+    return i + 2
+
+def literals(text, regex):
+    """Returns the texts that every match of a search has.
+
+    Only simple regular expressions are understood: the literal parts
+    outside of groups and classes, if there are no alternatives.
+
+    Arguments:
+        text (str): the text or regular expression to find.
+        regex (bool): True if it is a regular expression.
+
+    Returns:
+        list: the texts, possibly empty.
+
+    Escapes with letters or digits end a literal part:
+
+    >>> literals(r'ab\\x41bc', True)
+    ['ab', 'bc']
+    >>> literals(r'\\u0041bcd', True)
+    ['bcd']
+    >>> literals(r'\\U00000041bcd', True)
+    ['bcd']
+    >>> literals(r'\\N{LATIN CAPITAL LETTER A}bc', True)
+    ['bc']
+    >>> literals(r'\\101bc', True)
+    ['bc']
+    >>> literals(r'(ab)\\1cd', True)
+    ['cd']
+    """
+    if not regex:
+        return [text]
+    if '|' in text:
+        return []
+    parts = []
+    current = '' # the literal part being read
+    depth = 0 # number of open groups
+    i = 0
+    while i < len(text):
+        char = text[i]
+        literal = None
+        if char == '\\' and i + 1 < len(text):
+            if not text[i + 1].isalnum():
+                literal = text[i + 1]
+            # \d, \w, \x41, \1 and the like are not taken as literal
+            i = escape_end(text, i)
+        elif char == '[':
+            i += 1
+            if text[i:i + 1] == '^':
+                i += 1
+            if text[i:i + 1] == ']':
+                i += 1
+            while i < len(text) and text[i] != ']':
+                i += 2 if text[i] == '\\' else 1
+            i += 1
+        elif char in '*?{':
+            # the last character was optional
+            current = current[:-1]
+            if char == '{':
+                end = text.find('}', i)
+                i = len(text) if end == -1 else end
+            i += 1
+            if text[i:i + 1] in ('?', '+'):
+                i += 1 # lazy or possessive
+        elif char == '+':
+            i += 1
+            if text[i:i + 1] in ('?', '+'):
+                i += 1
+            # the last character is repeated, the literal part ends
+        else:
+            depth += (char == '(') - (char == ')')
+            if char not in '().^$':
+                literal = char
+            i += 1
+
+        if literal is not None and depth == 0:
+            current += literal
+        elif current:
+            parts.append(current)
+            current = ''
+    if current:
+        parts.append(current)
+    return parts
+
+def query_trigrams(text, regex):
+    """Returns the trigrams that every match of a search has.
+
+    Arguments:
+        text (str): the text or regular expression to find.
+        regex (bool): True if it is a regular expression.
+
+    Returns:
+        set: the trigrams, or None if the index can't narrow the search.
+    """
+    found = set()
+    for literal in literals(text, regex):
+        found |= trigrams(literal.encode('utf-8'))
+    return found or None
+
+class TrigramIndex:
+    """The database of the index.
+
+    SQLite connections can only be used by the thread that opened them,
+    so every thread opens its own.
+
+    Arguments:
+        path (str): path of the database. By default, index_path().
+
+    Raises:
+        sqlite3.Error: if the database can't be opened.
+    """
+    def __init__(self, path=None):
+        """Opens the database, creating it if it doesn't exist.
+
+        Arguments:
+            path (str): path of the database.
+        """
+        self.path = path or index_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30)
+        # a search can read while the index is updated
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        """Closes the database."""
+        self.db.close()
+
+    def roots(self):
+        """Returns the indexed folders."""
+        return [row[0] for row in self.db.execute('SELECT path FROM roots')]
+
+    def add_root(self, path):
+        """Adds a folder to the index. Call update() to index its files.
+
+        Arguments:
+            path (str): path of the folder.
+        """
+        with self.db:
+            self.db.execute('INSERT OR IGNORE INTO roots VALUES (?)',
+                            (os.path.abspath(path),))
+
+    def files_under(self, directory=None):
+        """Returns the indexed files in a folder.
+
+        Arguments:
+            directory (str): the folder, or None for all the files.
+
+        Returns:
+            dict: path -> (id, size, mtime, binary).
+        """
+        query = 'SELECT path, id, size, mtime, binary FROM files'
+        args = ()
+        if directory is not None:
+            # the paths that start with the directory and a separator
+            prefix = os.path.join(os.path.abspath(directory), '')
+            query += ' WHERE path >= ? AND path < ?'
+            args = (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        return {row[0]: row[1:] for row in self.db.execute(query, args)}
+
+    def store(self, result):
+        """Replaces the entries of a file with new ones.
+
+        Arguments:
+            result (tuple): what index_file() returned for it.
+        """
+        path, size, mtime, binary, blocks, postings = result
+        with self.db:
+            self.remove(path)
+            file_id = self.db.execute(
+                'INSERT INTO files (path, size, mtime, binary) '
+                'VALUES (?, ?, ?, ?)', (path, size, mtime, binary)
+            ).lastrowid
+            self.db.executemany(
+                'INSERT INTO blocks VALUES (?, ?, ?, ?, ?)',
+                ((file_id, number, start, end, line)
+                 for number, (start, end, line) in enumerate(blocks))
+            )
+            self.db.executemany(
+                'INSERT INTO postings VALUES (?, ?, ?)',
+                ((trigram, file_id, to_blob(bits))
+                 for trigram, bits in postings.items())
+            )
+
+    def remove(self, path):
+        """Removes a file from the index.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        row = self.db.execute('SELECT id FROM files WHERE path = ?',
+                              (path,)).fetchone()
+        if row is None:
+            return
+        with self.db:
+            for table, column in (('postings', 'file'), ('blocks', 'file'),
+                                  ('files', 'id')):
+                self.db.execute(f'DELETE FROM {table} WHERE {column} = ?',
+                                row)
+
+    def candidates(self, query, files):
+        """Returns the blocks that may have a text.
+
+        Arguments:
+            query (set): the trigrams of the text. See query_trigrams().
+            files (dict): the files that are searched, from
+            files_under().
+
+        Returns:
+            dict: path -> list of split_blocks() tuples. The files that
+            can't have the text are not included.
+        """
+        paths = {entry[0]: path for path, entry in files.items()}
+        bits = None # file id -> blocks that have all the trigrams so far
+        for trigram in query:
+            found = {}
+            for file_id, blob in self.db.execute(
+                    'SELECT file, blocks FROM postings WHERE trigram = ?',
+                    (trigram,)):
+                if file_id in paths and (bits is None or file_id in bits):
+                    found[file_id] = int.from_bytes(blob, 'little')
+                    if bits is not None:
+                        found[file_id] &= bits[file_id]
+            bits = {file_id: value for file_id, value in found.items()
+                    if value}
+            if not bits:
+                return {}
+
+        result = {}
+        for file_id, value in bits.items():
+            result[paths[file_id]] = [
+                (start, end, line) for number, start, end, line
+                in self.db.execute('SELECT number, start, end, line '
+                                   'FROM blocks WHERE file = ? '
+                                   'ORDER BY number', (file_id,))
+                if value >> number & 1
+            ]
+        return result
+
+    def stats(self):
+        """Returns the number of indexed files, their size and the size
+        of the database, in bytes."""
+        files, size = self.db.execute(
+            'SELECT COUNT(*), TOTAL(size) FROM files'
+        ).fetchone()
+        try:
+            database = os.path.getsize(self.path)
+        except OSError:
+            database = 0
+        return files, int(size), database
+
+def to_blob(bits):
+    """Stores the bits of the blocks of a trigram as bytes.
+
+    Arguments:
+        bits (int): a bit set for every block that has the trigram.
+    """
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+def update(index, pool, files=(), progress=None, cancelled=None):
+    """Indexes the files that changed since they were indexed.
+
+    The files of the indexed folders, the given files and the ones
+    indexed before are checked, the changed ones are indexed in a pool
+    of processes, and the ones that don't exist anymore are removed
+    from the index.
+
+    Arguments:
+        index (TrigramIndex): the index.
+        pool (findinfiles.WorkerPool): the processes that index the files.
+        files (iterable): paths of files indexed besides the ones of the
+        folders, like the recently opened ones.
+        progress (function): called with the number of indexed files,
+        the number of files that have to be indexed and the number of
+        bytes indexed, after every file.
+        cancelled (threading.Event): stops the update when it is set.
+
+    Returns:
+        tuple: the number of indexed files and bytes.
+
+    Raises:
+        RuntimeError: if the pool was shut down, as the app is closing.
+    """
+    import concurrent.futures
+
+    indexed = index.files_under()
+    paths = set(indexed)
+    paths.update(os.path.abspath(path) for path in files)
+    for root in index.roots():
+        paths.update(walk(root))
+
+    changed = []
+    removed = []
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            if path in indexed:
+                removed.append(path)
+            continue
+        entry = indexed.get(path)
+        if entry is None or entry[1:3] != (stat.st_size, stat.st_mtime_ns):
+            changed.append(path)
+    with index.db:
+        for path in removed:
+            index.remove(path)
+
+    done = size = 0
+    if not changed:
+        return done, size
+    pending = set()
+    queued = iter(changed)
+    try:
+        while cancelled is None or not cancelled.is_set():
+            for path in queued:
+                pending.add(pool.submit(index_file, path))
+                if len(pending) >= MAX_PENDING:
+                    break
+            if not pending:
+                break
+            finished, pending = concurrent.futures.wait(
+                pending, timeout=0.1,
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in finished:
+                result = future.result()
+                done += 1
+                if result is not None:
+                    index.store(result)
+                    size += result[1]
+                if progress is not None:
+                    progress(done, len(changed), size)
+    finally:
+        # the pool is shared, only the files of this update are dropped
+        for future in pending:
+            future.cancel()
+    return done, size
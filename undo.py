@@ -0,0 +1,447 @@
+"""Undo history of the text display, with a limited memory usage.
+
+This file is part of Another txt Editor.
+
+Another txt Editor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Another txt Editor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Another txt Editor.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import contextlib
+import os
+import struct
+import time
+import zlib
+
+from journal import base_stat, NAMES, OPERATIONS, RECORD
+
+# max memory (in bytes) used by the history. The oldest steps are
+# forgotten when it is exceeded
+MEMORY_LIMIT = 32 * 1024 * 1024
+# number of recent steps that are not compressed
+HOT_STEPS = 32
+# keystrokes separated by more than this (in seconds) are different steps
+GROUP_TIMEOUT = 1.0
+
+# the file of the history starts with the magic, the size and the
+# modification time in ns of the saved file, and then has every step
+# as its length and its compressed records. See encode()
+MAGIC = b'ATXTUND2'
+HEADER = struct.Struct('<8sQQ')
+STEP_HEADER = struct.Struct('<I')
+
+def history_path(path):
+    """Returns the path of the file where the history of a file is kept.
+
+    Arguments:
+        path (str): path of the file.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f'.{name}.undo')
+
+def step_size(step):
+    """Returns the approximate memory used by a step, in bytes.
+
+    Arguments:
+        step (list or bytes): a step, compressed or not.
+    """
+    if isinstance(step, bytes):
+        return len(step)
+    return sum(len(text) for operation, offset, text in step) + 64 * len(step)
+
+def encode(step):
+    """Converts a step to records like the ones of journal.
+
+    Arguments:
+        step (list): list of (operation, offset, text) tuples.
+    """
+    records = []
+    for operation, offset, text in step:
+        data = text.encode('utf-8', errors='surrogatepass')
+        records.append(RECORD.pack(OPERATIONS[operation], offset, len(data)))
+        records.append(data)
+    return b''.join(records)
+
+def decode(data):
+    """Converts the records of encode() back to a step.
+
+    Arguments:
+        data (bytes): the records.
+
+    Raises:
+        ValueError: if the records are not valid.
+    """
+    step = []
+    pos = 0
+    while pos < len(data):
+        operation, offset, length = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        if operation not in NAMES or NAMES[operation] == 'reset':
+            raise ValueError('unknown operation')
+        if pos + length > len(data):
+            raise ValueError('truncated record')
+        text = data[pos:pos + length].decode('utf-8', 'surrogatepass')
+        pos += length
+        step.append((NAMES[operation], offset, text))
+    if not step:
+        raise ValueError('empty step')
+    return step
+
+def compress(step):
+    """Compresses a step.
+
+    Arguments:
+        step (list): list of (operation, offset, text) tuples.
+    """
+    return zlib.compress(encode(step))
+
+def decompress(step):
+    """Returns a step as a list, decompressing it if it is necessary.
+
+    Arguments:
+        step (list or bytes): a step, compressed or not.
+
+    Raises:
+        ValueError: if a compressed step is not valid.
+    """
+    if isinstance(step, bytes):
+        try:
+            return decode(zlib.decompress(step))
+        except (zlib.error, struct.error) as error:
+            raise ValueError(str(error)) from error
+    return step
+
+def check_steps(steps, length):
+    """Checks that undoing some steps stays inside the text.
+
+    Arguments:
+        steps (list): the steps of the undo stack, decompressed.
+        length (int): the length of the text after the last step.
+
+    Raises:
+        ValueError: if a change is outside the text.
+    """
+    for step in reversed(steps):
+        for operation, offset, text in reversed(step):
+            # undoing an insertion deletes its text, and the other way
+            if operation == 'insert':
+                if offset + len(text) > length:
+                    raise ValueError('change outside the text')
+                length -= len(text)
+            else:
+                if offset > length:
+                    raise ValueError('change outside the text')
+                length += len(text)
+
+class UndoHistory:
+    """Records the changes of the text display to undo and redo them.
+
+    Changes are grouped in steps. Consecutive keystrokes are one step
+    until the user types a space or a line break, moves the cursor
+    somewhere else, switches between typing and deleting, or stops
+    typing for GROUP_TIMEOUT seconds.
+
+    Old steps are compressed with zlib, and the oldest ones are
+    forgotten when the history uses more than memory_limit bytes.
+
+    Every step has a serial number, so the states of the text can be
+    told apart without comparing the text: see state_id().
+
+    Arguments:
+        textbox (customtext.CustomText): the text display.
+        memory_limit (int): max memory used by the history, in bytes.
+
+    Attributes:
+        saved: state_id() of the text that is saved in the file, or
+        None if it is unknown.
+    """
+    def __init__(self, textbox, memory_limit=MEMORY_LIMIT):
+        """Creates an empty history and starts recording changes.
+
+        Arguments:
+            textbox (customtext.CustomText): the text display.
+            memory_limit (int): max memory used by the history, in bytes.
+        """
+        self.textbox = textbox
+        self.memory_limit = memory_limit
+        self.enabled = True # False while a file is being loaded
+        self.persist = False # stores the history next to saved files
+        self.applying = False # True while undoing or redoing
+        self.serial = 0 # last number given to a step
+        self.clear()
+        textbox.listeners.append(self.record)
+
+    def clear(self):
+        """Forgets all the steps."""
+        self.undo_stack = []
+        self.redo_stack = []
+        # serial numbers of the steps of the stacks
+        self.undo_ids = []
+        self.redo_ids = []
+        # the state before the first step of the undo stack
+        self.serial += 1
+        self.base = self.serial
+        self.saved = None
+        self.size = 0
+        self.current = None # the step that is being recorded
+        self.last_time = 0
+        self.grouping = 0
+
+    def state(self):
+        """Returns the steps, to keep them while another text is edited.
+
+        Returns:
+            tuple: the undo stack, the redo stack, their size and the
+            serial numbers of the states.
+        """
+        self.separator()
+        return (self.undo_stack, self.redo_stack, self.size,
+                self.undo_ids, self.redo_ids, self.base, self.saved)
+
+    def restore(self, state):
+        """Replaces the steps with the ones returned by state().
+
+        Arguments:
+            state (tuple): the steps, or None to clear them.
+        """
+        self.clear()
+        if state is not None:
+            (self.undo_stack, self.redo_stack, self.size,
+             self.undo_ids, self.redo_ids, self.base, self.saved) = state
+
+    def state_id(self):
+        """Returns a number that identifies the state of the text.
+
+        Undoing and redoing return to the same numbers, and every new
+        change gets a new one. It is None while a step is being
+        recorded, as its changes can still grow.
+        """
+        if self.current:
+            return None
+        return self.undo_ids[-1] if self.undo_ids else self.base
+
+    def checkpoint(self):
+        """Ends the current step and returns state_id()."""
+        self.separator()
+        return self.state_id()
+
+    def is_saved(self):
+        """Returns True if the text is the one saved in the file."""
+        return self.saved is not None and self.state_id() == self.saved
+
+    def record(self, operation, offset, text):
+        """Adds a change to the current step.
+
+        Arguments:
+            operation (str): 'insert', 'delete' or 'reset'.
+            offset (int): the position of the change, in characters.
+            text (str): the inserted or deleted text.
+        """
+        if self.applying or not self.enabled:
+            return
+        if operation == 'reset':
+            # tk's own undo replaced the text; the steps are not valid
+            self.clear()
+            return
+
+        now = time.monotonic()
+        if self.redo_stack:
+            # a new change makes the undone steps unreachable
+            self.size -= sum(step_size(step) for step in self.redo_stack)
+            self.redo_stack = []
+            self.redo_ids = []
+        if self.current is not None and not self.grouping:
+            last_operation, last_offset, last_text = self.current[-1]
+            if operation == 'insert':
+                continues = offset == last_offset + len(last_text)
+            else:
+                continues = offset + len(text) in (last_offset, last_offset + 1)
+            if (operation != last_operation or not continues
+                    or len(text) > 1 or len(last_text) > 1
+                    or now - self.last_time > GROUP_TIMEOUT
+                    or last_text[-1:].isspace()):
+                self.separator()
+        self.last_time = now
+
+        if self.current is None:
+            self.current = []
+        self.current.append((operation, offset, text))
+
+    def separator(self):
+        """Ends the current step, so the next change starts a new one."""
+        if self.grouping or not self.current:
+            return
+        self.serial += 1
+        self.push(self.undo_stack, self.current, self.serial)
+        self.current = None
+
+    @contextlib.contextmanager
+    def group(self):
+        """Makes all the changes inside a with block one step."""
+        self.separator()
+        self.grouping += 1
+        try:
+            yield
+        finally:
+            self.grouping -= 1
+            self.separator()
+
+    def push(self, stack, step, serial):
+        """Adds a step to a stack and keeps the memory under the limit.
+
+        Arguments:
+            stack (list): the undo or redo stack.
+            step (list): the step.
+            serial (int): the serial number of the step.
+        """
+        ids = self.undo_ids if stack is self.undo_stack else self.redo_ids
+        stack.append(step)
+        ids.append(serial)
+        self.size += step_size(step)
+        if len(stack) > HOT_STEPS:
+            i = len(stack) - HOT_STEPS - 1
+            if not isinstance(stack[i], bytes):
+                self.size -= step_size(stack[i])
+                stack[i] = compress(stack[i])
+                self.size += step_size(stack[i])
+        while self.size > self.memory_limit and len(stack) > 1:
+            self.size -= step_size(stack.pop(0))
+            serial = ids.pop(0)
+            if stack is self.undo_stack:
+                # the oldest state that can be reached
+                self.base = serial
+
+    def pop(self, stack):
+        """Removes the last step of a stack.
+
+        Arguments:
+            stack (list): the undo or redo stack.
+
+        Returns:
+            tuple: the step, decompressed, and its serial number.
+        """
+        ids = self.undo_ids if stack is self.undo_stack else self.redo_ids
+        step = stack.pop()
+        self.size -= step_size(step)
+        return decompress(step), ids.pop()
+
+    def undo(self):
+        """Undoes the last step.
+
+        Returns:
+            bool: False if there was nothing to undo.
+        """
+        self.separator()
+        if not self.undo_stack:
+            return False
+        step, serial = self.pop(self.undo_stack)
+        inverse = {'insert': 'delete', 'delete': 'insert'}
+        self.apply([(inverse[operation], offset, text)
+                    for operation, offset, text in reversed(step)])
+        self.push(self.redo_stack, step, serial)
+        return True
+
+    def redo(self):
+        """Redoes the last undone step.
+
+        Returns:
+            bool: False if there was nothing to redo.
+        """
+        self.separator()
+        if not self.redo_stack:
+            return False
+        step, serial = self.pop(self.redo_stack)
+        self.apply(step)
+        self.push(self.undo_stack, step, serial)
+        return True
+
+    def apply(self, changes):
+        """Makes changes in the text display without recording them.
+
+        Arguments:
+            changes (list): list of (operation, offset, text) tuples.
+        """
+        textbox = self.textbox
+        self.applying = True
+        try:
+            with textbox.suspend_events():
+                for operation, offset, text in changes:
+                    index = textbox.index_at(offset)
+                    if operation == 'insert':
+                        textbox.insert(index, text)
+                        index = textbox.index_at(offset + len(text))
+                    else:
+                        textbox.delete(index,
+                                       textbox.index_at(offset + len(text)))
+                    textbox.mark_set('insert', index)
+                textbox.see('insert')
+        finally:
+            self.applying = False
+
+    def save(self, path):
+        """Stores the undo steps in a file next to a saved file.
+
+        Arguments:
+            path (str): path of the saved file.
+        """
+        self.separator()
+        size, mtime = base_stat(path)
+        steps = [step if isinstance(step, bytes) else compress(step)
+                 for step in self.undo_stack]
+        temp = history_path(path) + '.tmp'
+        with open(temp, 'wb') as file_:
+            file_.write(HEADER.pack(MAGIC, size, mtime))
+            for step in steps:
+                file_.write(STEP_HEADER.pack(len(step)))
+                file_.write(step)
+        os.replace(temp, history_path(path))
+
+    def load(self, path):
+        """Restores the undo steps of a file, if they were stored.
+
+        They are only restored if the file didn't change since then.
+        The file may come from anywhere, so it is deleted if it is not
+        valid.
+
+        Arguments:
+            path (str): path of the file.
+        """
+        self.clear()
+        try:
+            with open(history_path(path), 'rb') as file_:
+                data = file_.read()
+            magic, size, mtime = HEADER.unpack_from(data)
+            if magic != MAGIC or (size, mtime) != base_stat(path):
+                return
+        except (OSError, struct.error):
+            return
+        try:
+            steps = []
+            pos = HEADER.size
+            while pos < len(data):
+                (length,) = STEP_HEADER.unpack_from(data, pos)
+                pos += STEP_HEADER.size
+                if pos + length > len(data):
+                    raise ValueError('truncated step')
+                steps.append(data[pos:pos + length])
+                pos += length
+            check_steps([decompress(step) for step in steps],
+                        len(self.textbox.document))
+        except (ValueError, struct.error):
+            try:
+                os.remove(history_path(path))
+            except OSError:
+                pass
+            return
+        for step in steps:
+            self.serial += 1
+            self.push(self.undo_stack, step, self.serial)